@@ -1,9 +1,10 @@
 import streamlit as st
+import asyncio
 import tempfile
 from pathlib import Path
 from zipfile import ZipFile
 import json
-from jee_data_base import DataBase, Filter, pdfy
+from jee_data_base_new_v import DataBase, Filter, Field, pdfy
 
 
 st.html("""
@@ -26,8 +27,8 @@ def init_state():
         st.session_state.page = "zip_exporter"   # MAIN PAGE
     if "db" not in st.session_state:
         st.session_state.db = None
-    if "filter" not in st.session_state:
-        st.session_state.filter = None
+    if "view" not in st.session_state:
+        st.session_state.view = None
     if "clusters" not in st.session_state:
         st.session_state.clusters = None
     if "status" not in st.session_state:
@@ -38,6 +39,14 @@ init_state()
 st.set_page_config(page_title="Question Overflow 📚", layout="wide")
 
 
+# One DataBase/Filter for every session. The Filter is never mutated here,
+# each session works on its own immutable ResultView (st.session_state.view)
+@st.cache_resource
+def load_db():
+    db = DataBase()
+    return db, Filter(db.chapters_dict)
+
+
 # ============================================================
 # ===============  PAGE 1 → ZIP EXPORTER (MAIN) ==============
 # ============================================================
@@ -45,11 +54,6 @@ def page_zip_exporter():
     st.title("📦 Last 5 Years Chapter ZIP Exporter")
 
     # Load DB
-    @st.cache_resource
-    def load_db():
-        db = DataBase()
-        return db, Filter(db.chapters_dict)
-
     data_base, filter = load_db()
     
     st.image("assests/image.png",clamp=True,use_container_width=True,width="stretch")
@@ -62,6 +66,12 @@ def page_zip_exporter():
     # print(n_yrs)
 
     skim = st.checkbox("Enable Skim Mode", value=False)
+    collapse = st.checkbox("Collapse repeated questions", value=False)
+    offline = st.checkbox(
+        "Offline files (bundled MathJax and fonts)",
+        value=False,
+        help="needs the asset bundle: python -m jee_data_base_new_v prepare-assets"
+    )
     # pdf_output = st.checkbox("PDF files(takes time to render)",value=False)
     # if pdf_output:
     #     file_format = "pdf"
@@ -76,11 +86,14 @@ def page_zip_exporter():
             out_folder = temp_root / chapter
 
             # Step 1 → Call your module method
-            filter.render_chap_last5yrs(
+            asyncio.run(filter.render_chap_lastNyrs(
                 destination=str(temp_root), 
                 chap_name=chapter, 
+                N=5,
                 skim=skim,
-                )
+                collapse_duplicates=collapse,
+                offline=offline,
+                ))
             # Step 2 → Zip the folder
             zip_path = temp_root / f"{chapter.replace(' ', '_')}.zip"
             with ZipFile(zip_path, "w") as zipf:
@@ -88,7 +101,6 @@ def page_zip_exporter():
                     zipf.write(file, file.relative_to(out_folder.parent))
 
         st.success("ZIP generated!")
-        filter.reset()
 
         st.download_button(
             "⬇️ Download ZIP",
@@ -123,19 +135,18 @@ def page_advanced_explorer():
     if st.button("Load Database"):
         with st.spinner("Loading DB..."):
             try:
-                db = DataBase()
-                filter = Filter(db.chapters_dict)
+                db, filter = load_db()
                 st.session_state.db = db
-                st.session_state.filter = filter
-                st.session_state.status = f"Loaded {len(filter.current_set)} questions."
+                st.session_state.view = filter.view(all_rows=True)
+                st.session_state.status = f"Loaded {len(st.session_state.view)} questions."
             except Exception as e:
                 st.error(f"Load failed: {e}")
 
     st.caption(f"Status: {st.session_state.status}")
     st.markdown("---")
 
-    filter = st.session_state.filter
-    if not filter:
+    view = st.session_state.view
+    if view is None:
         st.info("Click 'Load Database' first.")
         if st.button("⬅️ Back to ZIP Exporter"):
             st.session_state.page = "zip_exporter"
@@ -147,10 +158,12 @@ def page_advanced_explorer():
     # -------------------
     st.subheader("Filters")
 
+    _, filter = load_db()
     try:
-        possible = filter.get_possible_filter_values()
+        possible = filter.get_possible_filter_values(view)
         params = sorted(possible.keys())
     except:
+        possible = {}
         params = sorted(list(getattr(filter, "filterable_param", [])))
 
     field = st.selectbox("Field", [""] + params)
@@ -190,22 +203,10 @@ def page_advanced_explorer():
                             except:
                                 target_val = value
 
-                    new_set = []
-                    for q in filter.current_set:
-                        attr = getattr(q, field, None)
-
-                        # Compare complex types
-                        if isinstance(attr, (dict, list, tuple)):
-                            a = json.dumps(attr, sort_keys=True, default=str)
-                            b = json.dumps(target_val, sort_keys=True, default=str)
-                            if a == b:
-                                new_set.append(q)
-                        else:
-                            if attr == target_val:
-                                new_set.append(q)
-
-                    filter.current_set = new_set
-                    st.session_state.status = f"Filtered to {len(new_set)} questions."
+                    new_view = view.query(Field(field) == target_val)
+
+                    st.session_state.view = new_view
+                    st.session_state.status = f"Filtered to {len(new_view)} questions."
                 except Exception as e:
                     st.error(f"Filtering failed: {e}")
 
@@ -213,8 +214,8 @@ def page_advanced_explorer():
         if st.button("Reset Filters"):
             with st.spinner("Resetting..."):
                 try:
-                    st.session_state.filter = Filter(st.session_state.db.chapters_dict)
-                    st.session_state.status = f"Reset — {len(st.session_state.filter.current_set)} questions."
+                    st.session_state.view = filter.view(all_rows=True)
+                    st.session_state.status = f"Reset — {len(st.session_state.view)} questions."
                 except Exception as e:
                     st.error(f"Reset failed: {e}")
 
@@ -226,7 +227,7 @@ def page_advanced_explorer():
     st.subheader("Questions")
 
     rows = []
-    for q in filter.current_set:
+    for q in view:
         rows.append({
             "ID": getattr(q, "question_id", ""),
             "Exam": getattr(q, "exam", ""),
@@ -248,7 +249,7 @@ def page_advanced_explorer():
         if st.button("Run Clustering"):
             with st.spinner("Clustering..."):
                 try:
-                    clusters = filter.cluster()
+                    clusters = filter.cluster(view, backend="auto")
                     st.session_state.clusters = clusters
                     st.session_state.status = f"Clustered into {len(clusters)} groups."
                 except Exception as e:
@@ -262,7 +263,8 @@ def page_advanced_explorer():
             else:
                 with st.spinner("Exporting HTML..."):
                     tmp = Path(tempfile.mktemp(suffix=".html"))
-                    pdfy.render_cluster_to_html(clusters, str(tmp))
+                    with open(tmp, "w", encoding="utf-8") as file:
+                        pdfy.write_cluster_html(file, clusters, fragments=filter.fragments())
 
                 st.download_button(
                     "⬇️ Download HTML",
@@ -0,0 +1,59 @@
+"""
+Import time benchmark for jee_data_base_new_v
+usage: python benchmarks/bench_import.py [--runs N]
+
+Every measurement runs in a fresh interpreter. Run it on two revisions
+(git checkout) to compare, the heavy module list shows what an import pulled in.
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("numpy","hdbscan","sklearn","bs4","playwright","PyPDF2","requests","tqdm")
+
+SNIPPETS = {
+    "import package":"import jee_data_base_new_v",
+    "from package import Question":"from jee_data_base_new_v import Question",
+    "import + first DataBase()":"import jee_data_base_new_v as j; j.DataBase()",
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{snippet}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds":elapsed,"heavy":[m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(snippet:str,runs:int)->dict:
+    seconds = []
+    heavy = []
+    for _ in range(runs):
+        code = PROBE.format(snippet=snippet,heavy=HEAVY_MODULES)
+        output = subprocess.run(
+            [sys.executable,"-c",code],cwd=ROOT,capture_output=True,text=True,check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        heavy = result["heavy"]
+    return {"median":statistics.median(seconds),"min":min(seconds),"heavy":heavy}
+
+
+def main()->None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs",type=int,default=5)
+    args = parser.parse_args()
+
+    for name,snippet in SNIPPETS.items():
+        result = measure(snippet,args.runs)
+        print(f"{name:32} median {result['median']*1000:8.1f} ms  min {result['min']*1000:8.1f} ms  heavy: {', '.join(result['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+PdfEngine benchmark: single document mode against the chunked path
+usage: python benchmarks/bench_pdf.py [--modes chunks single auto] [--runs N] [--concurrency N]
+
+Renders the clustered html of the largest chapter, the largest subject and the
+whole DB with every mode and prints the median wall time, the page loads and
+the pages of the merged pdf. Needs playwright's chromium, the browser pool is
+warmed up before timing so launching it isn't counted.
+"""
+
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+from jee_data_base_new_v import DataBase,Filter,PdfEngine,pdfy
+
+
+async def timed_render(html:str,mode:str,runs:int,concurrency:int,output_path:Path)->tuple:
+    seconds = []
+    for _ in range(runs):
+        engine = PdfEngine(html,concurrency=concurrency,mode=mode)
+        start = time.perf_counter()
+        await engine.render(str(output_path))
+        seconds.append(time.perf_counter() - start)
+    page_loads = len(engine._get_documents(engine._get_cluster_list()))
+    return statistics.median(seconds),page_loads
+
+
+def count_pages(pdf_path:Path)->int:
+    import PyPDF2
+
+    return len(PyPDF2.PdfReader(str(pdf_path)).pages)
+
+
+async def run(args)->None:
+    filter = Filter(DataBase().chapters_dict)
+    full = filter.view(all_rows=True)
+    chapter = max(filter.store.chapter_meta,key=lambda key: len(full.by_chapter(key)))
+    subject = max(("physics","chemistry","mathematics"),key=lambda name: len(full.by_subject(name)))
+    scopes = {
+        f"chapter {chapter}":full.by_chapter(chapter),
+        f"subject {subject}":full.by_subject(subject),
+        "whole db":full,
+    }
+    output_dir = Path(tempfile.mkdtemp())
+    #first render pays the playwright + chromium start up
+    warm_up = pdfy.get_cluster_html(filter.cluster(scopes[f"chapter {chapter}"]),fragments=filter.fragments())
+    await PdfEngine(warm_up,mode="single").render(str(output_dir/"warm_up.pdf"))
+
+    for name,view in scopes.items():
+        html = pdfy.get_cluster_html(filter.cluster(view),fragments=filter.fragments())
+        print(f"{name} ({len(view)} questions)")
+        for mode in args.modes:
+            output_path = output_dir/f"{mode}.pdf"
+            seconds,page_loads = await timed_render(html,mode,args.runs,args.concurrency,output_path)
+            print(f"  {mode:7} {seconds:8.2f} s  {page_loads:5} page loads  {count_pages(output_path):5} pages")
+
+
+def main()->None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes",nargs="+",default=["chunks","single","auto"])
+    parser.add_argument("--runs",type=int,default=3)
+    parser.add_argument("--concurrency",type=int,default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
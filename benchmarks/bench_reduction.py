@@ -0,0 +1,91 @@
+"""
+Dimensionality reduction benchmark for Filter.cluster
+usage: python benchmarks/bench_reduction.py [--dims 8 16 32 64] [--methods pca random] [--runs N]
+
+Clusters a chapter, a subject and the whole DB at full dimension and at every
+target dimension, prints the HDBSCAN time (cluster cache disabled) and the
+adjusted rand index of the labels against the full dimension labels.
+Reducers are fitted (and cached) before timing, like they are in production.
+"""
+
+import time
+import argparse
+import statistics
+import numpy as np
+from math import comb
+
+from jee_data_base_new_v import DataBase,Filter,Reducer
+
+
+def adjusted_rand_index(labels_a,labels_b)->float:
+    """ARI of two labelings of the same items (noise -1 counts as a label)"""
+    _,a = np.unique(labels_a,return_inverse=True)
+    _,b = np.unique(labels_b,return_inverse=True)
+    contingency = np.zeros((a.max() + 1,b.max() + 1),dtype=np.int64)
+    np.add.at(contingency,(a,b),1)
+    pairs = sum(comb(int(n),2) for n in contingency.ravel())
+    pairs_a = sum(comb(int(n),2) for n in contingency.sum(axis=1))
+    pairs_b = sum(comb(int(n),2) for n in contingency.sum(axis=0))
+    expected = pairs_a*pairs_b/comb(len(a),2)
+    maximum = (pairs_a + pairs_b)/2
+    if maximum == expected:
+        return 1.0
+    return (pairs - expected)/(maximum - expected)
+
+
+def labels_of(clusters:dict)->dict:
+    return {
+        question.question_id:label
+        for label,questions in clusters.items() if label != "missing_embedding"
+        for question in questions
+    }
+
+
+def timed_cluster(filter:Filter,view,runs:int,**kwargs)->tuple:
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        clusters = filter.cluster(view,use_cache=False,**kwargs)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds),labels_of(clusters)
+
+
+def main()->None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dims",type=int,nargs="+",default=[8,16,32,64])
+    parser.add_argument("--methods",nargs="+",default=["pca","random"])
+    parser.add_argument("--runs",type=int,default=3)
+    args = parser.parse_args()
+
+    filter = Filter(DataBase().chapters_dict)
+    full = filter.view(all_rows=True)
+    chapter = max(filter.store.chapter_meta,key=lambda key: len(full.by_chapter(key)))
+    subject = max(("physics","chemistry","mathematics"),key=lambda name: len(full.by_subject(name)))
+    scopes = {
+        f"chapter {chapter}":full.by_chapter(chapter),
+        f"subject {subject}":full.by_subject(subject),
+        "whole db":full,
+    }
+    dims = [dim for dim in args.dims if dim < filter.embeddings.dim]
+    for method in args.methods:
+        for dim in dims:
+            Reducer.load(filter.cache,dim,method,filter.embeddings)
+    #first call pays the hdbscan import
+    filter.cluster(scopes[f"chapter {chapter}"],use_cache=False)
+
+    for name,view in scopes.items():
+        base_seconds,base_labels = timed_cluster(filter,view,args.runs)
+        question_ids = list(base_labels)
+        print(f"{name} ({len(view)} questions, {filter.embeddings.dim} dims): {base_seconds*1000:9.1f} ms")
+        for method in args.methods:
+            for dim in dims:
+                seconds,labels = timed_cluster(filter,view,args.runs,reduce_dim=dim,reduce_method=method)
+                ari = adjusted_rand_index(
+                    [base_labels[question_id] for question_id in question_ids],
+                    [labels[question_id] for question_id in question_ids]
+                )
+                print(f"  {method:6} {dim:4} dims {seconds*1000:9.1f} ms  x{base_seconds/seconds:5.1f}  ARI {ari:6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,8 @@
 from .core import *
 from .core import pdfy
+
+
+def __getattr__(name:str):
+    #forwards the lazily imported core exports (DataBase, Filter ...)
+    from . import core
+    return getattr(core,name)
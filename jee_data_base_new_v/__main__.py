@@ -0,0 +1,82 @@
+"""
+Command line maintenance tasks
+usage:
+    python -m jee_data_base_new_v rebuild-manifest
+    python -m jee_data_base_new_v build-knn [--k 32] [--block-size 1024]
+    python -m jee_data_base_new_v build-text-index
+    python -m jee_data_base_new_v dedup
+    python -m jee_data_base_new_v prepare-assets [--force]
+    python -m jee_data_base_new_v prefetch-images [--workers 8]
+"""
+
+import argparse
+from .core import cache_path,schema_version
+from .core.cache import Cache
+from .core.utils import rebuild_cache_manifest
+
+
+def main()->None:
+    parser = argparse.ArgumentParser(prog="jee_data_base")
+    commands = parser.add_subparsers(dest="command",required=True)
+    commands.add_parser("rebuild-manifest",help="rescan the cache folder and rewrite manifest.json")
+    build_knn = commands.add_parser("build-knn",help="precompute the top-k similar questions of every question")
+    build_knn.add_argument("--k",type=int,default=32)
+    build_knn.add_argument("--block-size",type=int,default=1024)
+    commands.add_parser("build-text-index",help="build the full-text (BM25) index of question text")
+    commands.add_parser("dedup",help="find repeated questions and store the canonical question mapping")
+    prepare_assets = commands.add_parser("prepare-assets",help="download MathJax, Bootstrap and the fonts for offline exports")
+    prepare_assets.add_argument("--force",action="store_true",help="download again even if the bundle is complete")
+    prefetch_images = commands.add_parser("prefetch-images",help="download every question/option/explanation image into the image cache")
+    prefetch_images.add_argument("--workers",type=int,default=8)
+    args = parser.parse_args()
+
+    if args.command == "rebuild-manifest":
+        manifest = rebuild_cache_manifest()
+        for key,entry in sorted(manifest["artifacts"].items()):
+            print(f"{key}: {entry['file_name']} {entry['size']} bytes")
+
+    elif args.command == "build-knn":
+        from .core.knn import KnnGraph
+
+        graph = KnnGraph.rebuild(Cache(cache_path,schema_version),k=args.k,block_size=args.block_size)
+        print(f"kNN graph: {len(graph.neighbours)} questions, {graph.k} neighbours each")
+
+    elif args.command == "build-text-index":
+        from .core.columnar import ColumnarStore
+        from .core.text_index import TextIndex
+
+        cache = Cache(cache_path,schema_version)
+        index = TextIndex.rebuild(cache,ColumnarStore.load(cache))
+        print(f"text index: {len(index.doc_lengths)} questions, {len(index.term_ids)} terms")
+
+    elif args.command == "dedup":
+        from .core.columnar import ColumnarStore
+        from .core.embeddings import EmbeddingsStore
+        from .core.dedup import DuplicateIndex
+
+        cache = Cache(cache_path,schema_version)
+        index = DuplicateIndex.rebuild(cache,ColumnarStore.load(cache),EmbeddingsStore.load(cache))
+        print(f"dedup: {len(index.groups())} groups, {index.n_duplicates} duplicates")
+
+    elif args.command == "prepare-assets":
+        from .core.assets import prepare_assets
+
+        bundle = prepare_assets(force=args.force)
+        size = sum(path.stat().st_size for path in bundle.rglob("*") if path.is_file())
+        print(f"asset bundle: {bundle} {size} bytes")
+
+    elif args.command == "prefetch-images":
+        from .core.columnar import ColumnarStore
+        from .core.image_cache import ImageCache
+
+        cache = Cache(cache_path,schema_version)
+        image_cache = ImageCache.shared(cache)
+        report = image_cache.prefetch_store(ColumnarStore.load(cache),workers=args.workers)
+        for url,error in sorted(report["failed"].items()):
+            print(f"failed {url}: {error}")
+        print(f"images: {report['fetched']} fetched, {report['cached']} already cached, {len(report['failed'])} failed")
+        print(image_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from pathlib import Path
+import importlib
 import importlib.util as lib
 
 spec = lib.find_spec("jee_data_base")
@@ -10,19 +11,42 @@ schema_version = "v007"
 EMBEDDINGS_LINK = "https://github.com/HostServer001/jee_mains_pyqs_data_base/releases/download/v007/1763101292-EmbeddingsChapters-v007.pkl"
 DATABASE_LINK = "https://github.com/HostServer001/jee_mains_pyqs_data_base/releases/download/v007/1762787474-DataBaseChapters-v007.pkl"
 
-from .data_base import DataBase
 from .chapter import Chapter
 from .question import Question
-from .pdf_engine import PdfEngine
-from .filter import Filter
 from .cache import Cache
 from .utils import *
 from .types import *
 
-db_health = check_cache_health("DataBaseChapters")
-embedidngs_health = check_cache_health("EmbeddingsChapters")
+#these pull in numpy (and the modules they use pull in more), they are imported
+#on first attribute access instead of at package import.
+#The cache itself is checked/downloaded by the first DataBase()
+_lazy_exports = {
+    "DataBase":".data_base",
+    "Filter":".filter",
+    "PdfEngine":".pdf_engine",
+    "BrowserPool":".pdf_engine",
+    "EmbeddingsStore":".embeddings",
+    "ColumnarStore":".columnar",
+    "FieldIndex":".index",
+    "ResultView":".view",
+    "Field":".query",
+    "HasImage":".query",
+    "ClusterCache":".cluster_cache",
+    "Reducer":".reduction",
+    "ClusterBackend":".clustering",
+    "KnnGraph":".knn",
+    "IvfIndex":".ivf",
+    "TextIndex":".text_index",
+    "DuplicateIndex":".dedup",
+    "FragmentStore":".fragments",
+    "prepare_assets":".assets",
+    "ImageCache":".image_cache",
+}
 
-if db_health == False:
-    download_cache("DataBaseChapters")
-if embedidngs_health == False:
-    download_cache("EmbeddingsChapters")
\ No newline at end of file
+def __getattr__(name:str):
+    module_name = _lazy_exports.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name,__name__),name)
+    globals()[name] = value
+    return value
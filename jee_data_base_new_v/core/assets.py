@@ -0,0 +1,153 @@
+"""
+This file has the local asset bundle of the offline exports
+
+The html documents load MathJax, Bootstrap and the Excalifont from CDNs. The bundle
+mirrors the files they use under ASSETS_PATH:
+    python -m jee_data_base_new_v prepare-assets
+Offline html exports reference a copy of the bundle next to the output
+(copy_assets + LocalAssetsWriter), offline pdf rendering serves the CDN urls from
+the bundle through playwright request interception (route_assets).
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+from pathlib import Path
+
+ASSETS_PATH = Path(__file__).resolve().parent.parent/"assets"
+#folder name of the bundle copy next to offline html exports
+ASSETS_DIR_NAME = "assets"
+MATHJAX_VERSION = "3.2.2"
+MATHJAX_TARBALL = f"https://registry.npmjs.org/mathjax/-/mathjax-{MATHJAX_VERSION}.tgz"
+#cdn url prefix -> folder of the bundle
+CDN_PREFIXES = {
+    "https://cdn.jsdelivr.net/npm/mathjax@3/":"mathjax/",
+    "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/":"bootstrap/",
+    "https://excalidraw.nyc3.cdn.digitaloceanspaces.com/fonts/":"fonts/",
+}
+#bundle file -> url it is downloaded from, MathJax comes from its npm tarball
+DOWNLOADS = {
+    "bootstrap/dist/css/bootstrap.min.css":"https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+    "fonts/Excalifont-Regular.woff2":"https://excalidraw.nyc3.cdn.digitaloceanspaces.com/fonts/Excalifont-Regular.woff2",
+}
+#what the documents load of MathJax: the combined component, the fonts of its chtml output
+#and the tex extensions it autoloads (\ce, \cancel, \color ...)
+MATHJAX_FILES = ("es5/tex-mml-chtml.js",)
+MATHJAX_FOLDERS = ("es5/output/chtml/fonts/woff-v2/","es5/input/tex/extensions/")
+REQUIRED_FILES = ("mathjax/es5/tex-mml-chtml.js",*DOWNLOADS)
+
+
+def has_assets(bundle:Path = ASSETS_PATH)->bool:
+    return all((Path(bundle)/name).is_file() for name in REQUIRED_FILES)
+
+
+def check_assets(bundle:Path = ASSETS_PATH)->Path:
+    """bundle, FileNotFoundError if it was never prepared"""
+    if not has_assets(bundle):
+        raise FileNotFoundError(
+            f"Asset bundle {bundle} is missing, run: python -m jee_data_base_new_v prepare-assets"
+        )
+    return Path(bundle)
+
+
+def prepare_assets(bundle:Path = ASSETS_PATH,force:bool = False)->Path:
+    """
+    Downloads the asset bundle (once, force downloads again)
+    :param:
+    bundle: folder to fill
+    force: download even if the bundle is complete
+    """
+    from .utils import fetch_file
+
+    bundle = Path(bundle)
+    if has_assets(bundle) and not force:
+        return bundle
+    for name,url in DOWNLOADS.items():
+        destination = bundle/name
+        destination.parent.mkdir(parents=True,exist_ok=True)
+        fetch_file(url,destination,segments=1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tarball = fetch_file(MATHJAX_TARBALL,Path(temp_dir)/"mathjax.tgz",segments=1)
+        with tarfile.open(tarball,"r:gz") as archive:
+            for member in archive.getmembers():
+                #npm tarballs keep everything under package/
+                name = member.name.split("/",1)[-1]
+                if not member.isfile() or not (name in MATHJAX_FILES or name.startswith(MATHJAX_FOLDERS)):
+                    continue
+                destination = bundle/"mathjax"/name
+                destination.parent.mkdir(parents=True,exist_ok=True)
+                with archive.extractfile(member) as source,open(f"{destination}.tmp","wb") as target:
+                    shutil.copyfileobj(source,target)
+                os.replace(f"{destination}.tmp",destination)
+    return bundle
+
+
+def bundle_file(url:str,bundle:Path = ASSETS_PATH)->Path|None:
+    """The bundle file serving a cdn url, None when the bundle doesn't have it"""
+    for prefix,folder in CDN_PREFIXES.items():
+        if url.startswith(prefix):
+            relative = url[len(prefix):].split("?",1)[0].split("#",1)[0]
+            path = (Path(bundle)/folder/relative).resolve()
+            if path.is_relative_to(Path(bundle).resolve()) and path.is_file():
+                return path
+            return None
+    return None
+
+
+def localize(text:str,base:str = ASSETS_DIR_NAME,images=None,assets_dir:Path|None = None)->str:
+    """
+    text with the cdn urls pointing into the bundle at base (a relative url or path)
+    :param:
+    images: an ImageCache, the cached <img> srcs point at base/images too, the images
+            are copied into assets_dir/images (the bundle copy of copy_assets)
+    """
+    for prefix,folder in CDN_PREFIXES.items():
+        text = text.replace(prefix,f"{base}/{folder}")
+    if images is not None:
+        text = images.localize(text,Path(assets_dir)/"images",f"{base}/images")
+    return text
+
+
+def copy_assets(destination:Path,bundle:Path = ASSETS_PATH)->Path:
+    """Copy of the bundle in destination/ASSETS_DIR_NAME, shared by every export in destination"""
+    target = Path(destination)/ASSETS_DIR_NAME
+    if not has_assets(target):
+        shutil.copytree(check_assets(bundle),target,dirs_exist_ok=True)
+    return target
+
+
+class LocalAssetsWriter:
+    """
+    Wraps a file the pdfy writers stream into, the cdn urls (and cached image srcs,
+    see localize) of every write are pointed at the bundle copy at base. The urls only
+    appear in the head and style templates and in whole question fragments, each
+    written with one call, so a url is never split between writes.
+    """
+    def __init__(self,file,base:str = ASSETS_DIR_NAME,images=None,assets_dir:Path|None = None)->None:
+        self.file = file
+        self.base = base
+        self.images = images
+        self.assets_dir = assets_dir
+
+    def write(self,text:str)->int:
+        return self.file.write(localize(text,self.base,self.images,self.assets_dir))
+
+
+async def route_assets(page,bundle:Path = ASSETS_PATH)->None:
+    """Serve the cdn urls a page requests from the bundle, they never touch the network"""
+    bundle = check_assets(bundle)
+
+    async def handle(route)->None:
+        url = route.request.url
+        path = bundle_file(url,bundle)
+        if path is not None:
+            await route.fulfill(path=str(path))
+        elif any(url.startswith(prefix) for prefix in CDN_PREFIXES):
+            #a cdn file the bundle doesn't mirror
+            await route.abort()
+        else:
+            await route.fallback()
+
+    await page.route("**/*",handle)
@@ -4,10 +4,31 @@ This file has the Cache class
 
 import os
 import re
+import json
 import time
 import pickle
+import shutil
+import hashlib
 import importlib
+import threading
 from pathlib import Path
+from contextlib import contextmanager
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+ARTIFACT_PATTERN = re.compile(r"^(\d+)-([A-Za-z0-9_]+)-(v\d+)\.(\w+)$")
+
+#manifest writes of every process using the cache directory go through this lock file
+MANIFEST_LOCK_NAME = "manifest.json.lock"
+MANIFEST_LOCK_TIMEOUT = 30
+#a lock file older than this was left behind by a process that died holding it
+MANIFEST_LOCK_STALE = 60
+
+#parsed manifests shared by all Cache objects, path -> (mtime_ns, manifest)
+_manifests = {}
+_manifest_lock = threading.RLock()
+#lock file path -> how many nested manifest_lock blocks of the thread holding _manifest_lock use it
+_manifest_file_locks = {}
 
 class Cache:
     """Handels cache creation ,loading and checking"""
@@ -28,14 +49,162 @@ Schema Version: {self.schema_version}
         self.schema_version = schema_version
     
     def del_all_cache(self,data_name:str):
-        pattern = rf"^\d*-{data_name}-v\d*.pkl$"
-        cache_files_paths = os.listdir(self.cache_path)
-        cache_files = [Path(file).name for file in cache_files_paths]
-        for i in cache_files:
-            if re.search(pattern,i):
-                os.remove(cache_files_paths[cache_files_paths.index(i)])
+        """Deletes every pkl cache of data_name, of all schema versions"""
+        manifest = self.load_manifest()
+        for key,entry in list(manifest["artifacts"].items()):
+            if entry["name"] == data_name and entry["extension"] == "pkl":
+                file_path = Path(self.cache_path)/entry["file_name"]
+                if file_path.exists():
+                    os.remove(file_path)
+                self.unregister(key)
 
-    
+    @property
+    def manifest_path(self)->Path:
+        return Path(self.cache_path)/MANIFEST_NAME
+
+    @contextmanager
+    def manifest_lock(self):
+        """
+        Holds the manifest for a read-modify-write, against other threads and other
+        processes (render workers, CLI jobs) writing into the same cache directory
+        """
+        lock_path = str(Path(self.cache_path)/MANIFEST_LOCK_NAME)
+        with _manifest_lock:
+            if lock_path in _manifest_file_locks:
+                _manifest_file_locks[lock_path] += 1
+            else:
+                _acquire_lock_file(lock_path)
+                _manifest_file_locks[lock_path] = 1
+            try:
+                yield
+            finally:
+                _manifest_file_locks[lock_path] -= 1
+                if not _manifest_file_locks[lock_path]:
+                    del _manifest_file_locks[lock_path]
+                    try:
+                        os.remove(lock_path)
+                    except FileNotFoundError:
+                        pass
+
+    @staticmethod
+    def artifact_key(data_name:str,schema_version:str,extension:str)->str:
+        return f"{data_name}-{schema_version}.{extension}"
+
+    def load_manifest(self)->dict:
+        """
+        Returns the cache manifest
+        {"version":..,"artifacts":{artifact_key:{name,schema_version,extension,file_name,size,mtime_ns,created}}}
+        size and mtime_ns come from stat (summed / latest over the files of a directory),
+        the sha256 of an artifact is only computed on request (checksum)
+        The parsed manifest is kept in memory until the file changes.
+        A missing or unreadable manifest is rebuilt from the cache directory.
+        """
+        manifest_path = self.manifest_path
+        with _manifest_lock:
+            try:
+                mtime_ns = manifest_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                return self.rebuild_manifest()
+            cached = _manifests.get(str(manifest_path))
+            if cached is not None and cached[0] == mtime_ns:
+                return cached[1]
+            try:
+                with open(manifest_path,"r",encoding="utf-8") as file:
+                    manifest = json.load(file)
+                if manifest.get("version") != MANIFEST_VERSION:
+                    raise ValueError("manifest version mismatch")
+            except ValueError:
+                return self.rebuild_manifest()
+            _manifests[str(manifest_path)] = (mtime_ns,manifest)
+            return manifest
+
+    def _save_manifest(self,manifest:dict)->None:
+        manifest_path = self.manifest_path
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path,"w",encoding="utf-8") as file:
+            json.dump(manifest,file,indent=1)
+        os.replace(temp_path,manifest_path)
+        _manifests[str(manifest_path)] = (manifest_path.stat().st_mtime_ns,manifest)
+
+    def rebuild_manifest(self)->dict:
+        """Scans the cache directory once and writes a fresh manifest of every artifact in it"""
+        with self.manifest_lock():
+            artifacts = {}
+            for file_name in sorted(os.listdir(self.cache_path)):
+                #a large cache takes a while to stat, keep the lock from looking abandoned
+                self.touch_manifest_lock()
+                entry = self._artifact_entry(Path(self.cache_path)/file_name)
+                if entry is None:
+                    continue
+                key = self.artifact_key(entry["name"],entry["schema_version"],entry["extension"])
+                #newest artifact wins when a name is cached more than once
+                if key not in artifacts or artifacts[key]["created"] <= entry["created"]:
+                    artifacts[key] = entry
+            manifest = {"version":MANIFEST_VERSION,"artifacts":artifacts}
+            self._save_manifest(manifest)
+            return manifest
+
+    def register(self,artifact_path)->dict:
+        """Adds (or replaces) an artifact written into the cache directory to the manifest"""
+        entry = self._artifact_entry(Path(artifact_path))
+        if entry is None:
+            raise ValueError(f"Not a cache artifact name: {Path(artifact_path).name}")
+        key = self.artifact_key(entry["name"],entry["schema_version"],entry["extension"])
+        with self.manifest_lock():
+            manifest = self.load_manifest()
+            manifest["artifacts"][key] = entry
+            self._save_manifest(manifest)
+        return entry
+
+    def unregister(self,key:str)->None:
+        with self.manifest_lock():
+            manifest = self.load_manifest()
+            if manifest["artifacts"].pop(key,None) is not None:
+                self._save_manifest(manifest)
+
+    def touch_manifest_lock(self)->None:
+        """Refreshes the lock file's mtime, holders doing long work call it so it isn't taken over as stale"""
+        try:
+            os.utime(Path(self.cache_path)/MANIFEST_LOCK_NAME)
+        except FileNotFoundError:
+            pass
+
+    def checksum(self,data_name:str,extension:str = "pkl")->str|None:
+        """sha256 of a cached artifact (every file of a directory), None if it is not cached"""
+        artifact_path = self.get_cache_file(data_name,extension=extension)
+        return None if artifact_path is None else _checksum(artifact_path)
+
+    def remove_artifact(self,artifact_path)->None:
+        """Deletes an artifact file or directory, its manifest entry too if it still points at it"""
+        artifact_path = Path(artifact_path)
+        match = ARTIFACT_PATTERN.match(artifact_path.name)
+        if match is not None:
+            _,name,schema_version,extension = match.groups()
+            key = self.artifact_key(name,schema_version,extension)
+            with self.manifest_lock():
+                entry = self.load_manifest()["artifacts"].get(key)
+                if entry is not None and entry["file_name"] == artifact_path.name:
+                    self.unregister(key)
+        if artifact_path.is_dir():
+            shutil.rmtree(artifact_path,ignore_errors=True)
+        elif artifact_path.exists():
+            os.remove(artifact_path)
+
+    def _artifact_entry(self,artifact_path:Path)->dict|None:
+        match = ARTIFACT_PATTERN.match(artifact_path.name)
+        if match is None or not artifact_path.exists():
+            return None
+        time_part,name,schema_version,extension = match.groups()
+        size,mtime_ns = _size_and_mtime(artifact_path)
+        return {
+            "name":name,
+            "schema_version":schema_version,
+            "extension":extension,
+            "file_name":artifact_path.name,
+            "size":size,
+            "mtime_ns":mtime_ns,
+            "created":int(time_part),
+        }
 
     def creat_cache_pkl(self,data_dict:dict,data_name:str = "DataBaseChapters")->None:
         """Create a cache
@@ -49,9 +218,9 @@ Schema Version: {self.schema_version}
 
         cache_name = f"{time_part}-{name_part}-{version_part}"
         cache_file_path = os.path.join(self.cache_path,f"{cache_name}.pkl")
-        cache_file = open(cache_file_path,"wb")
-
-        pickle.dump(data_dict,cache_file)
+        with open(cache_file_path,"wb") as cache_file:
+            pickle.dump(data_dict,cache_file)
+        self.register(cache_file_path)
     
 
     def load_cache_pkl(self,data_name:str)->dict:
@@ -60,62 +229,105 @@ Schema Version: {self.schema_version}
         :param:
         data_name: name part of the cache
         """
-        cache_file_path = self.cache_path
-        cache_file_paths = os.listdir(cache_file_path)
-        cache_files = [Path(file).name for file in cache_file_paths]
-        for file_name in cache_files:
-            parts = file_name.split("-")
-            if len(parts) < 3:
-                continue
-            if parts[1] == data_name and parts[-1] == f"{self.schema_version}.pkl":
-                cache_data_path = os.path.join(cache_file_path,file_name)
-        
-                class _FixUnpickler(pickle.Unpickler):
-                    def find_class(self, module, name):
-                        print("Unpickling:", module, name)  # debug
-
-                        # Handle bare "__main__"
-                        if module == "__main__":
-                            try:
-                                mod = importlib.import_module(f"jee_data_base.core.{name.lower()}")
+        cache_data_path = self.get_cache_file(data_name,extension="pkl")
+        if cache_data_path is not None:
+            class _FixUnpickler(pickle.Unpickler):
+                def find_class(self, module, name):
+                    # Handle bare "__main__"
+                    if module == "__main__":
+                        try:
+                            mod = importlib.import_module(f"jee_data_base.core.{name.lower()}")
+                            return getattr(mod, name)
+                        except Exception:
+                            mapping = {
+                                "Chapter": "jee_data_base.core.chapter",
+                                "Question": "jee_data_base.core.question",
+                            }
+                            if name in mapping:
+                                mod = importlib.import_module(mapping[name])
                                 return getattr(mod, name)
-                            except Exception:
-                                mapping = {
-                                    "Chapter": "jee_data_base.core.chapter",
-                                    "Question": "jee_data_base.core.question",
-                                }
-                                if name in mapping:
-                                    mod = importlib.import_module(mapping[name])
-                                    return getattr(mod, name)
-
-                        # Handle "core.*" modules
-                        if module.startswith("core."):
-                            # Example: "core.chapter" → "jee_data_base.core.chapter"
-                            new_module = f"jee_data_base.{module}"
-                            try:
-                                mod = importlib.import_module(new_module)
-                                return getattr(mod, name)
-                            except Exception as e:
-                                print("Remap failed:", new_module, name, e)
-                                raise
 
-                        return super().find_class(module, name)
+                    # Handle "core.*" modules
+                    if module.startswith("core."):
+                        # Example: "core.chapter" → "jee_data_base.core.chapter"
+                        new_module = f"jee_data_base.{module}"
+                        try:
+                            mod = importlib.import_module(new_module)
+                            return getattr(mod, name)
+                        except Exception as e:
+                            print("Remap failed:", new_module, name, e)
+                            raise
 
+                    return super().find_class(module, name)
 
-                with open(cache_data_path,"rb") as file:
-                    return _FixUnpickler(file).load()
+            with open(cache_data_path,"rb") as file:
+                return _FixUnpickler(file).load()
 
         raise FileNotFoundError(f"No cache file for '{data_name}' (schema {self.schema_version})")
-        
+
+    def get_cache_file(self,data_name:str,extension:str = "pkl")->Path|None:
+        """Returns path of the cache file for current schema version, None if it is not cached
+        :param:
+        data_name: name part of the cache
+        extension: file extension of the cache (pkl, npy ...)
+        """
+        key = self.artifact_key(data_name,self.schema_version,extension)
+        entry = self.load_manifest()["artifacts"].get(key)
+        if entry is None:
+            return None
+        cache_file_path = Path(self.cache_path)/entry["file_name"]
+        try:
+            stat = cache_file_path.stat()
+        except FileNotFoundError:
+            self.unregister(key)
+            return None
+        #a size mismatch means the file was truncated or replaced behind our back
+        if cache_file_path.is_file() and stat.st_size != entry["size"]:
+            return None
+        return cache_file_path
+
+    def new_cache_path(self,data_name:str,extension:str)->Path:
+        """Returns the path a new cache artifact should be written to
+        :param:
+        data_name: name part of the cache
+        extension: file extension of the cache (pkl, npy, cols ...)
+        """
+        time_part = str(time.time()).split(".")[0]
+        return Path(self.cache_path)/f"{time_part}-{data_name}-{self.schema_version}.{extension}"
+
+    def creat_cache_npy(self,array,data_name:str)->Path:
+        """Create a .npy cache of a numpy array
+        The file is written under a temporary name first and renamed into place
+        so a half written matrix is never picked up by get_cache_file
+        :param:
+        array: numpy array to store
+        data_name: name part of the cache
+        """
+        import numpy as np
+
+        cache_file_path = self.new_cache_path(data_name,extension="npy")
+        temp_file_path = f"{cache_file_path}.tmp"
+        with open(temp_file_path,"wb") as file:
+            np.save(file,array,allow_pickle=False)
+        os.replace(temp_file_path,cache_file_path)
+        self.register(cache_file_path)
+        return cache_file_path
+
+    def load_cache_npy(self,data_name:str,mmap_mode:str|None = "r"):
+        """Loads a .npy cache, memory-mapped read only by default
+        :param:
+        data_name: name part of the cache
+        mmap_mode: passed to numpy.load, None loads the array into memory
+        """
+        import numpy as np
+
+        cache_file_path = self.get_cache_file(data_name,extension="npy")
+        if cache_file_path is None:
+            raise FileNotFoundError(f"No cache file for '{data_name}' (schema {self.schema_version})")
+        return np.load(cache_file_path,mmap_mode=mmap_mode,allow_pickle=False)
+
     def is_cached(self,data_name:str)->bool:
-        pattern = rf"^\d*-{data_name}-{self.schema_version}.pkl$"
-        cache_files_paths = os.listdir(self.cache_path)
-        cache_files = [Path(file).name for file in cache_files_paths]
-        health = False
-        for i in cache_files:
-            if re.search(pattern,i):
-                health = True
-        return health
+        return self.get_cache_file(data_name,extension="pkl") is not None
 """ 
     def is_cached(self,data_name:str)->bool:
     #    Check if the data is cached and also checks the schema version
@@ -129,4 +341,57 @@ Schema Version: {self.schema_version}
             if file_name.split("-")[1] == data_name and file_name.split("-")[-1] == f"{self.schema_version}.pkl":
                 return True
         return False
- """
\ No newline at end of file
+ """
+
+
+def _artifact_files(artifact_path:Path)->list:
+    if artifact_path.is_dir():
+        return sorted(p for p in artifact_path.rglob("*") if p.is_file())
+    return [artifact_path]
+
+
+def _size_and_mtime(artifact_path:Path)->tuple:
+    """Total size and latest mtime_ns of a cache file, or of every file of a cache directory"""
+    size = 0
+    mtime_ns = artifact_path.stat().st_mtime_ns
+    for file_path in _artifact_files(artifact_path):
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            #removed while the directory was scanned (a temp file renamed into place)
+            continue
+        size += stat.st_size
+        mtime_ns = max(mtime_ns,stat.st_mtime_ns)
+    return size,mtime_ns
+
+
+def _checksum(artifact_path:Path)->str:
+    """sha256 of a cache file, or of the names and bytes of every file of a cache directory"""
+    digest = hashlib.sha256()
+    for file_path in _artifact_files(artifact_path):
+        if artifact_path.is_dir():
+            digest.update(str(file_path.relative_to(artifact_path)).encode("utf-8"))
+        with open(file_path,"rb") as file:
+            for block in iter(lambda: file.read(1 << 20),b""):
+                digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def _acquire_lock_file(lock_path:str)->None:
+    """Creates lock_path exclusively, waits while another process has it"""
+    deadline = time.monotonic() + MANIFEST_LOCK_TIMEOUT
+    while True:
+        try:
+            os.close(os.open(lock_path,os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return
+        except FileExistsError:
+            pass
+        try:
+            if time.time() - os.stat(lock_path).st_mtime > MANIFEST_LOCK_STALE:
+                os.remove(lock_path)
+                continue
+        except FileNotFoundError:
+            continue
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Cache manifest is locked by another process, remove {lock_path} if none is running")
+        time.sleep(0.01)
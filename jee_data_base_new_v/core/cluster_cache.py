@@ -0,0 +1,148 @@
+"""
+This file has the ClusterCache class
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from .cache import Cache
+
+
+class ClusterCache:
+    """
+    Cluster labels keyed by fingerprint(schema_version, question id set, params).
+    Two tiers: an in memory LRU and one .npy file per result inside a
+    ClusterLabels cache directory, so a chapter clustered once is never
+    clustered again (the data is static per schema version).
+    Labels are stored aligned with the sorted question ids of the set.
+    """
+    data_name = "ClusterLabels"
+    extension = "clusters"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Cache Path: {self.cache.cache_path}
+Resident Results: {len(self._memory)}
+Hits: {self.hits}
+Misses: {self.misses}
+"""
+        return template
+
+    def __init__(self,cache:Cache,max_entries:int=256)->None:
+        """Initialization of ClusterCache
+        :param:
+        cache: Cache the disk tier lives in (its schema_version is part of every key)
+        max_entries: results kept in the memory tier
+        """
+        self.cache = cache
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._directory = None
+        self._directory_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls,cache:Cache)->"ClusterCache":
+        """The ClusterCache of (cache_path, schema_version), shared by every Filter"""
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            cluster_cache = cls._loaded.get(key)
+            if cluster_cache is None:
+                cluster_cache = cls(cache)
+                cls._loaded[key] = cluster_cache
+            return cluster_cache
+
+    def fingerprint(self,sorted_question_ids:list,params:dict)->str:
+        """sha256 of schema version, clustering params and the (sorted) question ids"""
+        digest = hashlib.sha256()
+        digest.update(self.cache.schema_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(json.dumps(params,sort_keys=True,default=str).encode("utf-8"))
+        for question_id in sorted_question_ids:
+            digest.update(b"\0")
+            digest.update(str(question_id).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self,key:str)->np.ndarray|None:
+        """Labels stored under key, None on a miss"""
+        with self._memory_lock:
+            labels = self._memory.get(key)
+            if labels is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return labels
+
+        labels = self._load(key)
+        with self._memory_lock:
+            if labels is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key,labels)
+        return labels
+
+    def put(self,key:str,labels)->np.ndarray:
+        """Stores labels in both tiers, returns the read only array that was stored"""
+        labels = np.array(labels,dtype=np.int32)
+        labels.flags.writeable = False
+        with self._memory_lock:
+            self._remember(key,labels)
+        try:
+            self._save(key,labels)
+        except OSError:
+            #a read only cache dir just means no disk tier
+            pass
+        return labels
+
+    def clear_memory(self)->None:
+        with self._memory_lock:
+            self._memory.clear()
+
+    def _remember(self,key:str,labels:np.ndarray)->None:
+        self._memory[key] = labels
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _entries_dir(self,create:bool)->Path|None:
+        directory = self._directory
+        if directory is not None and directory.is_dir():
+            return directory
+        with self._directory_lock:
+            directory = self.cache.get_cache_file(self.data_name,extension=self.extension)
+            if directory is None and create:
+                directory = self.cache.new_cache_path(self.data_name,self.extension)
+                directory.mkdir(parents=True,exist_ok=True)
+                self.cache.register(directory)
+            self._directory = directory
+            return directory
+
+    def _load(self,key:str)->np.ndarray|None:
+        directory = self._entries_dir(create=False)
+        if directory is None:
+            return None
+        try:
+            labels = np.load(directory/f"{key}.npy",allow_pickle=False)
+        except (OSError,ValueError):
+            return None
+        labels.flags.writeable = False
+        return labels
+
+    def _save(self,key:str,labels:np.ndarray)->None:
+        directory = self._entries_dir(create=True)
+        file_path = directory/f"{key}.npy"
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path,"wb") as file:
+            np.save(file,labels,allow_pickle=False)
+        os.replace(temp_path,file_path)
+        #the manifest entry (size, mtime) was taken when the directory was still empty
+        self.cache.register(directory)
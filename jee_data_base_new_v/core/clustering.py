@@ -0,0 +1,225 @@
+"""
+This file has the clustering backends used by Filter.cluster
+
+usage:
+    filter.cluster(view,backend="hdbscan")                 #default, same as before
+    filter.cluster(view,backend="kmeans")                  #mini-batch k-means
+    filter.cluster(view,backend="knn",threshold=0.85)      #cosine kNN graph components
+    filter.cluster(view,backend="auto")                    #picked by set size
+"""
+
+import inspect
+import numpy as np
+
+#auto picks hdbscan up to this many questions, the knn graph up to AUTO_KNN_MAX, k-means above
+AUTO_HDBSCAN_MAX = 2000
+AUTO_KNN_MAX = 10000
+
+
+class ClusterBackend:
+    """
+    Base of the clustering backends: fit_predict maps an (n, dim) embedding array
+    to n integer labels, -1 is noise (a question that is not grouped with anything).
+    params() identifies the result in the cluster cache, it must contain every
+    option that changes the labels.
+    """
+    name = ""
+
+    def __repr__(self)->str:
+        return f"{type(self).__name__}({self.params()!r})"
+
+    def params(self)->dict:
+        raise NotImplementedError
+
+    def fit_predict(self,embeddings:np.ndarray)->np.ndarray:
+        raise NotImplementedError
+
+    def fit_predict_rows(self,embeddings,rows:np.ndarray,reducer=None)->np.ndarray:
+        """
+        Labels of the given EmbeddingsStore rows, this is what Filter.cluster calls.
+        Gathers (and reduces) the vectors then runs fit_predict, backends with
+        precomputed data (the kNN graph) override it.
+        """
+        vectors = embeddings.take(rows)
+        if reducer is not None:
+            vectors = reducer.transform(vectors)
+        return self.fit_predict(vectors)
+
+
+class HdbscanBackend(ClusterBackend):
+    """HDBSCAN, density based, finds its own number of clusters, slow on thousands of questions"""
+    name = "hdbscan"
+
+    def __init__(self,min_cluster_size:int=2,metric:str="euclidean")->None:
+        self.min_cluster_size = min_cluster_size
+        self.metric = metric
+
+    def params(self)->dict:
+        return {"algorithm":self.name,"min_cluster_size":self.min_cluster_size,"metric":self.metric}
+
+    def fit_predict(self,embeddings:np.ndarray)->np.ndarray:
+        #imported here, it is slow to import and only needed for clustering
+        import hdbscan
+
+        clusterer = hdbscan.HDBSCAN(min_cluster_size=self.min_cluster_size,metric=self.metric)
+        return clusterer.fit_predict(embeddings)
+
+
+class KMeansBackend(ClusterBackend):
+    """
+    scikit-learn MiniBatchKMeans on L2 normalized embeddings (so euclidean ~ cosine).
+    Linear in the set size, every question gets a cluster (no noise label).
+    n_clusters defaults to about one cluster per 8 questions.
+    """
+    name = "kmeans"
+
+    def __init__(self,n_clusters:int|None=None,batch_size:int=1024,seed:int=0)->None:
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.seed = seed
+
+    def params(self)->dict:
+        return {"algorithm":self.name,"n_clusters":self.n_clusters,"batch_size":self.batch_size,"seed":self.seed}
+
+    def fit_predict(self,embeddings:np.ndarray)->np.ndarray:
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_clusters = self.n_clusters
+        if n_clusters is None:
+            n_clusters = max(2,len(embeddings)//8)
+        n_clusters = min(n_clusters,len(embeddings))
+        clusterer = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=self.batch_size,
+            random_state=self.seed,
+            n_init=3
+        )
+        return clusterer.fit_predict(normalize_rows(embeddings))
+
+
+class KnnGraphBackend(ClusterBackend):
+    """
+    Connected components of the graph linking every question to its k nearest
+    neighbours with cosine similarity >= threshold. Similarities are computed in
+    blocks of rows, questions left without an edge are noise (-1).
+    With a precomputed KnnGraph (graph=..., Filter.cluster passes the cached one)
+    the edges are read from the graph instead: neighbours outside the set are
+    dropped rather than replaced, so nothing is multiplied at all.
+    """
+    name = "knn"
+
+    def __init__(self,threshold:float=0.8,k:int=10,block_size:int=1024,graph=None)->None:
+        self.threshold = threshold
+        self.k = k
+        self.block_size = block_size
+        self.graph = graph
+
+    def params(self)->dict:
+        params = {"algorithm":self.name,"threshold":self.threshold,"k":self.k}
+        if self._uses_graph():
+            params["graph"] = self.graph.k
+        return params
+
+    def _uses_graph(self)->bool:
+        return self.graph is not None and self.graph.k >= self.k
+
+    def fit_predict_rows(self,embeddings,rows:np.ndarray,reducer=None)->np.ndarray:
+        if reducer is not None or not self._uses_graph() or embeddings is not self.graph.embeddings:
+            return super().fit_predict_rows(embeddings,rows,reducer)
+        neighbours,scores = self.graph.neighbours[rows,:self.k],self.graph.scores[rows,:self.k]
+        positions = np.full(len(embeddings.question_ids),-1,dtype=np.int64)
+        positions[rows] = np.arange(len(rows))
+        targets = positions[neighbours]
+        edges = (targets >= 0) & (scores >= self.threshold)
+        sources = np.broadcast_to(np.arange(len(rows))[:,None],targets.shape)
+        return connected_components(len(rows),sources[edges],targets[edges])
+
+    def fit_predict(self,embeddings:np.ndarray)->np.ndarray:
+        vectors = normalize_rows(embeddings)
+        n = len(vectors)
+        k = min(self.k,n - 1)
+        sources = []
+        targets = []
+        for start in range(0,n,self.block_size):
+            block = vectors[start:start + self.block_size] @ vectors.T
+            block_rows = np.arange(start,start + len(block))
+            block[block_rows - start,block_rows] = -np.inf
+            neighbours = np.argpartition(block,-k,axis=1)[:,-k:]
+            similar = np.take_along_axis(block,neighbours,axis=1) >= self.threshold
+            sources.append(np.broadcast_to(block_rows[:,None],neighbours.shape)[similar])
+            targets.append(neighbours[similar])
+        return connected_components(n,np.concatenate(sources),np.concatenate(targets))
+
+
+BACKENDS = {
+    HdbscanBackend.name:HdbscanBackend,
+    KMeansBackend.name:KMeansBackend,
+    KnnGraphBackend.name:KnnGraphBackend,
+}
+
+
+def get_backend(backend,n_questions:int,**options)->ClusterBackend:
+    """
+    Resolve the backend argument of Filter.cluster
+    :param:
+    backend: a ClusterBackend, one of BACKENDS names, or 'auto'
+    n_questions: size of the set to cluster (used by 'auto')
+    options: passed to the backend class, with 'auto' only the ones the picked
+             backend takes (threshold only reaches knn, n_clusters only kmeans ...)
+    """
+    if isinstance(backend,ClusterBackend):
+        return backend
+    auto = backend == "auto"
+    if auto:
+        if n_questions <= AUTO_HDBSCAN_MAX:
+            backend = HdbscanBackend.name
+        elif n_questions <= AUTO_KNN_MAX:
+            backend = KnnGraphBackend.name
+        else:
+            backend = KMeansBackend.name
+    backend_class = BACKENDS.get(backend)
+    if backend_class is None:
+        raise ValueError(f"backend must be 'auto' or one of {list(BACKENDS)}")
+    if auto:
+        unknown = set(options) - set().union(*map(_option_names,BACKENDS.values()))
+        if unknown:
+            raise TypeError(f"No cluster backend takes {sorted(unknown)}")
+        accepted = _option_names(backend_class)
+        options = {name:value for name,value in options.items() if name in accepted}
+    return backend_class(**options)
+
+
+def _option_names(backend_class:type)->set:
+    return set(inspect.signature(backend_class.__init__).parameters) - {"self"}
+
+
+def normalize_rows(vectors)->np.ndarray:
+    vectors = np.asarray(vectors,dtype=np.float32)
+    norms = np.linalg.norm(vectors,axis=1,keepdims=True)
+    norms[norms == 0] = 1
+    return vectors/norms
+
+
+def connected_components(n:int,sources:np.ndarray,targets:np.ndarray)->np.ndarray:
+    """Component labels (0.. in order of first row) of an undirected edge list, isolated nodes get -1"""
+    parent = list(range(n))
+
+    def find(node:int)->int:
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node],node = root,parent[node]
+        return root
+
+    for source,target in zip(sources.tolist(),targets.tolist()):
+        source_root,target_root = find(source),find(target)
+        if source_root != target_root:
+            parent[max(source_root,target_root)] = min(source_root,target_root)
+
+    roots = np.fromiter((find(node) for node in range(n)),dtype=np.int64,count=n)
+    sizes = np.bincount(roots,minlength=n)
+    labels = np.full(n,-1,dtype=np.int64)
+    grouped = sizes[roots] > 1
+    labels[grouped] = np.unique(roots[grouped],return_inverse=True)[1].reshape(-1)
+    return labels
@@ -0,0 +1,394 @@
+"""
+This file has the ColumnarStore class and the Question/Chapter views built on it
+"""
+
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from pathlib import Path
+from collections import OrderedDict
+from collections.abc import Mapping
+from .cache import Cache
+from .question import Question
+from .chapter import Chapter
+
+
+#question fields grouped by how they are stored
+CATEGORICAL_FIELDS = (
+    "examGroup",
+    "exam",
+    "subject",
+    "chpaterGroup",
+    "chapter",
+    "paperTitle",
+    "difficulty",
+    "topic",
+    "type",
+    "examDate",
+)
+INTEGER_FIELDS = ("year",)
+FLAG_FIELDS = (
+    "isOutOfSyllabus",
+    "isBonus",
+    "isImgQuestion",
+    "isImgExplanation",
+)
+TEXT_FIELDS = ("question_id","question","explanation")
+JSON_FIELDS = ("answer","options","correct_options","isImgOption")
+
+#extra flag column, True if any option has an image
+ANY_IMG_OPTION = "isImgOptionAny"
+
+_DEFAULTS = {
+    "year": 0,
+    "examDate": None,
+    "answer": None,
+    "options": {},
+    "correct_options": [],
+    "isOutOfSyllabus": False,
+    "isBonus": False,
+    "isImgQuestion": False,
+    "isImgExplanation": False,
+    "isImgOption": [],
+}
+
+
+class ColumnarStore:
+    """
+    All questions of the data base stored column wise.
+    - categorical metadata -> int32 codes + vocabulary
+    - year -> int32, flags -> bool arrays
+    - question/explanation/options... -> utf-8 blobs indexed by int64 offsets
+    Rows are grouped per chapter so every chapter is one contiguous slice.
+    Saved as a directory of .npy files that are memory-mapped on load.
+    """
+    data_name = "ColumnarQuestions"
+    extension = "cols"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Questions: {self.n_rows}
+Total Chapters: {len(self.chapters_meta)}
+"""
+        return template
+
+    def __init__(self,columns:dict,vocabs:dict,chapters_meta:list)->None:
+        """Initialization of ColumnarStore
+        :param:
+        columns: column name -> numpy array (codes, ints, flags, blobs and offsets)
+        vocabs: categorical field -> list of distinct values (index is the code)
+        chapters_meta: list of dicts with key, name, parent_subject, start, stop
+        """
+        self.columns = columns
+        self.vocabs = vocabs
+        self.chapters_meta = chapters_meta
+        self.chapter_meta = {meta["key"]:meta for meta in chapters_meta}
+        self.chapter_slices = {
+            meta["key"]:slice(meta["start"],meta["stop"])
+            for meta in chapters_meta
+        }
+        self.n_rows = len(columns["year"])
+        self._row_of = None
+        self._question_ids = None
+
+    def __len__(self)->int:
+        return self.n_rows
+
+    def column(self,field:str):
+        """Codes/values array of a categorical, integer or flag field"""
+        return self.columns[field]
+
+    def text(self,field:str,row:int)->str:
+        """Decode one entry of a blob field"""
+        offsets = self.columns[f"{field}.offsets"]
+        start,stop = int(offsets[row]),int(offsets[row+1])
+        return bytes(self.columns[f"{field}.blob"][start:stop]).decode("utf-8")
+
+    def value(self,field:str,row:int):
+        """Python value of field for row, same type the Question attribute has"""
+        if field in CATEGORICAL_FIELDS:
+            return self.vocabs[field][self.columns[field][row]]
+        if field in INTEGER_FIELDS:
+            return int(self.columns[field][row])
+        if field in FLAG_FIELDS:
+            return bool(self.columns[field][row])
+        if field in TEXT_FIELDS:
+            return self.text(field,row)
+        if field in JSON_FIELDS:
+            return json.loads(self.text(field,row))
+        raise AttributeError(field)
+
+    def question_ids(self)->list:
+        """Question id of every row, decoded once"""
+        if self._question_ids is None:
+            offsets = self.columns["question_id.offsets"].tolist()
+            blob = bytes(self.columns["question_id.blob"])
+            self._question_ids = [
+                blob[offsets[row]:offsets[row+1]].decode("utf-8")
+                for row in range(self.n_rows)
+            ]
+        return self._question_ids
+
+    def row_of(self,question_id)->int|None:
+        """Row of a question id, the id index is built on first use"""
+        if self._row_of is None:
+            self._row_of = {question_id:row for row,question_id in enumerate(self.question_ids())}
+        return self._row_of.get(str(question_id))
+
+    def question(self,row:int)->"QuestionView":
+        return QuestionView(self,row)
+
+    def chapter(self,key:str)->"ChapterView":
+        return ChapterView(self,key)
+
+    def chapters(self)->dict:
+        """chapter key -> ChapterView for every chapter, in stored order"""
+        return {meta["key"]:ChapterView(self,meta["key"]) for meta in self.chapters_meta}
+
+    def lazy_chapters(self,max_resident:int|None = None)->"LazyChapterDict":
+        """chapter key -> ChapterView mapping that builds chapters on first access"""
+        return LazyChapterDict(self,max_resident=max_resident)
+
+    @classmethod
+    def from_chapters(cls,chapter_dict:dict)->"ColumnarStore":
+        """Build an in memory store from a chapter name -> Chapter dict"""
+        values = {field:[] for field in Question.fields}
+        chapters_meta = []
+        row = 0
+        for key,chapter in chapter_dict.items():
+            start = row
+            for question in chapter.question_dict.values():
+                for field in Question.fields:
+                    values[field].append(getattr(question,field,_DEFAULTS.get(field,"")))
+                row += 1
+            chapters_meta.append({
+                "key":key,
+                "name":getattr(chapter,"name",key),
+                "parent_subject":getattr(chapter,"parent_subject",""),
+                "start":start,
+                "stop":row,
+            })
+
+        columns = {}
+        vocabs = {}
+        for field in CATEGORICAL_FIELDS:
+            codes,vocab = _encode_categorical(values[field])
+            columns[field] = codes
+            vocabs[field] = vocab
+        for field in INTEGER_FIELDS:
+            columns[field] = np.asarray([int(v or 0) for v in values[field]],dtype=np.int32)
+        for field in FLAG_FIELDS:
+            columns[field] = np.asarray([bool(v) for v in values[field]],dtype=bool)
+        columns[ANY_IMG_OPTION] = np.asarray([any(v or []) for v in values["isImgOption"]],dtype=bool)
+        for field in TEXT_FIELDS:
+            blob,offsets = _encode_blob(str(v) for v in values[field])
+            columns[f"{field}.blob"] = blob
+            columns[f"{field}.offsets"] = offsets
+        for field in JSON_FIELDS:
+            blob,offsets = _encode_blob(json.dumps(v,default=str) for v in values[field])
+            columns[f"{field}.blob"] = blob
+            columns[f"{field}.offsets"] = offsets
+
+        return cls(columns,vocabs,chapters_meta)
+
+    def save(self,cache:Cache)->Path:
+        """Writes the store as a directory of .npy files plus meta.json into the cache"""
+        store_path = cache.new_cache_path(self.data_name,extension=self.extension)
+        temp_path = Path(f"{store_path}.tmp")
+        if temp_path.exists():
+            shutil.rmtree(temp_path)
+        temp_path.mkdir()
+        for name,array in self.columns.items():
+            np.save(temp_path/f"{name}.npy",np.ascontiguousarray(array),allow_pickle=False)
+        meta = {
+            "n_rows":self.n_rows,
+            "columns":list(self.columns.keys()),
+            "vocabs":self.vocabs,
+            "chapters":self.chapters_meta,
+        }
+        with open(temp_path/"meta.json","w",encoding="utf-8") as file:
+            json.dump(meta,file)
+        os.replace(temp_path,store_path)
+        cache.register(store_path)
+        return store_path
+
+    @classmethod
+    def open(cls,store_path)->"ColumnarStore":
+        """Memory-map a saved store directory"""
+        store_path = Path(store_path)
+        with open(store_path/"meta.json","r",encoding="utf-8") as file:
+            meta = json.load(file)
+        columns = {name:_load_column(store_path/f"{name}.npy") for name in meta["columns"]}
+        return cls(columns,meta["vocabs"],meta["chapters"])
+
+    @classmethod
+    def loaded(cls,cache:Cache)->"ColumnarStore|None":
+        """The shared store of (cache_path, schema_version) if load already opened it"""
+        with cls._lock:
+            return cls._loaded.get((str(cache.cache_path),cache.schema_version))
+
+    @classmethod
+    def load(cls,cache:Cache,source_name:str = "DataBaseChapters")->"ColumnarStore":
+        """
+        Loads the columnar store for cache's schema version.
+        If only the pickled chapter cache exists it is converted once.
+        Loaded stores are shared per (cache_path, schema_version).
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            store = cls._loaded.get(key)
+            if store is not None:
+                return store
+
+            store_path = cache.get_cache_file(cls.data_name,extension=cls.extension)
+            if store_path is None:
+                store_path = cls.from_chapters(cache.load_cache_pkl(source_name)).save(cache)
+
+            store = cls.open(store_path)
+            cls._loaded[key] = store
+            return store
+
+
+class QuestionView(Question):
+    """
+    Read only Question backed by a row of a ColumnarStore.
+    Attributes are decoded from the store on access.
+    """
+    __slots__ = ("_store","_row")
+
+    def __init__(self,store:ColumnarStore,row:int)->None:
+        object.__setattr__(self,"_store",store)
+        object.__setattr__(self,"_row",int(row))
+
+    def __getattr__(self,name:str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._store.value(name,self._row)
+
+    def __setattr__(self,name,value)->None:
+        raise AttributeError("QuestionView is read only")
+
+    def __eq__(self,other)->bool:
+        if isinstance(other,QuestionView):
+            return self._store is other._store and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self)->int:
+        return hash((id(self._store),self._row))
+
+    @property
+    def row(self)->int:
+        return self._row
+
+
+class ChapterView(Chapter):
+    """Chapter backed by a ColumnarStore slice, question_dict is built on first access"""
+    def __init__(self,store:ColumnarStore,key:str)->None:
+        meta = store.chapter_meta[key]
+        self._store = store
+        self.key = key
+        self.rows = store.chapter_slices[key]
+        self.parent_subject = meta["parent_subject"]
+        self.name = meta["name"]
+        self.question_dict_status = "healthy"
+        self.total_questions = self.rows.stop - self.rows.start
+        self._question_dict = None
+
+    @property
+    def question_dict(self)->dict:
+        if self._question_dict is None:
+            self._question_dict = {
+                counter:QuestionView(self._store,row)
+                for counter,row in enumerate(range(self.rows.start,self.rows.stop))
+            }
+        return self._question_dict
+
+
+class LazyChapterDict(Mapping):
+    """
+    Read only chapter key -> ChapterView mapping.
+    All chapter names are known from the store's chapter manifest, a chapter
+    (and its question views) is only built when it is first looked up.
+    max_resident bounds how many built chapters are kept, least recently
+    used ones are dropped first. None keeps everything.
+    """
+    def __repr__(self)->str:
+        template = f"""
+Total Chapters: {len(self)}
+Resident Chapters: {len(self._resident)}
+Max Resident: {self.max_resident}
+"""
+        return template
+
+    def __init__(self,store:ColumnarStore,max_resident:int|None = None)->None:
+        if max_resident is not None and max_resident < 1:
+            raise ValueError("max_resident must be at least 1 or None")
+        self.store = store
+        self.max_resident = max_resident
+        self._keys = [meta["key"] for meta in store.chapters_meta]
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self,key:str)->ChapterView:
+        with self._lock:
+            chapter = self._resident.get(key)
+            if chapter is not None:
+                self._resident.move_to_end(key)
+                return chapter
+            if key not in self.store.chapter_meta:
+                raise KeyError(key)
+            chapter = ChapterView(self.store,key)
+            self._resident[key] = chapter
+            if self.max_resident is not None and len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+            return chapter
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self)->int:
+        return len(self._keys)
+
+    def __contains__(self,key)->bool:
+        return key in self.store.chapter_meta
+
+    def resident(self)->list:
+        """Keys of the chapters currently built, least recently used first"""
+        with self._lock:
+            return list(self._resident.keys())
+
+
+def _load_column(column_path:Path):
+    try:
+        return np.load(column_path,mmap_mode="r",allow_pickle=False)
+    except ValueError:
+        #empty arrays can't be memory-mapped
+        return np.load(column_path,allow_pickle=False)
+
+
+def _encode_categorical(values:list)->tuple:
+    vocab = []
+    code_of = {}
+    codes = np.empty(len(values),dtype=np.int32)
+    for i,value in enumerate(values):
+        code = code_of.get(value)
+        if code is None:
+            code = len(vocab)
+            code_of[value] = code
+            vocab.append(value)
+        codes[i] = code
+    return codes,vocab
+
+
+def _encode_blob(texts)->tuple:
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded)+1,dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b"".join(encoded),dtype=np.uint8)
+    return blob,offsets
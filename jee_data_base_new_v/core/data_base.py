@@ -6,6 +6,7 @@ This file has the DataBase class.
 import os
 from .cache import Cache
 from .chapter import Chapter
+from .columnar import ColumnarStore
 from . import cache_path,data_base_path,schema_version
 from .utils import check_cache_health,download_cache
 
@@ -42,9 +43,16 @@ State: {self.state}
             self,
             data_base_path=data_base_path,
             cache_path=cache_path,
-            name:str="Data Base"
+            name:str="Data Base",
+            lazy:bool=True,
+            max_resident_chapters:int|None=None
         )->None:
-        """Initializing the DataBase"""
+        """Initializing the DataBase
+        :param:
+        lazy: build chapters only when they are first accessed from chapters_dict
+        max_resident_chapters: in lazy mode keep at most this many built chapters (LRU)
+                            None keeps every chapter once built
+        """
         cache = Cache(cache_path=cache_path,schema_version=schema_version)
 
         subjects = os.listdir(data_base_path)
@@ -53,15 +61,24 @@ State: {self.state}
         db_health = check_cache_health("DataBaseChapters")
         embedidngs_health = check_cache_health("EmbeddingsChapters")
         
+        missing = []
         if db_health == False:
             cache.del_all_cache("DataBaseChapters")
-            download_cache("DataBaseChapters")
+            missing.append("DataBaseChapters")
         if embedidngs_health == False:
             cache.del_all_cache("EmbeddingsChapters")
-            download_cache("EmbeddingsChapters")
+            missing.append("EmbeddingsChapters")
+        if missing:
+            download_cache(*missing)
 
-        if cache.is_cached("DataBaseChapters"):
-            chapter_dict = cache.load_cache_pkl("DataBaseChapters")
+        columnar_cached = cache.get_cache_file(ColumnarStore.data_name,extension=ColumnarStore.extension) is not None
+        if columnar_cached or cache.is_cached("DataBaseChapters"):
+            #columnar store is built from the pickle once, then memory-mapped
+            store = ColumnarStore.load(cache)
+            if lazy:
+                chapter_dict = store.lazy_chapters(max_resident=max_resident_chapters)
+            else:
+                chapter_dict = store.chapters()
         else:
             raise FileNotFoundError("Data base file not found")
             chapter_dict = dict()
@@ -92,4 +109,5 @@ State: {self.state}
         self.name = name
         self.subject_map = subject_map #dict
         self.chapters_dict = chapter_dict
+        self.store = store
         self.state = "healthy"
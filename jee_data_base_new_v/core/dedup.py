@@ -0,0 +1,248 @@
+"""
+This file has the DuplicateIndex class
+build: python -m jee_data_base_new_v dedup
+"""
+
+import zlib
+import weakref
+import threading
+import numpy as np
+from pathlib import Path
+from .cache import Cache
+from .columnar import ColumnarStore
+from .embeddings import EmbeddingsStore
+from .text_index import tokenize
+from .clustering import normalize_rows,connected_components
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+#a candidate pair is a duplicate when the estimated jaccard and the embedding cosine both pass
+JACCARD_THRESHOLD = 0.5
+COSINE_THRESHOLD = 0.9
+#pairs without an embedding on both sides need this jaccard instead
+JACCARD_ONLY_THRESHOLD = 0.9
+MINHASH_SEED = 1
+#LSH buckets up to this size yield every pair, larger ones (boilerplate text shared by
+#many questions) only pair each row with the first row and the row before it
+LSH_MAX_BUCKET = 64
+_PRIME = (1 << 31) - 1
+
+
+class DuplicateIndex:
+    """
+    Corpus wide near duplicate (repeated question) groups.
+    MinHash signatures of word shingles of the normalized question text are
+    bucketed with LSH, candidate pairs are confirmed with the estimated jaccard
+    and the cosine of their embeddings, confirmed pairs are joined into groups.
+    canonical[row] is the store row every duplicate maps to: the oldest question
+    of its group (lowest year, then lowest row), itself for unique questions.
+    Stored in the cache as the DuplicateCanonical .npy.
+    """
+    data_name = "DuplicateCanonical"
+
+    _loaded = {}
+    _lock = threading.Lock()
+    #indexes of stores that aren't the shared cached one, never saved
+    _built = weakref.WeakKeyDictionary()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Questions: {len(self.canonical)}
+Duplicate Groups: {len(self.groups())}
+Duplicates: {self.n_duplicates}
+"""
+        return template
+
+    def __init__(self,canonical)->None:
+        """Initialization of DuplicateIndex
+        :param:
+        canonical: int32 array, canonical store row of every store row
+        """
+        self.canonical = canonical
+        self.n_duplicates = int(np.count_nonzero(canonical != np.arange(len(canonical))))
+        self._groups = None
+
+    def canonical_row(self,row:int)->int:
+        return int(self.canonical[row])
+
+    def groups(self)->list:
+        """Duplicate groups as sorted int32 row arrays (canonical row first), only groups of 2 or more"""
+        if self._groups is None:
+            order = np.argsort(self.canonical,kind="stable")
+            canonicals,starts,counts = np.unique(self.canonical[order],return_index=True,return_counts=True)
+            groups = []
+            for canonical,start,count in zip(canonicals.tolist(),starts.tolist(),counts.tolist()):
+                if count > 1:
+                    rows = order[start:start + count]
+                    groups.append(np.concatenate([[canonical],rows[rows != canonical]]).astype(np.int32))
+            self._groups = groups
+        return self._groups
+
+    def collapse(self,rows:np.ndarray)->np.ndarray:
+        """rows without duplicates: the first row of each group is kept, order is unchanged"""
+        rows = np.asarray(rows)
+        _,first = np.unique(self.canonical[rows],return_index=True)
+        return rows[np.sort(first)]
+
+    @classmethod
+    def build(
+            cls,
+            store:ColumnarStore,
+            embeddings:EmbeddingsStore,
+            permutations:int = MINHASH_PERMUTATIONS,
+            bands:int = LSH_BANDS,
+            jaccard_threshold:float = JACCARD_THRESHOLD,
+            cosine_threshold:float = COSINE_THRESHOLD
+            )->"DuplicateIndex":
+        """
+        Runs the dedup job over every row of store
+        :param:
+        store: questions to deduplicate
+        embeddings: embeddings used to confirm candidate pairs
+        permutations: MinHash signature length (must be divisible by bands)
+        bands: LSH bands, more bands finds lower similarity candidates
+        jaccard_threshold: minimum estimated shingle jaccard of a duplicate
+        cosine_threshold: minimum embedding cosine of a duplicate
+        """
+        if permutations % bands:
+            raise ValueError("permutations must be divisible by bands")
+        signatures = minhash_signatures(
+            [store.text("question",row) for row in range(store.n_rows)],
+            permutations
+        )
+        #questions without text (image only) all share the empty signature, they are never candidates
+        has_text = np.flatnonzero((signatures != _PRIME).any(axis=1))
+
+        #LSH: rows sharing every value of a band are candidates
+        rows_per_band = permutations//bands
+        candidate_pairs = set()
+        for band in range(bands):
+            buckets = {}
+            band_values = np.ascontiguousarray(signatures[has_text,band*rows_per_band:(band + 1)*rows_per_band])
+            for row,key in zip(has_text.tolist(),map(bytes,band_values)):
+                buckets.setdefault(key,[]).append(row)
+            for bucket in buckets.values():
+                candidate_pairs.update(_bucket_pairs(bucket))
+
+        canonical = np.arange(store.n_rows,dtype=np.int32)
+        if not candidate_pairs:
+            return cls(canonical)
+
+        pairs = np.asarray(sorted(candidate_pairs),dtype=np.int64)
+        sources,targets = pairs[:,0],pairs[:,1]
+        jaccard = np.mean(signatures[sources] == signatures[targets],axis=1)
+
+        embedding_rows = embeddings.rows_for_store(store)
+        source_rows,target_rows = embedding_rows[sources],embedding_rows[targets]
+        embedded = (source_rows >= 0) & (target_rows >= 0)
+        cosine = np.zeros(len(pairs),dtype=np.float32)
+        if embedded.any():
+            source_vectors = normalize_rows(embeddings.take(source_rows[embedded]))
+            target_vectors = normalize_rows(embeddings.take(target_rows[embedded]))
+            cosine[embedded] = np.einsum("ij,ij->i",source_vectors,target_vectors)
+        confirmed = np.where(
+            embedded,
+            (jaccard >= jaccard_threshold) & (cosine >= cosine_threshold),
+            jaccard >= JACCARD_ONLY_THRESHOLD
+        )
+
+        labels = connected_components(store.n_rows,sources[confirmed],targets[confirmed])
+        years = np.asarray(store.column("year"),dtype=np.int64)
+        grouped = np.flatnonzero(labels >= 0)
+        #oldest first, so the first row of each label is its canonical question
+        grouped = grouped[np.lexsort((grouped,years[grouped],labels[grouped]))]
+        group_labels = labels[grouped]
+        first = np.ones(len(grouped),dtype=bool)
+        first[1:] = group_labels[1:] != group_labels[:-1]
+        canonical_of_label = grouped[first]
+        canonical[grouped] = canonical_of_label[np.cumsum(first) - 1]
+        return cls(canonical)
+
+    def save(self,cache:Cache)->Path:
+        return cache.creat_cache_npy(self.canonical,data_name=self.data_name)
+
+    @classmethod
+    def load(cls,cache:Cache,store:ColumnarStore,embeddings:EmbeddingsStore|None = None)->"DuplicateIndex":
+        """
+        Duplicate groups of store for cache's schema version, the dedup job runs on
+        first use (or when the cached result was built for a different number of rows,
+        the stale one is removed). Loaded indexes are shared per (cache_path, schema_version).
+        Only the shared store of cache (ColumnarStore.load) is deduplicated into the
+        cache, other stores get an in memory index.
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            if ColumnarStore.loaded(cache) is not store:
+                index = cls._built.get(store)
+                if index is None:
+                    embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+                    index = cls.build(store,embeddings)
+                    cls._built[store] = index
+                return index
+
+            index = cls._loaded.get(key)
+            if index is not None and len(index.canonical) == store.n_rows:
+                return index
+
+            index = None
+            if cache.get_cache_file(cls.data_name,extension="npy") is not None:
+                index = cls(cache.load_cache_npy(cls.data_name,mmap_mode=None))
+            if index is None or len(index.canonical) != store.n_rows:
+                return cls._rebuild(cache,store,embeddings)
+            cls._loaded[key] = index
+            return index
+
+    @classmethod
+    def rebuild(cls,cache:Cache,store:ColumnarStore,embeddings:EmbeddingsStore|None = None)->"DuplicateIndex":
+        """Runs the dedup job again and saves the result, the cached one is removed"""
+        with cls._lock:
+            return cls._rebuild(cache,store,embeddings)
+
+    @classmethod
+    def _rebuild(cls,cache:Cache,store:ColumnarStore,embeddings:EmbeddingsStore|None)->"DuplicateIndex":
+        old_path = cache.get_cache_file(cls.data_name,extension="npy")
+        embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+        index = cls.build(store,embeddings)
+        index_path = index.save(cache)
+        if old_path is not None and Path(old_path) != index_path:
+            cache.remove_artifact(old_path)
+        cls._loaded[(str(cache.cache_path),cache.schema_version)] = index
+        return index
+
+
+def _bucket_pairs(bucket:list):
+    """Candidate pairs (lower row first) of one LSH bucket, linear in its size past LSH_MAX_BUCKET"""
+    if len(bucket) <= LSH_MAX_BUCKET:
+        return ((bucket[j],bucket[i]) for i in range(1,len(bucket)) for j in range(i))
+    #confirmed pairs are joined into groups, so chaining still groups a bucket of true duplicates
+    pairs = {(bucket[0],row) for row in bucket[1:]}
+    pairs.update(zip(bucket[1:-1],bucket[2:]))
+    return pairs
+
+
+def shingles(text:str,size:int = SHINGLE_SIZE)->np.ndarray:
+    """31 bit hashes of the word size-grams of the normalized text"""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.fromiter(
+        (zlib.crc32(gram.encode("utf-8")) & _PRIME for gram in grams),
+        dtype=np.int64,
+        count=len(grams)
+    ))
+
+
+def minhash_signatures(texts:list,permutations:int = MINHASH_PERMUTATIONS)->np.ndarray:
+    """(len(texts), permutations) MinHash signatures, h(x) = (a*x + b) mod (2^31 - 1)"""
+    rng = np.random.default_rng(MINHASH_SEED)
+    a = rng.integers(1,_PRIME,size=permutations,dtype=np.int64)
+    b = rng.integers(0,_PRIME,size=permutations,dtype=np.int64)
+    signatures = np.full((len(texts),permutations),_PRIME,dtype=np.int64)
+    for row,text in enumerate(texts):
+        hashes = shingles(text)
+        if len(hashes):
+            signatures[row] = ((a[:,None]*hashes[None,:] + b[:,None]) % _PRIME).min(axis=1)
+    return signatures
@@ -0,0 +1,185 @@
+"""
+This file has the EmbeddingsStore class
+"""
+
+import weakref
+import threading
+import numpy as np
+from .cache import Cache
+
+
+class EmbeddingsStore:
+    """
+    Question embeddings as one contiguous float32 matrix plus a
+    question_id -> row index. The matrix is memory-mapped from the cache
+    so every process (streamlit worker) shares the same pages.
+    """
+    matrix_name = "EmbeddingsMatrix"
+    index_name = "EmbeddingsIndex"
+    source_name = "EmbeddingsChapters"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Embeddings: {len(self)}
+Dimension: {self.dim}
+"""
+        return template
+
+    def __init__(self,matrix,question_ids)->None:
+        """Initialization of EmbeddingsStore
+        :param:
+        matrix: 2D float32 array (memmap or in memory), one row per question
+        question_ids: question ids in row order
+        """
+        self.matrix = matrix
+        self.question_ids = question_ids
+        self.row_index = {str(question_id):row for row,question_id in enumerate(question_ids)}
+        self.dim = matrix.shape[1] if matrix.ndim == 2 else 0
+        self._store_rows = weakref.WeakKeyDictionary()
+        self._rows_in_store = weakref.WeakKeyDictionary()
+        self._norms = None
+
+    def __len__(self)->int:
+        return len(self.row_index)
+
+    def __contains__(self,question_id)->bool:
+        return str(question_id) in self.row_index
+
+    def get(self,question_id,default=None):
+        """dict like access to a single embedding row"""
+        row = self.row_index.get(str(question_id))
+        if row is None:
+            return default
+        return self.matrix[row]
+
+    def locate(self,question_ids)->tuple:
+        """
+        Map question ids to matrix rows
+        :param:
+        question_ids: iterable of question ids
+        :return: (rows, found) where rows is an int64 array of the rows of found ids
+                 and found is a bool array aligned with question_ids
+        """
+        row_index = self.row_index
+        positions = [row_index.get(str(question_id),-1) for question_id in question_ids]
+        positions = np.fromiter(positions,dtype=np.int64,count=len(positions))
+        found = positions >= 0
+        return positions[found],found
+
+    def rows_for_store(self,store)->np.ndarray:
+        """
+        Embedding row of every ColumnarStore row (-1 where the question has no embedding).
+        Built once per store, lets callers go from store rows to matrix rows with one
+        array lookup.
+        """
+        store_rows = self._store_rows.get(store)
+        if store_rows is None:
+            row_index = self.row_index
+            store_rows = np.fromiter(
+                (row_index.get(question_id,-1) for question_id in store.question_ids()),
+                dtype=np.int64,
+                count=store.n_rows
+            )
+            store_rows.flags.writeable = False
+            self._store_rows[store] = store_rows
+        return store_rows
+
+    def rows_in_store(self,store)->np.ndarray:
+        """
+        ColumnarStore row of every embedding row (-1 where the question is not in store),
+        the inverse of rows_for_store. Built once per store.
+        """
+        rows_in_store = self._rows_in_store.get(store)
+        if rows_in_store is None:
+            store_rows = self.rows_for_store(store)
+            found = store_rows >= 0
+            rows_in_store = np.full(len(self.question_ids),-1,dtype=np.int64)
+            rows_in_store[store_rows[found]] = np.flatnonzero(found)
+            rows_in_store.flags.writeable = False
+            self._rows_in_store[store] = rows_in_store
+        return rows_in_store
+
+    @property
+    def norms(self)->np.ndarray:
+        """L2 norm of every row, computed once"""
+        if self._norms is None:
+            norms = np.linalg.norm(np.asarray(self.matrix,dtype=np.float32),axis=1)
+            norms[norms == 0] = 1
+            norms.flags.writeable = False
+            self._norms = norms
+        return self._norms
+
+    def search(self,vector,k:int,rows:np.ndarray|None = None)->tuple:
+        """
+        Exact cosine top-k: one matmul over the candidate rows and an argpartition
+        :param:
+        vector: query vector of length dim
+        k: results wanted
+        rows: candidate matrix rows, None searches every row
+        :return: (rows, scores) best first
+        """
+        vector = np.asarray(vector,dtype=np.float32).reshape(-1)
+        vector = vector/(np.linalg.norm(vector) or 1)
+        if rows is None:
+            scores = (self.matrix @ vector)/self.norms
+            rows = np.arange(len(scores))
+        else:
+            rows = np.asarray(rows,dtype=np.int64)
+            scores = (self.matrix[rows] @ vector)/self.norms[rows]
+        k = min(k,len(scores))
+        if k <= 0:
+            return rows[:0],scores[:0]
+        top = np.argpartition(-scores,k - 1)[:k]
+        top = top[np.argsort(-scores[top],kind="stable")]
+        return rows[top],scores[top]
+
+    def take(self,rows):
+        """Fancy index rows out of the matrix (copies only the selected rows)"""
+        return self.matrix[rows]
+
+    @classmethod
+    def from_dict(cls,embeddings_dict:dict)->"EmbeddingsStore":
+        """Build an in memory store from the legacy question_id -> list dict"""
+        question_ids = list(embeddings_dict.keys())
+        if not question_ids:
+            return cls(np.zeros((0,0),dtype=np.float32),[])
+        matrix = np.asarray(
+            [embeddings_dict[question_id] for question_id in question_ids],
+            dtype=np.float32
+        )
+        return cls(np.ascontiguousarray(matrix),question_ids)
+
+    def save(self,cache:Cache)->None:
+        """Writes matrix and index as .npy files into the cache"""
+        index = np.asarray([str(question_id) for question_id in self.question_ids])
+        cache.creat_cache_npy(index,data_name=self.index_name)
+        cache.creat_cache_npy(np.ascontiguousarray(self.matrix,dtype=np.float32),data_name=self.matrix_name)
+
+    @classmethod
+    def load(cls,cache:Cache)->"EmbeddingsStore":
+        """
+        Loads the memory-mapped store for cache's schema version.
+        If only the pickled EmbeddingsChapters cache exists it is converted
+        once and the .npy files are used from then on.
+        Loaded stores are shared per (cache_path, schema_version).
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            store = cls._loaded.get(key)
+            if store is not None:
+                return store
+
+            if (
+                cache.get_cache_file(cls.matrix_name,extension="npy") is None
+                or cache.get_cache_file(cls.index_name,extension="npy") is None
+            ):
+                cls.from_dict(cache.load_cache_pkl(cls.source_name)).save(cache)
+
+            matrix = cache.load_cache_npy(cls.matrix_name,mmap_mode="r")
+            index = cache.load_cache_npy(cls.index_name,mmap_mode=None)
+            store = cls(matrix,index.tolist())
+            cls._loaded[key] = store
+            return store
@@ -2,168 +2,297 @@
 This file has Filter class
 """
 
+import io
 import os
 import time
-import json
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from .pdf_engine import PdfEngine
 from pathlib import Path
-import hdbscan
 import numpy as np
 import datetime as dt
 from typing import Literal, Self
 from .cache import Cache
+from .embeddings import EmbeddingsStore
+from .cluster_cache import ClusterCache
+from .reduction import Reducer
+from .clustering import ClusterBackend,KnnGraphBackend,get_backend
+from .knn import KnnGraph
+from .ivf import IvfIndex
+from .text_index import TextIndex
+from .dedup import DuplicateIndex
+from .fragments import FragmentStore
+from .assets import LocalAssetsWriter,copy_assets,localize
+from .image_cache import ImageCache
+from .columnar import ColumnarStore,ChapterView,QuestionView
+from .index import FieldIndex
+from .query import Expr,equals
+from .view import ResultView
+from .question import Question
 from . import cache_path,schema_version
-from .pdfy import get_html,get_cluster_html,get_cluster_skim_html
+from .pdfy import write_html,write_cluster_html,write_cluster_skim_html
 #from core.data_base import cache_path,schema_version
 #from sklearn.preprocessing import StandardScaler
 
 
+#fields get_possible_filter_values / get_facets don't report
+FACET_SKIP = {
+    "embedding",
+    "question",
+    "options",
+    "question_id",
+    "explanation",
+    "answer",
+    "isImgQuestion",
+    "isImgExplanation",
+    "isImgOption",
+    "correct_options",
+}
+
+
 class Filter:
     def __init__(self,chapter_class_dict:dict)->None:
         self.chapter_class_dict = chapter_class_dict
         self.filterable_param = self.get_filter_params()
         cache = Cache(cache_path,schema_version)
-        self.embeddings_dict = cache.load_cache_pkl("EmbeddingsChapters")
-        self.current_set = [
-            question
-            for chapter in self.chapter_class_dict.values()
-            for question in chapter.question_dict.values()
-        ]
-    
+        self.cache = cache
+        self.embeddings = EmbeddingsStore.load(cache)
+        self.cluster_cache = ClusterCache.shared(cache)
+        self.store = self._get_store(chapter_class_dict)
+        self.index = FieldIndex.for_store(self.store)
+        self.all_rows = np.arange(self.store.n_rows,dtype=np.int32)
+        self.all_rows.flags.writeable = False
+        self.rows = self.all_rows
+
+    @staticmethod
+    def _get_store(chapter_class_dict)->ColumnarStore:
+        """The columnar store behind chapter_class_dict, plain Chapter dicts are converted in memory"""
+        store = getattr(chapter_class_dict,"store",None)
+        if store is not None:
+            return store
+        chapters = list(chapter_class_dict.values())
+        if chapters and all(isinstance(chapter,ChapterView) for chapter in chapters):
+            store = chapters[0]._store
+            if all(chapter._store is store for chapter in chapters):
+                return store
+        return ColumnarStore.from_chapters(chapter_class_dict)
+
+    @property
+    def rows(self)->np.ndarray:
+        """Row ids (into self.store) of the current set, in current set order"""
+        return self._rows
+
+    @rows.setter
+    def rows(self,rows)->None:
+        self._rows = rows
+        self._current_set = None
+
+    @property
+    def current_set(self)->list:
+        if self._current_set is None:
+            store = self.store
+            self._current_set = [store.question(row) for row in self._rows.tolist()]
+        return self._current_set
+
+    @current_set.setter
+    def current_set(self,questions:list)->None:
+        store = self.store
+        rows = []
+        for question in questions:
+            if isinstance(question,QuestionView) and question._store is store:
+                rows.append(question.row)
+            else:
+                row = store.row_of(question.question_id)
+                if row is None:
+                    raise ValueError(f"Question {question.question_id} is not in the data base")
+                rows.append(row)
+        self.rows = np.asarray(rows,dtype=np.int32)
+        self._current_set = list(questions)
+
     def reset(self)->Self:
-        self.current_set = [
-            question
-            for chapter in self.chapter_class_dict.values()
-            for question in chapter.question_dict.values()
-        ]
+        self.rows = self.all_rows
+        return self
+
+    def view(self,all_rows:bool=False)->ResultView:
+        """
+        Immutable view of the current set (or of every question with all_rows=True).
+        Views never touch the filter, use them instead of the mutating by_* methods
+        when one Filter is shared between sessions/threads.
+        """
+        if all_rows or self._rows is self.all_rows:
+            return ResultView(self.store,self.all_rows,full=True)
+        return ResultView(self.store,self._rows)
+
+    def _apply(self,view:ResultView)->Self:
+        self.rows = view.rows
         return self
     
     def get_filter_params(self)->list:
-        random_question = self.chapter_class_dict["probability"].question_dict[0]
-        param_dict = random_question.__dict__
-        return param_dict.keys()
+        return list(Question.fields)
     
-    def get_possible_filter_values(self)->dict:
-        params = self.get_filter_params()
+    def get_possible_filter_values(self,view:ResultView|None=None)->dict:
+        """
+        field -> distinct values in the current set (or view), fields where every
+        question has its own value are left out. Computed from facet counts.
+        """
+        view = self.view() if view is None else view
         possible_values = {}
-        if not self.current_set:
+        if not view:
             return possible_values
 
-        static_skip = {
-            "embedding",
-            "question",
-            "options",
-            "question_id",
-            "explanation",
-            "answer",
-            "isImgQuestion",
-            "isImgExplanation",
-            "isImgOption",
-            "correct_options",
-        }
-
-        for param in params:
-            if param in static_skip:
+        for param,facet in self.get_facets(view).items():
+            if len(facet) == len(view):
                 continue
-
-            seen = {}
-            for question in self.current_set:
-                val = getattr(question, param, None)
-                # create a stable key for unhashable types
-                try:
-                    # prefer using the raw value when hashable
-                    hash(val)
-                    key = ("h", val)
-                except Exception:
-                    try:
-                        key = ("j", json.dumps(val, default=str, sort_keys=True))
-                    except Exception:
-                        key = ("r", repr(val))
-                if key not in seen:
-                    seen[key] = val
-
-            if len(seen) == len(self.current_set):
-                continue
-
-            possible_values[param] = list(seen.values())
+            possible_values[param] = list(facet.keys())
 
         return possible_values
+
+    def get_facets(self,view:ResultView|None=None)->dict:
+        """field -> {value: count} for every filterable field of the current set (or view)"""
+        view = self.view() if view is None else view
+        params = [param for param in self.get_filter_params() if param not in FACET_SKIP]
+        return view.facets(params)
         
     
     def by_year(self,year:int)->Self:
-        self.current_set = [
-            question
-            for question in self.current_set if question.year == year
-        ]
-        return self
+        return self._apply(self.view().by_year(year))
     
     def by_subject(self,subject:str)->Self:
-        self.current_set = [
-            question
-            for question in self.current_set if question.subject == subject
-        ]
-        return self
+        return self._apply(self.view().by_subject(subject))
     
     def by_topic(self,topic:str)->Self:
-        self.current_set = [
-            question
-            for question in self.current_set if question.topic == topic
-        ]
-        return self
+        return self._apply(self.view().by_topic(topic))
     
     def by_n_last_yrs(self,n:int)->Self:
-        current_scope = self.get()
-        last_n_pyqs = []
-        current_year = dt.datetime.now().year
-        for i in range(n):
-            self.current_set = current_scope
-            nth_year = self.by_year(current_year-i).get()
-            last_n_pyqs.extend(nth_year)
-        self.current_set = last_n_pyqs
-        return self
+        return self._apply(self.view().by_n_last_yrs(n))
 
     
     def by_chapter(self,chapter:str)->Self:
-        self.current_set = [
-            question
-            for question in self.current_set if question.chapter == chapter
-        ]
-        return self
+        return self._apply(self.view().by_chapter(chapter))
      
     def by_difficulty(self,difficulty:str)->Self:
-        self.current_set = [
-            question
-            for question in self.current_set if question.difficulty == difficulty
-        ]
-        return self
+        return self._apply(self.view().by_difficulty(difficulty))
+
+    def by_text(self,query:str,match:Literal["all","any"]="all")->Self:
+        """Keeps questions whose text matches query, ranked best BM25 match first (see text_search)"""
+        return self._apply(self.text_search(query,match=match))
+
+    def text_index(self)->TextIndex:
+        """Full-text index of question, option and explanation text (built and cached on first use)"""
+        return TextIndex.load(self.cache,self.store)
+
+    def text_search(self,query:str,view:ResultView|None=None,match:Literal["all","any"]="all")->ResultView:
+        """
+        Full-text search with BM25 ranking
+        :param:
+        query: words and "quoted phrases" ("projectile" incline, "conditional probability"),
+               html tags and TeX delimiters are ignored, matching is case insensitive
+        view: only search inside this view, defaults to the current set
+        match: 'all' every word must appear, 'any' at least one word, phrases always must
+        :return: view of the matches, best match first
+        """
+        view = self.view() if view is None else view
+        rows,_ = self.text_index().search(query,None if view.full else view.rows,match)
+        return ResultView(self.store,rows)
 
     def get(self)->list:
         return self.current_set
 
+    def query(self,expr:Expr|None=None,**field_values)->ResultView:
+        """
+        Evaluate a query expression over the current set in one vectorized pass.
+        Doesn't change the filter, returns an immutable ResultView.
+        :param:
+        - expr: expression built from query.Field / HasImage combined with & | ~
+        - field_values: shorthand for Field(name) == value, ANDed with expr
+        """
+        if field_values:
+            expr = equals(**field_values) if expr is None else expr & equals(**field_values)
+        view = self.view()
+        if expr is None:
+            return view
+        return view.query(expr)
+
     async def render_chap_lastNyrs(
             self,
             destination:str,
             chap_name:str,
             N:int=5,
             skim:bool=True,
-            output_file_format:Literal["html","pdf"]="html"
+            output_file_format:Literal["html","pdf"]="html",
+            collapse_duplicates:bool=False,
+            workers:int|None=1,
+            offline:bool=False
             )->None:
-        all_q = self.by_chapter(chap_name).by_n_last_yrs(N).get()
+        """
+        Renders one clustered file per topic of the chapter's last N years into destination/chap_name.
+        Topics are clustered and turned into html in this process by default, workers > 1 (None:
+        one per topic up to the cpu count) fans them out to a spawn process pool. Spawned workers
+        import the calling script again, so a script using workers must guard its entry point
+        with `if __name__ == "__main__":`; if the pool breaks the topics are rendered in this
+        process instead. pdfs are converted concurrently with pages of the shared BrowserPool.
+        Files are the same as rendering topic by topic and are returned in topic order.
+        offline html files share one copy of the asset bundle (and of the cached images they
+        use) in destination/chap_name/assets.
+        """
+        if output_file_format not in ("html","pdf"):
+            raise ValueError("We don't support this file format. Supported file formats are 'html','pdf'")
+        chapter_view = self.view().by_chapter(chap_name).by_n_last_yrs(N)
+        if collapse_duplicates:
+            chapter_view = self.collapse_duplicates(chapter_view)
         os.makedirs(str(Path(destination)/chap_name),exist_ok=True)
+        #every topic of the window, also when each question has its own topic
+        topics = list(chapter_view.facet("topic"))
+        topic_views = [chapter_view.by_topic(topic) for topic in topics]
+        htmls = await self._cluster_htmls(topic_views,skim=skim,title=chap_name,style="dark",workers=workers)
+
         files = []
-        for topic in self.get_possible_filter_values()["topic"]:
-            file_path = str(Path(destination)/chap_name/f"{topic}.{output_file_format}")
-            self.current_set = all_q
-            self.by_topic(topic)
-            file = await self.render(
-                file_path,
-                output_file_format=output_file_format,
-                cluster=True,
-                skim = skim,
-                title = chap_name
-            )
-            files.append(file)
+        for topic,html in zip(topics,htmls):
+            file_path = Path(destination).resolve()/chap_name/f"{topic}.{output_file_format}"
+            files.append(self.get_final_path(file_path,chap_name,output_file_format))
+
+        if output_file_format == "html":
+            if offline:
+                assets_dir = copy_assets(Path(destination).resolve()/chap_name)
+                htmls = [localize(html,images=self.images(),assets_dir=assets_dir) for html in htmls]
+            for final_path,html in zip(files,htmls):
+                with open(final_path,"w",encoding="utf-8")as file:
+                    file.write(html)
+            return files
+
+        await asyncio.gather(*(
+            PdfEngine(html,offline=offline).render(final_path)
+            for final_path,html in zip(files,htmls)
+        ))
         return files
+
+    async def _cluster_htmls(self,views:list,skim:bool,title:str,style:str,workers:int|None=1)->list:
+        """Clustered html of every view, in order. Fans out to the render process pool when it can."""
+        if workers is None:
+            workers = min(len(views),os.cpu_count() or 1)
+        #workers reopen the store from the cache, so only the shared cached store can be fanned out
+        shared_store = ColumnarStore.loaded(self.cache) is self.store
+        if workers <= 1 or len(views) <= 1 or not shared_store:
+            return [_cluster_html(self,view,skim,title,style) for view in views]
+
+        #build every cache artifact the workers open in the parent, once, so they only read them
+        #(embeddings are loaded by __init__)
+        self.fragments()
+        self.cluster_cache._entries_dir(create=True)
+        loop = asyncio.get_running_loop()
+        pool = _get_render_pool(workers)
+        #jobs carry row ids, not QuestionViews (those hold the whole store)
+        try:
+            return await asyncio.gather(*(
+                loop.run_in_executor(pool,_cluster_html_job,np.asarray(view.rows),skim,title,style)
+                for view in views
+            ))
+        except BrokenProcessPool:
+            #e.g. the calling script has no __main__ guard and every spawned worker died importing it
+            _reset_render_pool(pool)
+            return [_cluster_html(self,view,skim,title,style) for view in views]
     
 
     def get_final_path(self, file_path: Path, title: str, output_file_format: Literal["html", "pdf"]):
@@ -186,7 +315,10 @@ class Filter:
             cluster:bool=False,
             skim:bool=False,
             style:Literal["dark","white"]="dark",
-            title:str= False
+            title:str= False,
+            view:ResultView|None=None,
+            collapse_duplicates:bool=False,
+            offline:bool=False
             )->Path:
         """
         Converts current set to html/pdf based on the arugment given.
@@ -200,62 +332,190 @@ class Filter:
         - skim: True/False wheater to enable skim mode. Default false
         - style: dark/white theme of output file
         - title: title of html
+        - view: render this ResultView instead of the current set
+        - collapse_duplicates: keep only the first question of every repeated question group
+        - offline: no CDNs, html files load MathJax, Bootstrap and the fonts from a copy of the
+                asset bundle next to them (assets/, with the images of the image cache they use),
+                pdfs are rendered with the bundle.
+                Run python -m jee_data_base_new_v prepare-assets once first
         """
         if title == False:
             title = f"Rendered_{str(time.time()).split('.')[0]}"
         if output_file_format not in ("html","pdf"):
             raise ValueError("We don't support this file format. Supported file formats are 'html','pdf'")
-        
-        if cluster == True and skim == True:
-            html = get_cluster_skim_html(
-                cluster_dict=self.cluster(),
-                title=title,
-                mode=style
-                )
-        if cluster == True and skim == False:
-            html = get_cluster_html(
-                cluster_dict=self.cluster(),
-                title=title,
-                mode=style
-            )
-        
-        if cluster == False:
-            html = get_html(
-                self.current_set,
-                style=style
-            )
+        if collapse_duplicates:
+            view = self.collapse_duplicates(view)
         
         file_path = Path(file_path).resolve()
         final_path = self.get_final_path(file_path,title,output_file_format)
 
-        
         if output_file_format == "html":
-            with open(final_path,"w",encoding="utf-8")as file:
-                file.write(html)
+            #streamed into the file section by section, the document is never one big string
+            temp_path = f"{final_path}.tmp"
+            #a missing bundle raises before an empty temp file is left behind
+            assets_dir = copy_assets(Path(final_path).parent) if offline else None
+            with open(temp_path,"w",encoding="utf-8")as file:
+                if offline:
+                    file = LocalAssetsWriter(file,images=self.images(),assets_dir=assets_dir)
+                self._write_html(file,view,cluster,skim,title,style)
+            os.replace(temp_path,final_path)
             return final_path
         
         if output_file_format == "pdf":
-            pdf_engine = PdfEngine(html)
+            html = io.StringIO()
+            self._write_html(html,view,cluster,skim,title,style)
+            pdf_engine = PdfEngine(html.getvalue(),offline=offline)
             # await self._convert_html_to_pdf_with_images(html,final_path)
             await pdf_engine.render(final_path)
             return final_path
 
+    def _write_html(self,file,view:ResultView|None,cluster:bool,skim:bool,title:str,style:str)->None:
+        if cluster == True:
+            _write_cluster_html(self,file,view,skim,title,style)
+        else:
+            write_html(file,self.view() if view is None else view,style=style,fragments=self.fragments())
+
+    def images(self)->ImageCache:
+        """Content addressed store of the question images (filled by prefetch_images)"""
+        return ImageCache.shared(self.cache)
 
-    def cluster(self)->dict:
+    def prefetch_images(self,workers:int=8)->dict:
+        """Downloads every image the data base references into the image cache, see ImageCache.prefetch"""
+        return self.images().prefetch_store(self.store,workers)
+
+    def fragments(self)->FragmentStore|None:
+        """
+        Pre-rendered html fragments of the store (rendered and cached on first use),
+        None for an in-memory store, whose questions are rendered on the fly.
         """
-        Cluster the current set of questions using their vector embeddings.
+        if ColumnarStore.loaded(self.cache) is not self.store:
+            return None
+        return FragmentStore.load(self.cache,self.store)
+
+
+    def duplicates(self)->DuplicateIndex:
+        """Corpus wide near duplicate groups (the dedup job runs and is cached on first use)"""
+        return DuplicateIndex.load(self.cache,self.store,self.embeddings)
+
+    def duplicate_groups(self,view:ResultView|None=None)->list:
+        """
+        Repeated questions inside the current set (or view)
+        :return: [[QuestionView, ...], ...] groups of 2 or more, the canonical (oldest) question first
+                 when it is inside the view
+        """
+        rows = self.rows if view is None else view.rows
+        inside = np.zeros(self.store.n_rows,dtype=bool)
+        inside[rows] = True
+        groups = []
+        for group in self.duplicates().groups():
+            group = group[inside[group]]
+            if len(group) > 1:
+                groups.append([self.store.question(row) for row in group.tolist()])
+        return groups
+
+    def collapse_duplicates(self,view:ResultView|None=None)->ResultView:
+        """The current set (or view) with only the first question of every duplicate group"""
+        view = self.view() if view is None else view
+        return ResultView(self.store,self.duplicates().collapse(view.rows))
+
+    def knn_graph(self)->KnnGraph:
+        """The precomputed kNN graph of the embeddings (built and cached on first use)"""
+        return KnnGraph.load(self.cache,self.embeddings)
+
+    def similar(self,question,k:int=10,view:ResultView|None=None)->list:
+        """
+        Questions most similar to question, read from the precomputed kNN graph
+        :param:
+        question: a Question or a question_id
+        k: number of neighbours, above the k the graph was built with the exact search is used
+        view: only keep neighbours inside this view (can return fewer than k)
+        :return: [(QuestionView, cosine similarity), ...] best first
+        """
+        question_id = getattr(question,"question_id",question)
+        graph = self.knn_graph()
+        if k > graph.k:
+            return self.search(str(question_id),k,view=self.view(all_rows=True) if view is None else view)
+        row = self.embeddings.row_index.get(str(question_id))
+        if row is None:
+            return []
+        rows,scores = graph.neighbours_of_row(row,None if view is not None else k)
+        store_rows = self.embeddings.rows_in_store(self.store)[rows]
+        keep = store_rows >= 0
+        if view is not None:
+            keep &= np.isin(store_rows,view.rows)
+        store_rows = store_rows[keep][:k]
+        scores = scores[keep][:k]
+        return [(self.store.question(row),score) for row,score in zip(store_rows.tolist(),scores.tolist())]
+
+    def search(
+            self,
+            query,
+            k:int=10,
+            view:ResultView|None=None,
+            approximate:bool=False,
+            n_probe:int=8,
+            **field_values
+            )->list:
+        """
+        Semantic search over the question embeddings (cosine similarity)
+        :param:
+        query: a query vector (same dimension as the embeddings), a Question or a question_id
+        k: number of results
+        view: only search inside this view, defaults to the current set;
+              field_values (year=2024, subject="physics") narrow it further like query()
+        approximate: score only the n_probe closest lists of the IvfIndex (built on first use)
+                     instead of every candidate, keeps latency flat on a large corpus
+        n_probe: IVF lists scanned when approximate
+        :return: [(QuestionView, cosine similarity), ...] best first, the query question itself excluded
+        """
+        view = self.view() if view is None else view
+        if field_values:
+            view = view.query(equals(**field_values))
+
+        exclude = -1
+        if isinstance(query,(str,Question)):
+            question_id = getattr(query,"question_id",query)
+            exclude = self.embeddings.row_index.get(str(question_id),-1)
+            if exclude < 0:
+                return []
+            query = self.embeddings.matrix[exclude]
+        query = np.asarray(query,dtype=np.float32)
+
+        candidates = self.embeddings.rows_for_store(self.store)[view.rows]
+        candidates = candidates[candidates >= 0]
+        if approximate:
+            allowed = np.zeros(len(self.embeddings.question_ids),dtype=bool)
+            allowed[candidates] = True
+            probed = IvfIndex.load(self.cache,self.embeddings).candidates(query/(np.linalg.norm(query) or 1),n_probe)
+            candidates = probed[allowed[probed]]
+        candidates = candidates[candidates != exclude]
+
+        rows,scores = self.embeddings.search(query,k,candidates)
+        store_rows = self.embeddings.rows_in_store(self.store)[rows]
+        return [(self.store.question(row),score) for row,score in zip(store_rows.tolist(),scores.tolist())]
+
+    def cluster(
+            self,
+            view:ResultView|None=None,
+            use_cache:bool=True,
+            reduce_dim:int|None=None,
+            reduce_method:Literal["pca","random"]="pca",
+            backend:str|ClusterBackend="hdbscan",
+            **backend_options
+            )->dict:
+        """
+        Cluster the current set of questions (or the questions of view) using their vector embeddings.
 
         Detailed behavior and steps:
         1. Purpose
-           - Group similar questions (from self.current_set) into clusters using HDBSCAN
-             on precomputed embeddings stored in self.embeddings_dict.
+           - Group similar questions (from self.current_set) into clusters using HDBSCAN (or another backend)
+             on precomputed embeddings stored in self.embeddings (memory-mapped EmbeddingsStore).
            - The method returns a dictionary mapping cluster labels -> list of Question objects.
 
         2. Inputs and prerequisites
            - self.current_set: list of Question objects to cluster.
-           - self.embeddings_dict: a mapping from question_id -> embedding (iterable of floats).
-           - Each embedding must be indexable by question.question_id and be convertible to a numeric
-             numpy array.
+           - self.embeddings: EmbeddingsStore mapping question_id -> row of a float32 matrix.
+           - Rows are fancy-indexed out of the memory-mapped matrix, no per call list building.
 
         3. High-level steps
            a) Collect embeddings for questions in self.current_set.
@@ -268,16 +528,26 @@ class Filter:
                 - min_cluster_size: controls the minimum size of a cluster (set by MIN_SAMPLE_SIZE).
                 - metric: euclidean (sensible default for dense embeddings).
               - HDBSCAN assigns a label -1 to points considered noise (not belonging to any persistent cluster).
+              - backend picks the algorithm (see clustering.py), backend_options go to its constructor:
+                - 'hdbscan' (default): as above.
+                - 'kmeans': mini-batch k-means, linear in the set size, no noise label.
+                - 'knn': connected components of the cosine kNN graph (threshold, k), singletons are noise.
+                - 'auto': hdbscan for small sets, knn / kmeans for thousands of questions.
+                - or any ClusterBackend instance.
            d) Build and return a dict mapping labels -> lists of Question objects in that cluster.
               - The returned dict includes:
                 - integer cluster labels produced by HDBSCAN (including -1 for noise).
                 - a 'missing_embedding' entry (string key) for questions that had no embedding available.
 
         4. Notes and design choices
+           - Labels are cached in self.cluster_cache keyed by (schema_version, question id set, backend params),
+             exporting the same chapter again skips clustering. use_cache=False always recomputes.
+             The backend always sees the embeddings in question id order, so the labels only depend on the set.
            - We avoid failing when some questions lack embeddings; they are separated out instead.
-           - The method does not modify embeddings or apply dimensionality reduction by default.
-             If scaling or dimensionality reduction is desired, enable and apply it before calling HDBSCAN
-             or modify this method to perform scaling (e.g., StandardScaler) / PCA/UMAP.
+           - No dimensionality reduction by default. reduce_dim=k projects the embeddings to k dims first
+             with a Reducer (reduce_method 'pca' or seeded 'random' projection) fitted once on the full
+             embedding matrix and cached, HDBSCAN is much faster on large sets (subject / whole DB).
+             See benchmarks/bench_reduction.py for runtime and label agreement per k.
            - HDBSCAN requires more than one sample to form clusters in a meaningful way; hence the
              MIN_SAMPLE_SIZE guard.
 
@@ -293,45 +563,59 @@ class Filter:
         """
         MIN_SAMPLE_SIZE = 2
 
-        if not self.current_set:
+        rows = self.rows if view is None else view.rows
+        if not len(rows):
             return {}
 
-        # Collect embeddings for questions that have them; keep track of missing ones
-        embeddings = []
-        questions_with_embeddings = []
-        missing_embedding_questions = []
-
-        for question in self.current_set:
-            emb = self.embeddings_dict.get(question.question_id)
-            if emb is None:
-                missing_embedding_questions.append(question)
-                continue
-            embeddings.append(emb)
-            questions_with_embeddings.append(question)
+        # Locate embedding rows for questions that have them; keep track of missing ones
+        embedding_rows = self.embeddings.rows_for_store(self.store)[rows]
+        found = embedding_rows >= 0
+        store = self.store
+        questions_with_embeddings = [store.question(row) for row in rows[found].tolist()]
+        missing_embedding_questions = [store.question(row) for row in rows[~found].tolist()]
+        embedding_rows = embedding_rows[found]
 
         # No embeddings available at all
-        if not embeddings:
+        if not questions_with_embeddings:
             result = {}
             if missing_embedding_questions:
                 result["missing_embedding"] = missing_embedding_questions
             return result
 
-        embeddings_array = np.array(embeddings)
-
         # If too few samples to cluster, mark all as noise (-1)
-        if len(embeddings) < MIN_SAMPLE_SIZE:
+        if len(questions_with_embeddings) < MIN_SAMPLE_SIZE:
             clusters = {-1: list(questions_with_embeddings)}
             if missing_embedding_questions:
                 clusters["missing_embedding"] = missing_embedding_questions
             return clusters
 
-        # Run HDBSCAN
-        clusterer = hdbscan.HDBSCAN(min_cluster_size=MIN_SAMPLE_SIZE, metric="euclidean")
-        cluster_labels = clusterer.fit_predict(embeddings_array)
+        # Canonical (question id) order, the cache key and HDBSCAN input only depend on the set
+        question_ids = [question.question_id for question in questions_with_embeddings]
+        order = sorted(range(len(question_ids)),key=question_ids.__getitem__)
+        if reduce_dim is not None and reduce_dim >= self.embeddings.dim:
+            reduce_dim = None
+        backend = get_backend(backend,len(question_ids),**backend_options)
+        if isinstance(backend,KnnGraphBackend) and backend.graph is None and KnnGraph.is_built(self.cache):
+            backend.graph = self.knn_graph()
+        params = backend.params()
+        if reduce_dim is not None:
+            params["reduce"] = [reduce_method,reduce_dim]
+        key = self.cluster_cache.fingerprint([question_ids[i] for i in order],params)
+
+        sorted_labels = self.cluster_cache.get(key) if use_cache else None
+        if sorted_labels is None:
+            reducer = None
+            if reduce_dim is not None:
+                reducer = Reducer.load(self.cache,reduce_dim,reduce_method,self.embeddings)
+            labels = backend.fit_predict_rows(self.embeddings,embedding_rows[order],reducer)
+            sorted_labels = self.cluster_cache.put(key,labels)
+
+        cluster_labels = np.empty(len(order),dtype=np.int32)
+        cluster_labels[order] = sorted_labels
 
         # Group questions by cluster label
         clusters = {}
-        for label, question in zip(cluster_labels, questions_with_embeddings):
+        for label, question in zip(cluster_labels.tolist(), questions_with_embeddings):
             clusters.setdefault(label, []).append(question)
 
         # Attach missing-embedding questions if any
@@ -339,4 +623,58 @@ class Filter:
             clusters["missing_embedding"] = missing_embedding_questions
 
         return clusters
-# ...existing code...
\ No newline at end of file
+# ...existing code...
+
+
+#process pool of render_chap_lastNyrs, kept alive between calls (workers pay the imports once)
+_render_pool = None
+_render_pool_workers = 0
+_render_pool_lock = threading.Lock()
+#Filter of a render worker process
+_worker_filter = None
+
+
+def _write_cluster_html(filter:Filter,file,view:ResultView|None,skim:bool,title:str,style:str)->None:
+    if skim:
+        write_cluster_skim_html(file,cluster_dict=filter.cluster(view),title=title,mode=style,fragments=filter.fragments())
+    else:
+        write_cluster_html(file,cluster_dict=filter.cluster(view),title=title,mode=style,fragments=filter.fragments())
+
+
+def _cluster_html(filter:Filter,view:ResultView|None,skim:bool,title:str,style:str)->str:
+    html = io.StringIO()
+    _write_cluster_html(filter,html,view,skim,title,style)
+    return html.getvalue()
+
+
+def _get_render_pool(workers:int)->ProcessPoolExecutor:
+    global _render_pool,_render_pool_workers
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_workers < workers:
+            if _render_pool is not None:
+                _render_pool.shutdown(wait=False)
+            import multiprocessing
+            #spawn: forking a process that runs streamlit/asyncio threads is not safe
+            _render_pool = ProcessPoolExecutor(max_workers=workers,mp_context=multiprocessing.get_context("spawn"))
+            _render_pool_workers = workers
+        return _render_pool
+
+
+def _reset_render_pool(pool:ProcessPoolExecutor)->None:
+    """Drops a broken render pool, the next fan out starts a new one"""
+    global _render_pool,_render_pool_workers
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+            _render_pool_workers = 0
+    pool.shutdown(wait=False,cancel_futures=True)
+
+
+def _cluster_html_job(rows:np.ndarray,skim:bool,title:str,style:str)->str:
+    """Runs in a render worker: cluster the rows of the shared cached store and build the html"""
+    global _worker_filter
+    if _worker_filter is None:
+        store = ColumnarStore.load(Cache(cache_path,schema_version))
+        _worker_filter = Filter(store.lazy_chapters())
+    view = ResultView(_worker_filter.store,rows)
+    return _cluster_html(_worker_filter,view,skim,title,style)
@@ -0,0 +1,149 @@
+"""
+This file has the FragmentStore class
+
+The renderers (pdfy) only concatenate these fragments with the per document
+numbering, the math conversion and option/answer formatting of a question runs
+once per schema version instead of once per render.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from .cache import Cache
+from .columnar import ColumnarStore,QuestionView,_encode_blob,_load_column
+from . import pdfy_support,html_helper
+from .pdfy_support import FRAGMENTS
+
+#modules whose code decides the html of a fragment, any change to them renders the fragments again
+RENDERER_MODULES = (pdfy_support,html_helper)
+
+
+def renderer_version()->str:
+    """sha256 of the renderer modules' source, saved in meta.json next to the fragments"""
+    digest = hashlib.sha256()
+    for module in RENDERER_MODULES:
+        digest.update(Path(module.__file__).read_bytes())
+    return f"sha256:{digest.hexdigest()}"
+
+
+class FragmentStore:
+    """
+    Pre-rendered html fragments of every row of a ColumnarStore (question text,
+    exam date, options list, answer labels and explanations, normal and inline
+    variants), stored as utf-8 blobs + offsets like the store's text columns.
+    Saved as one directory artifact per schema version and memory-mapped on load.
+    """
+    data_name = "QuestionFragments"
+    extension = "frags"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Questions: {self.n_rows}
+Fragments: {list(FRAGMENTS)}
+"""
+        return template
+
+    def __init__(self,columns:dict,store:ColumnarStore)->None:
+        """Initialization of FragmentStore
+        :param:
+        columns: '{fragment}.blob' / '{fragment}.offsets' arrays
+        store: the ColumnarStore the rows belong to
+        """
+        self.columns = columns
+        self.store = store
+        self.n_rows = len(columns["question.offsets"]) - 1
+
+    def text(self,name:str,row:int)->str:
+        offsets = self.columns[f"{name}.offsets"]
+        start,stop = int(offsets[row]),int(offsets[row+1])
+        return bytes(self.columns[f"{name}.blob"][start:stop]).decode("utf-8")
+
+    def covers(self,question)->bool:
+        return isinstance(question,QuestionView) and question._store is self.store
+
+    @classmethod
+    def build(cls,store:ColumnarStore)->dict:
+        """Renders every fragment of every row of store, returns the columns"""
+        questions = [store.question(row) for row in range(store.n_rows)]
+        columns = {}
+        for name,render in FRAGMENTS.items():
+            blob,offsets = _encode_blob(str(render(question)) for question in questions)
+            columns[f"{name}.blob"] = blob
+            columns[f"{name}.offsets"] = offsets
+        return columns
+
+    @classmethod
+    def save(cls,cache:Cache,columns:dict)->Path:
+        """Writes the fragments as a directory of .npy files plus meta.json into the cache"""
+        fragments_path = cache.new_cache_path(cls.data_name,extension=cls.extension)
+        #one temp dir per process/thread, render workers may save concurrently
+        temp_path = Path(f"{fragments_path}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.mkdir()
+        for name,array in columns.items():
+            np.save(temp_path/f"{name}.npy",array,allow_pickle=False)
+        meta = {"n_rows":len(columns["question.offsets"]) - 1,"columns":list(columns),"renderer":renderer_version()}
+        with open(temp_path/"meta.json","w",encoding="utf-8") as file:
+            json.dump(meta,file)
+        try:
+            os.replace(temp_path,fragments_path)
+        except OSError:
+            if _read_meta(fragments_path) == meta:
+                #another process saved the same fragments first, keep theirs
+                shutil.rmtree(temp_path,ignore_errors=True)
+            else:
+                #stale fragments saved in the same second
+                shutil.rmtree(fragments_path,ignore_errors=True)
+                os.replace(temp_path,fragments_path)
+        cache.register(fragments_path)
+        return fragments_path
+
+    @classmethod
+    def open(cls,fragments_path,store:ColumnarStore)->"FragmentStore":
+        """Memory-map a saved fragments directory, None if it was rendered by other renderer code"""
+        fragments_path = Path(fragments_path)
+        meta = _read_meta(fragments_path)
+        if meta is None or meta.get("renderer") != renderer_version():
+            return None
+        if any(f"{name}.blob" not in meta["columns"] for name in FRAGMENTS):
+            return None
+        columns = {name:_load_column(fragments_path/f"{name}.npy") for name in meta["columns"]}
+        return cls(columns,store)
+
+    @classmethod
+    def load(cls,cache:Cache,store:ColumnarStore)->"FragmentStore":
+        """
+        Fragments of store for cache's schema version, rendered and saved on first use
+        (or when the cached ones were built for a different number of rows or by
+        other renderer code, the stale ones are removed).
+        Loaded fragments are shared per (cache_path, schema_version).
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            fragments = cls._loaded.get(key)
+            if fragments is not None and fragments.store is store:
+                return fragments
+
+            fragments_path = cache.get_cache_file(cls.data_name,extension=cls.extension)
+            fragments = cls.open(fragments_path,store) if fragments_path is not None else None
+            if fragments is None or fragments.n_rows != store.n_rows:
+                new_path = cls.save(cache,cls.build(store))
+                if fragments_path is not None and Path(fragments_path) != new_path:
+                    cache.remove_artifact(fragments_path)
+                fragments = cls.open(new_path,store)
+            cls._loaded[key] = fragments
+            return fragments
+
+
+def _read_meta(fragments_path:Path)->dict|None:
+    try:
+        with open(Path(fragments_path)/"meta.json","r",encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError,ValueError):
+        return None
@@ -36,7 +36,7 @@ def q_block_fx(index,exam_date_html,q_text,options_html):
     return q_block
 
 
-def q_block_skim_fx(idx,exam_html,q_text,options_html,q):
+def q_block_skim_fx(idx,exam_html,q_text,options_html,explanation_html):
     q_block = f"""
       <div class="question-block">
         <div class="question-header">
@@ -44,7 +44,7 @@ def q_block_skim_fx(idx,exam_html,q_text,options_html,q):
         </div>
         <div class="q-text">{q_text}</div>
         <div class="q-options">{options_html}</div>
-        <div class="cluster-explanation"> {make_inline(getattr(q,'explanation',''))}</div>
+        <div class="cluster-explanation"> {explanation_html}</div>
         </div>
     """
     return q_block
@@ -87,7 +87,16 @@ def explnation_html_fx(explanation_entries):
     return explnation_html
 
 def final_html_cluster_fx(title,style,cluster_dict,total_questions,summary_html,clusters_html):
-    final_html = rf"""<!DOCTYPE html>
+    final_html = (
+        final_html_cluster_head_fx(title,style,len(cluster_dict),total_questions,summary_html)
+        + clusters_html
+        + final_html_cluster_tail_fx()
+    )
+    return final_html
+
+def final_html_cluster_head_fx(title,style,n_clusters,total_questions,summary_html):
+    """final_html_cluster_fx up to the cluster sections"""
+    head_html = rf"""<!DOCTYPE html>
 <html>
 <head>
   <meta charset="UTF-8">
@@ -103,21 +112,36 @@ def final_html_cluster_fx(title,style,cluster_dict,total_questions,summary_html,
   <div class="container">
     <header>
       <h1>{make_inline(title)}</h1>
-      <div class="meta">Total clusters: {len(cluster_dict)}, Total questions: {total_questions}</div>
+      <div class="meta">Total clusters: {n_clusters}, Total questions: {total_questions}</div>
     </header>
     <div class="summary">
       <h4>Cluster Summary</h4>
 {summary_html}
     </div>
-{clusters_html}
+"""
+    return head_html
+
+def final_html_cluster_tail_fx():
+    """final_html_cluster_fx after the cluster sections"""
+    return """
   </div>
 </body>
 </html>
 """
-    return final_html
 
 def final_html_fx(style_theme,questions_html,answer_key_html,explanation_key_html):
-    html = rf"""
+    html = (
+        final_html_head_fx(style_theme)
+        + questions_html
+        + final_html_answers_fx(answer_key_html)
+        + explanation_key_html
+        + final_html_tail_fx()
+    )
+    return html
+
+def final_html_head_fx(style_theme):
+    """final_html_fx up to the question blocks"""
+    head_html = rf"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -131,14 +155,23 @@ def final_html_fx(style_theme,questions_html,answer_key_html,explanation_key_htm
 <body>
   <div class="container">
     <h2>Questions</h2>
-{questions_html}
+"""
+    return head_html
+
+def final_html_answers_fx(answer_key_html):
+    """final_html_fx answer section, between the question blocks and the explanations"""
+    answers_html = f"""
     <div class="answer-section">
       <h3>Answer Key</h3>
 {answer_key_html}
     </div>
-{explanation_key_html}
+"""
+    return answers_html
+
+def final_html_tail_fx():
+    """final_html_fx after the explanations"""
+    return """
   </div>
 </body>
 </html>
 """
-    return html
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+This file has the ImageCache class
+prefetch: python -m jee_data_base_new_v prefetch-images [--workers 8]
+"""
+
+import os
+import re
+import html
+import json
+import shutil
+import hashlib
+import threading
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from .cache import Cache
+from .columnar import JSON_FIELDS
+
+IMAGE_FIELDS = ("question","explanation","options")
+PREFETCH_WORKERS = 8
+IMAGE_TIMEOUT = 30
+#src of an <img> in html (json text, like the options column, is decoded first)
+_IMG_SRC = re.compile(r"""<img\b[^>]*?\bsrc\s*=\s*["']([^"']+)["']""",re.IGNORECASE)
+#characters a browser leaves as they are in a request url (requests' requote_uri uses the same)
+_URL_SAFE = "!#$%&'()*+,/:;=?@[]~"
+
+
+def image_key(src:str)->str:
+    """
+    The url a browser requests for an <img> src: html entities (&amp;) decoded,
+    spaces and non ascii characters percent-encoded, no #fragment.
+    ImageCache entries are keyed by it, so the srcs of the html and the urls of
+    playwright's requests find the same entry.
+    """
+    return quote(html.unescape(src).strip().split("#",1)[0],safe=_URL_SAFE)
+
+
+def image_urls(text:str)->list:
+    """http(s) urls (image_key) of the <img> tags of html text, in order"""
+    urls = (image_key(src) for src in _IMG_SRC.findall(text))
+    return [url for url in urls if url.startswith(("http://","https://"))]
+
+
+def _json_strings(value)->list:
+    """Every string inside a decoded json value"""
+    if isinstance(value,str):
+        return [value]
+    if isinstance(value,dict):
+        value = list(value.values())
+    if isinstance(value,list):
+        return [text for item in value for text in _json_strings(item)]
+    return []
+
+
+class ImageCache:
+    """
+    Question, option and explanation images downloaded once and stored content
+    addressed: objects/<sha256[:2]>/<sha256><ext> inside one ImageStore cache
+    directory, so an image used by many questions (or under many urls) is kept once.
+    urls.json maps every fetched url (see image_key) to its object and is reread when
+    another process (a prefetch job) changed it. Renderers serve images from here
+    (route_images for playwright, localize for offline html) instead of the network.
+    """
+    data_name = "ImageStore"
+    extension = "images"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Cache Path: {self.cache.cache_path}
+Urls: {len(self._objects)}
+Images: {len(set(entry["object"] for entry in self._objects.values()))}
+"""
+        return template
+
+    def __init__(self,cache:Cache)->None:
+        """Initialization of ImageCache
+        :param:
+        cache: Cache the ImageStore directory lives in
+        """
+        self.cache = cache
+        self._objects = {}
+        self._objects_lock = threading.Lock()
+        #st_mtime_ns of the urls.json _objects was last merged with
+        self._urls_mtime = None
+        self._directory = None
+        self._directory_lock = threading.Lock()
+        self._refresh()
+
+    @classmethod
+    def shared(cls,cache:Cache)->"ImageCache":
+        """The ImageCache of (cache_path, schema_version), shared by every renderer"""
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            image_cache = cls._loaded.get(key)
+            if image_cache is None:
+                image_cache = cls(cache)
+                cls._loaded[key] = image_cache
+            return image_cache
+
+    def __len__(self)->int:
+        self._refresh()
+        return len(self._objects)
+
+    def __contains__(self,url:str)->bool:
+        self._refresh()
+        return image_key(url) in self._objects
+
+    def path_of(self,url:str)->Path|None:
+        """Local file of url, None if it was never fetched"""
+        self._refresh()
+        entry = self._objects.get(image_key(url))
+        directory = self._directory
+        if entry is None or directory is None:
+            return None
+        return directory/"objects"/entry["object"]
+
+    def content_type(self,url:str)->str|None:
+        self._refresh()
+        entry = self._objects.get(image_key(url))
+        return None if entry is None else entry["content_type"]
+
+    def prefetch(self,urls,workers:int = PREFETCH_WORKERS,http_session=None)->dict:
+        """
+        Downloads every url that isn't cached yet
+        :param:
+        urls: image urls (duplicates are fetched once)
+        workers: concurrent downloads
+        http_session: requests Session to use, defaults to the utils session
+        :return: {"cached": already there, "fetched": downloaded, "failed": {url: error}}
+        """
+        from .utils import _get_session
+
+        self._refresh()
+        urls = list(dict.fromkeys(image_key(url) for url in urls))
+        pending = [url for url in urls if url not in self._objects]
+        report = {"cached":len(urls) - len(pending),"fetched":0,"failed":{}}
+        if not pending:
+            return report
+        http_session = http_session or _get_session()
+        directory = self._store_dir(create=True)
+
+        def fetch(url:str)->None:
+            try:
+                response = http_session.get(url,timeout=IMAGE_TIMEOUT)
+                response.raise_for_status()
+                entry = self._add(directory,url,response.content,response.headers.get("Content-Type"))
+            except Exception as e:
+                with self._objects_lock:
+                    report["failed"][url] = str(e)
+                return
+            with self._objects_lock:
+                self._objects[url] = entry
+                report["fetched"] += 1
+
+        with ThreadPoolExecutor(max_workers=max(1,min(workers,len(pending)))) as pool:
+            list(pool.map(fetch,pending))
+        self._save_urls(directory)
+        return report
+
+    def prefetch_store(self,store,workers:int = PREFETCH_WORKERS)->dict:
+        """prefetch of every image the questions of a ColumnarStore reference"""
+        urls = []
+        for field in IMAGE_FIELDS:
+            blob = bytes(store.columns[f"{field}.blob"])
+            if field in JSON_FIELDS:
+                #json escapes (\" \/ \u0026) hide the srcs until the rows are decoded
+                offsets = store.columns[f"{field}.offsets"].tolist()
+                text = " ".join(
+                    string
+                    for start,stop in zip(offsets,offsets[1:]) if stop > start
+                    for string in _json_strings(json.loads(blob[start:stop]))
+                )
+            else:
+                #plain utf-8 text, one scan per field instead of one per row
+                text = blob.decode("utf-8")
+            urls.extend(image_urls(text))
+        return self.prefetch(urls,workers)
+
+    def localize(self,text:str,images_dir:Path,base:str)->str:
+        """
+        text with the src of cached images pointing at base/<object name>, the
+        objects are copied into images_dir (once, shared by every file using them)
+        """
+        def replace(match:re.Match)->str:
+            src = match.group(1)
+            path = self.path_of(src)
+            if path is None:
+                return match.group(0)
+            target = Path(images_dir)/path.name
+            if not target.exists():
+                target.parent.mkdir(parents=True,exist_ok=True)
+                shutil.copyfile(path,target)
+            return match.group(0).replace(src,f"{base}/{path.name}")
+        return _IMG_SRC.sub(replace,text)
+
+    def _add(self,directory:Path,url:str,content:bytes,content_type:str|None)->dict:
+        digest = hashlib.sha256(content).hexdigest()
+        content_type = (content_type or "").split(";")[0].strip() or mimetypes.guess_type(url)[0] or "application/octet-stream"
+        suffix = mimetypes.guess_extension(content_type) or Path(url.split("?",1)[0]).suffix
+        name = f"{digest}{suffix}"
+        object_path = directory/"objects"/digest[:2]/name
+        #same bytes under another url: the object is already there
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True,exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path,"wb") as file:
+                file.write(content)
+            os.replace(temp_path,object_path)
+        return {"object":f"{digest[:2]}/{name}","sha256":digest,"content_type":content_type,"size":len(content)}
+
+    def _save_urls(self,directory:Path)->None:
+        #keeps what other processes fetched since it was read (objects are content addressed)
+        self._refresh()
+        with self._objects_lock:
+            objects = dict(self._objects)
+            temp_path = directory/f"urls.json.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path,"w",encoding="utf-8") as file:
+                json.dump(objects,file)
+            os.replace(temp_path,directory/"urls.json")
+            self._urls_mtime = (directory/"urls.json").stat().st_mtime_ns
+        #the manifest entry (size, mtime) was taken when the directory was still empty
+        self.cache.register(directory)
+
+    def _refresh(self)->None:
+        """Merges urls.json into the entries when it changed since it was last read"""
+        directory = self._store_dir(create=False)
+        if directory is None:
+            return
+        try:
+            mtime = (directory/"urls.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._urls_mtime:
+            return
+        with self._objects_lock:
+            if mtime == self._urls_mtime:
+                return
+            try:
+                with open(directory/"urls.json","r",encoding="utf-8") as file:
+                    objects = json.load(file)
+            except (OSError,ValueError):
+                return
+            #keys written before image_key was applied are normalized on the way in
+            self._objects.update((image_key(url),entry) for url,entry in objects.items())
+            self._urls_mtime = mtime
+
+    def _store_dir(self,create:bool)->Path|None:
+        directory = self._directory
+        if directory is not None and directory.is_dir():
+            return directory
+        with self._directory_lock:
+            directory = self.cache.get_cache_file(self.data_name,extension=self.extension)
+            if directory is None and create:
+                directory = self.cache.new_cache_path(self.data_name,self.extension)
+                directory.mkdir(parents=True,exist_ok=True)
+                self.cache.register(directory)
+            self._directory = directory
+            return directory
+
+
+async def route_images(page,image_cache:ImageCache)->None:
+    """Serve the cached images a page requests from the ImageCache, other requests go on"""
+    async def handle(route)->None:
+        url = route.request.url
+        path = image_cache.path_of(url)
+        if path is not None and path.is_file():
+            await route.fulfill(path=str(path),content_type=image_cache.content_type(url))
+        else:
+            await route.fallback()
+
+    await page.route("**/*",handle)
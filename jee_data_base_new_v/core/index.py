@@ -0,0 +1,132 @@
+"""
+This file has the FieldIndex class
+"""
+
+import threading
+import weakref
+import numpy as np
+from .columnar import (
+    ColumnarStore,
+    CATEGORICAL_FIELDS,
+    INTEGER_FIELDS,
+    FLAG_FIELDS,
+    ANY_IMG_OPTION,
+)
+
+INDEXED_FIELDS = CATEGORICAL_FIELDS + INTEGER_FIELDS + FLAG_FIELDS + (ANY_IMG_OPTION,)
+
+_EMPTY = np.zeros(0,dtype=np.int32)
+_EMPTY.flags.writeable = False
+
+
+class FieldIndex:
+    """
+    Inverted indexes over a ColumnarStore: field -> value -> sorted int32 row ids.
+    A field's posting lists are built the first time the field is queried and are
+    shared by every Filter on the same store (see for_store). Posting arrays are
+    read only.
+    """
+    _indexes = weakref.WeakKeyDictionary()
+    _indexes_lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Rows: {self.store.n_rows}
+Built Fields: {list(self._postings.keys())}
+"""
+        return template
+
+    def __init__(self,store:ColumnarStore)->None:
+        self.store = store
+        self._postings = {}
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_store(cls,store:ColumnarStore)->"FieldIndex":
+        """The shared index of store, created on first use"""
+        with cls._indexes_lock:
+            index = cls._indexes.get(store)
+            if index is None:
+                index = cls(store)
+                cls._indexes[store] = index
+            return index
+
+    def postings(self,field:str)->dict:
+        """value -> sorted row id array for every distinct value of field"""
+        postings = self._postings.get(field)
+        if postings is not None:
+            return postings
+        if field not in INDEXED_FIELDS:
+            raise KeyError(f"'{field}' is not an indexed field")
+        with self._lock:
+            postings = self._postings.get(field)
+            if postings is None:
+                postings = self._build(field)
+                self._postings[field] = postings
+            return postings
+
+    def rows(self,field:str,value)->np.ndarray:
+        """Sorted row ids where field == value (empty if no row matches)"""
+        try:
+            return self.postings(field).get(value,_EMPTY)
+        except TypeError:
+            #unhashable value can't be a stored categorical value
+            return _EMPTY
+
+    def rows_in(self,field:str,values)->np.ndarray:
+        """Sorted row ids where field is any of values"""
+        postings = self.postings(field)
+        parts = [postings[value] for value in values if value in postings]
+        if not parts:
+            return _EMPTY
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def codes(self,field:str)->tuple:
+        """
+        (codes,values) for field: codes is an int array with one dense code per row,
+        values[code] is the python value. Categorical fields reuse the stored codes.
+        """
+        codes = self._codes.get(field)
+        if codes is not None:
+            return codes
+        if field not in INDEXED_FIELDS:
+            raise KeyError(f"'{field}' is not an indexed field")
+        with self._lock:
+            codes = self._codes.get(field)
+            if codes is None:
+                codes = self._build_codes(field)
+                self._codes[field] = codes
+            return codes
+
+    def _build_codes(self,field:str)->tuple:
+        column = np.asarray(self.store.column(field))
+        if field in CATEGORICAL_FIELDS:
+            codes,values = column,list(self.store.vocabs[field])
+        elif field in INTEGER_FIELDS:
+            values,inverse = np.unique(column,return_inverse=True)
+            codes,values = inverse.reshape(-1).astype(np.int32),[int(value) for value in values]
+        else:
+            codes,values = column.astype(np.uint8),[False,True]
+        if codes.flags.writeable:
+            codes.flags.writeable = False
+        return codes,values
+
+    def _build(self,field:str)->dict:
+        column = np.asarray(self.store.column(field))
+        order = np.argsort(column,kind="stable").astype(np.int32)
+        keys,starts = np.unique(column[order],return_index=True)
+        postings = {}
+        for key,rows in zip(keys.tolist(),np.split(order,starts[1:])):
+            rows.flags.writeable = False
+            postings[self._decode(field,key)] = rows
+        return postings
+
+    def _decode(self,field:str,key):
+        if field in CATEGORICAL_FIELDS:
+            return self.store.vocabs[field][key]
+        if field in INTEGER_FIELDS:
+            return int(key)
+        return bool(key)
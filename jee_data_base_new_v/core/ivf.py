@@ -0,0 +1,118 @@
+"""
+This file has the IvfIndex class
+"""
+
+import threading
+import numpy as np
+from .cache import Cache
+from .embeddings import EmbeddingsStore
+from .clustering import normalize_rows
+
+IVF_SEED = 0
+IVF_ITERATIONS = 10
+
+
+class IvfIndex:
+    """
+    Inverted file index over the normalized embedding matrix for approximate search.
+    Rows are assigned to their nearest of n_lists k-means centroids, a query only
+    scores the rows of its n_probe nearest lists, so search cost stays flat as the
+    corpus grows. Lists are stored CSR style: rows sorted by list plus offsets.
+    """
+    centroids_name = "IvfCentroids"
+    rows_name = "IvfRows"
+    offsets_name = "IvfOffsets"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Rows: {len(self.rows)}
+Lists: {len(self.centroids)}
+"""
+        return template
+
+    def __init__(self,centroids,rows,offsets)->None:
+        """Initialization of IvfIndex
+        :param:
+        centroids: (n_lists, dim) float32 unit vectors
+        rows: int32 embedding rows grouped by list
+        offsets: (n_lists+1,) int64, list i is rows[offsets[i]:offsets[i+1]]
+        """
+        self.centroids = centroids
+        self.rows = rows
+        self.offsets = offsets
+
+    def candidates(self,vector,n_probe:int)->np.ndarray:
+        """Embedding rows in the n_probe lists closest to vector"""
+        n_probe = min(n_probe,len(self.centroids))
+        closeness = self.centroids @ np.asarray(vector,dtype=np.float32)
+        lists = np.argpartition(-closeness,n_probe - 1)[:n_probe]
+        return np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists.tolist()])
+
+    @classmethod
+    def build(cls,embeddings:EmbeddingsStore,n_lists:int|None = None,iterations:int = IVF_ITERATIONS)->"IvfIndex":
+        """
+        Seeded spherical k-means (Lloyd iterations in numpy) over the embedding matrix
+        :param:
+        embeddings: store to index
+        n_lists: number of lists, defaults to about 4*sqrt(n)
+        iterations: k-means iterations
+        """
+        vectors = normalize_rows(embeddings.matrix)
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = int(4*np.sqrt(n))
+        n_lists = max(1,min(n_lists,n))
+        rng = np.random.default_rng(IVF_SEED)
+        centroids = vectors[rng.choice(n,n_lists,replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _nearest(vectors,centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums,assignment,vectors)
+            empty = np.bincount(assignment,minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        assignment = _nearest(vectors,centroids)
+        rows = np.argsort(assignment,kind="stable").astype(np.int32)
+        offsets = np.zeros(n_lists + 1,dtype=np.int64)
+        np.cumsum(np.bincount(assignment,minlength=n_lists),out=offsets[1:])
+        return cls(centroids.astype(np.float32),rows,offsets)
+
+    def save(self,cache:Cache)->None:
+        cache.creat_cache_npy(self.centroids,data_name=self.centroids_name)
+        cache.creat_cache_npy(self.offsets,data_name=self.offsets_name)
+        cache.creat_cache_npy(self.rows,data_name=self.rows_name)
+
+    @classmethod
+    def load(cls,cache:Cache,embeddings:EmbeddingsStore|None = None)->"IvfIndex":
+        """
+        The index of cache's schema version, built and saved on first use.
+        Loaded indexes are shared per (cache_path, schema_version).
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            index = cls._loaded.get(key)
+            if index is not None:
+                return index
+
+            names = (cls.centroids_name,cls.rows_name,cls.offsets_name)
+            if any(cache.get_cache_file(name,extension="npy") is None for name in names):
+                embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+                cls.build(embeddings).save(cache)
+
+            index = cls(
+                cache.load_cache_npy(cls.centroids_name,mmap_mode=None),
+                cache.load_cache_npy(cls.rows_name,mmap_mode="r"),
+                cache.load_cache_npy(cls.offsets_name,mmap_mode=None),
+            )
+            cls._loaded[key] = index
+            return index
+
+
+def _nearest(vectors:np.ndarray,centroids:np.ndarray,block_size:int = 4096)->np.ndarray:
+    assignment = np.empty(len(vectors),dtype=np.int64)
+    for start in range(0,len(vectors),block_size):
+        assignment[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T,axis=1)
+    return assignment
@@ -0,0 +1,143 @@
+"""
+This file has the KnnGraph class
+"""
+
+import threading
+import numpy as np
+from .cache import Cache
+from .embeddings import EmbeddingsStore
+from .clustering import normalize_rows
+
+KNN_K = 32
+KNN_BLOCK_SIZE = 1024
+
+
+class KnnGraph:
+    """
+    Top-k cosine neighbours of every embedding row, computed offline with blocked
+    matrix multiplication over L2 normalized float32 vectors.
+    neighbours is an (n, k) int32 array of embedding rows, scores the matching
+    (n, k) float16 cosine similarities, both sorted best first and memory-mapped
+    from the cache.
+    build: python -m jee_data_base_new_v build-knn [--k 32]
+    """
+    neighbours_name = "KnnNeighbours"
+    scores_name = "KnnScores"
+
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Questions: {len(self.neighbours)}
+Neighbours Per Question: {self.k}
+"""
+        return template
+
+    def __init__(self,neighbours,scores,embeddings:EmbeddingsStore)->None:
+        """Initialization of KnnGraph
+        :param:
+        neighbours: (n, k) int32 embedding rows, best first
+        scores: (n, k) float16 cosine similarities aligned with neighbours
+        embeddings: the EmbeddingsStore the rows belong to
+        """
+        self.neighbours = neighbours
+        self.scores = scores
+        self.embeddings = embeddings
+        self.k = neighbours.shape[1] if neighbours.ndim == 2 else 0
+
+    def neighbours_of_row(self,row:int,k:int|None = None)->tuple:
+        """(embedding rows, scores) of the k best neighbours of an embedding row"""
+        k = self.k if k is None else min(k,self.k)
+        return self.neighbours[row,:k],self.scores[row,:k]
+
+    def neighbours_of(self,question_id,k:int|None = None)->list:
+        """[(question_id, score), ...] best first, empty if question_id has no embedding"""
+        row = self.embeddings.row_index.get(str(question_id))
+        if row is None:
+            return []
+        rows,scores = self.neighbours_of_row(row,k)
+        question_ids = self.embeddings.question_ids
+        return [(question_ids[neighbour],score) for neighbour,score in zip(rows.tolist(),scores.tolist())]
+
+    @classmethod
+    def build(cls,embeddings:EmbeddingsStore,k:int = KNN_K,block_size:int = KNN_BLOCK_SIZE)->"KnnGraph":
+        """
+        Computes the graph in memory
+        :param:
+        embeddings: store to build the graph of
+        k: neighbours kept per question
+        block_size: rows multiplied at once, bounds memory to block_size*n floats
+        """
+        vectors = normalize_rows(embeddings.matrix)
+        n = len(vectors)
+        k = max(0,min(k,n - 1))
+        neighbours = np.zeros((n,k),dtype=np.int32)
+        scores = np.zeros((n,k),dtype=np.float16)
+        if k == 0:
+            return cls(neighbours,scores,embeddings)
+
+        for start in range(0,n,block_size):
+            similarities = vectors[start:start + block_size] @ vectors.T
+            block_rows = np.arange(start,start + len(similarities))
+            similarities[block_rows - start,block_rows] = -np.inf
+            top = np.argpartition(similarities,-k,axis=1)[:,-k:]
+            top_scores = np.take_along_axis(similarities,top,axis=1)
+            best_first = np.argsort(-top_scores,axis=1,kind="stable")
+            neighbours[start:start + len(similarities)] = np.take_along_axis(top,best_first,axis=1)
+            scores[start:start + len(similarities)] = np.take_along_axis(top_scores,best_first,axis=1)
+        return cls(neighbours,scores,embeddings)
+
+    def save(self,cache:Cache)->tuple:
+        """Writes scores and neighbours into the cache, returns their paths"""
+        return (
+            cache.creat_cache_npy(self.scores,data_name=self.scores_name),
+            cache.creat_cache_npy(self.neighbours,data_name=self.neighbours_name),
+        )
+
+    @classmethod
+    def is_built(cls,cache:Cache)->bool:
+        return (
+            cache.get_cache_file(cls.neighbours_name,extension="npy") is not None
+            and cache.get_cache_file(cls.scores_name,extension="npy") is not None
+        )
+
+    @classmethod
+    def load(cls,cache:Cache,embeddings:EmbeddingsStore|None = None,k:int = KNN_K)->"KnnGraph":
+        """
+        The graph of cache's schema version, built (with k neighbours) and saved if it
+        is not cached yet. Loaded graphs are shared per (cache_path, schema_version).
+        :param:
+        cache: Cache the graph is stored in
+        embeddings: store the graph is built from, defaults to EmbeddingsStore.load(cache)
+        k: neighbours per question when the graph has to be built
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            graph = cls._loaded.get(key)
+            if graph is not None:
+                return graph
+
+            embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+            if not cls.is_built(cache):
+                cls.build(embeddings,k).save(cache)
+
+            neighbours = cache.load_cache_npy(cls.neighbours_name,mmap_mode="r")
+            scores = cache.load_cache_npy(cls.scores_name,mmap_mode="r")
+            graph = cls(neighbours,scores,embeddings)
+            cls._loaded[key] = graph
+            return graph
+
+    @classmethod
+    def rebuild(cls,cache:Cache,embeddings:EmbeddingsStore|None = None,k:int = KNN_K,block_size:int = KNN_BLOCK_SIZE)->"KnnGraph":
+        """Builds and saves a fresh graph (e.g. with another k), the cached one is removed"""
+        embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+        old_paths = [cache.get_cache_file(name,extension="npy") for name in (cls.scores_name,cls.neighbours_name)]
+        graph = cls.build(embeddings,k,block_size)
+        new_paths = graph.save(cache)
+        for old_path in old_paths:
+            if old_path is not None and old_path not in new_paths:
+                cache.remove_artifact(old_path)
+        with cls._lock:
+            cls._loaded[(str(cache.cache_path),cache.schema_version)] = graph
+        return graph
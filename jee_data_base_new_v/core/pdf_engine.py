@@ -1,29 +1,123 @@
 import os
 import uuid
-import PyPDF2
+import atexit
+import asyncio
 import tempfile
+import threading
 from pathlib import Path
-from bs4 import BeautifulSoup
-from playwright import async_api
-from jee_data_base.core.types import HtmlLike
-from playwright._impl._errors import Error
+from .types import HtmlLike
+from .assets import ASSETS_PATH,check_assets,route_assets
+from .image_cache import ImageCache,route_images
+
+#bs4, playwright and PyPDF2 are imported where they are used
+#so importing the package doesn't pay for them
+
+#pages printed by one chromium before the pool replaces it (bounds its memory growth)
+PAGES_PER_BROWSER = 500
+#documents up to this many questions are printed in one page load (mode 'auto'),
+#bigger ones one page load per cluster, clusters bigger than this in chunks
+SINGLE_DOCUMENT_MAX_QUESTIONS = 200
+#questions per page load of the chunked path
+CHUNK_SIZE = 5
+PDF_MODES = ("auto","single","chunks")
+#print rules of the single document mode: questions are never cut, clusters start a page
+PAGE_BREAK_STYLE = """<style>
+    .question-block { break-inside: avoid; page-break-inside: avoid; }
+    .pdf-cluster + .pdf-cluster { break-before: page; page-break-before: always; }
+    </style>"""
+#seconds a page gets to load its images and typeset its math before it is printed anyway
+MATHJAX_TIMEOUT = 20
+#resolves true once MathJax finished the initial typeset (startup.promise) and every
+#image loaded, false when timeout (ms) runs out first. Pages without MathJax don't wait for it.
+MATHJAX_READY = """async (timeout) => {
+    const deadline = Date.now() + timeout;
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    const images = Promise.all(Array.from(document.images).filter((image) => !image.complete).map(
+        (image) => new Promise((resolve) => { image.onload = image.onerror = resolve; })
+    ));
+    const typeset = (async () => {
+        if (!document.getElementById("MathJax-script") && !window.MathJax) return;
+        while (!(window.MathJax && MathJax.startup && MathJax.startup.promise)) {
+            if (Date.now() > deadline) throw new Error("MathJax did not load");
+            await sleep(25);
+        }
+        await MathJax.startup.promise;
+    })();
+    //the MathJax (and Excalifont) web fonts are only requested once the typeset output uses them
+    const fonts = typeset.then(() => document.fonts && document.fonts.ready);
+    const expired = sleep(Math.max(0, deadline - Date.now())).then(() => false);
+    return Promise.race([Promise.all([images, typeset, fonts]).then(() => true, () => false), expired]);
+}"""
+#chunks of one document printed at the same time (PdfEngine concurrency)
+CHUNK_CONCURRENCY = max(2,os.cpu_count() or 1)
+#contexts (pages printing at the same time, over every document) the pool hands out
+POOL_CONTEXTS = max(4,os.cpu_count() or 1)
+
 
 class PdfEngine:
-    def __init__(self,html):
+    def __init__(
+            self,
+            html,
+            concurrency:int = CHUNK_CONCURRENCY,
+            mode:str = "auto",
+            max_single_questions:int = SINGLE_DOCUMENT_MAX_QUESTIONS,
+            mathjax_timeout:float = MATHJAX_TIMEOUT,
+            offline:bool = False,
+            assets:Path = ASSETS_PATH,
+            images:ImageCache|None = None
+            ):
+        """Initialization of PdfEngine
+        :param:
+        html: the document to convert
+        concurrency: chunks converted at the same time
+        mode: 'single' prints the whole document in one page load with css page breaks,
+              'chunks' prints every CHUNK_SIZE questions on their own pages and merges them,
+              'auto' prints single documents up to max_single_questions questions and
+              falls back to one page load per cluster, then to chunks, beyond it
+        max_single_questions: size threshold of 'auto'
+        mathjax_timeout: seconds a chunk waits for MathJax and its images, chunks that run
+                         out are printed as they are and listed in timed_out_chunks
+        offline: serve MathJax, Bootstrap and the fonts from the asset bundle instead of
+                 the CDNs (see assets.prepare_assets)
+        assets: the asset bundle folder used when offline
+        images: ImageCache question images are served from (prefetch-images),
+                defaults to the shared one of the data base cache
+        """
+        from bs4 import BeautifulSoup
+
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if mode not in PDF_MODES:
+            raise ValueError(f"mode must be one of {PDF_MODES}")
+        self.concurrency = concurrency
+        self.mode = mode
+        self.max_single_questions = max_single_questions
+        self.mathjax_timeout = mathjax_timeout
+        self.timed_out_chunks = []
+        self.assets = check_assets(assets) if offline else None
+        if images is None:
+            from . import cache_path,schema_version
+            from .cache import Cache
+
+            images = ImageCache.shared(Cache(cache_path,schema_version))
+        self.images = images
         self.html = html
         self.parsed_html = BeautifulSoup(html,"html.parser")
         self.working_directory = tempfile.gettempdir()
         self.working_directory_path = Path(self.working_directory)
 
-    def _get_individual_html(self,scoped_html_block)->HtmlLike:
+    def _get_individual_html(self,scoped_html_block,page_breaks:bool = False)->HtmlLike:
         """
         Return a html block with styling and scoped_html_block as body
         :param:
         - style_theme : dark or white
         - scoped _html_block: selecte html block out of the whole original html
         scoping logic will be defined somewhere else
+        - page_breaks: add the PAGE_BREAK_STYLE print rules
         """
         style = self.parsed_html.find("style")
+        if page_breaks:
+            style = f"{style}\n    {PAGE_BREAK_STYLE}"
         
         individual_html = rf"""
     <!DOCTYPE html>
@@ -44,6 +138,8 @@ class PdfEngine:
         return individual_html
 
     def _count_image(self,html_block)->int:
+        from bs4 import BeautifulSoup
+
         html = BeautifulSoup(html_block,"html.parser")
         img_tags = html.find_all("img")
         return len(img_tags)
@@ -57,6 +153,8 @@ class PdfEngine:
         return [str(i) for i in cluster_list]
     
     def _get_question_block_list(self,html_block)->list:
+        from bs4 import BeautifulSoup
+
         html = BeautifulSoup(html_block,"html.parser")
         question_block_list = html.find_all("div",class_="question-block")
         return [str(i) for i in question_block_list]
@@ -68,67 +166,343 @@ class PdfEngine:
         """
         return [lst[i:i+atmost_size] for i in range(0, len(lst), atmost_size)]
     
-    async def _process_clusters(self)->list:
+    async def _process_clusters(self,browser=None)->list:
+        """
+        Renders every chunk to a pdf, in order
+        :param:
+        - browser: a running playwright browser to open pages in (it is left open),
+                   None borrows pages from the process wide BrowserPool
+        """
         cluster_folder = self.working_directory_path/f"{uuid.uuid4()}"
         cluster_folder.mkdir()
         clusters = self._get_cluster_list()
-        
-        p =  await async_api.async_playwright().start()
+        return await self._render_chunks(browser,cluster_folder,clusters)
+
+    async def _chunk_to_pdf(self,browser,chunk_file_html:Path,chunk_file_pdf:Path)->bool:
+        """Prints one chunk, False when it timed out waiting for MathJax"""
+        if browser is None:
+            return await get_browser_pool().pdf(chunk_file_html,chunk_file_pdf,self.mathjax_timeout,self.assets,self.images)
+        page = await browser.new_page()
         try:
-            #for normal users
-            browser = await p.chromium.launch(headless=True)
-        except Error as e:
-            #for ci/cd pipeline and for environments which
-            #do do not support sandboxxing
-            os.system("playwright install chromium")
-            os.system("playwright install-deps")
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox"
-                    ]
-                    )
-        
-        pdf_list = []
-        for cluster in clusters:
-            questions = self._get_question_block_list(cluster)
-            chunked_questions = self._get_chunk(questions,atmost_size=5)
-            # print(len(chunked_questions))
-        
-            for chunk in chunked_questions:
-        
-                new_cluster_folder = cluster_folder/f"cluster-{clusters.index(cluster)}"
-                new_cluster_folder.mkdir(exist_ok=True)
+            return await _print_page(page,chunk_file_html,chunk_file_pdf,self.mathjax_timeout,self.assets,self.images)
+        finally:
+            await page.close()
+
+    def _get_documents(self,clusters:list)->list:
+        """The html of every page load of the pdf, in order (see mode)"""
+        cluster_questions = [self._get_question_block_list(cluster) for cluster in clusters]
+        total_questions = sum(len(questions) for questions in cluster_questions)
+        if self.mode == "single" or (self.mode == "auto" and total_questions <= self.max_single_questions):
+            return [self._get_paged_html(cluster_questions)]
+
+        documents = []
+        for questions in cluster_questions:
+            if self.mode == "auto" and len(questions) <= self.max_single_questions:
+                documents.append(self._get_paged_html([questions]))
+                continue
+            for chunk in self._get_chunk(questions,atmost_size=CHUNK_SIZE):
                 html_block = ""
-        
                 for question in chunk:
                     html_block = f"{html_block}\n{question}"
-                
-                indivisual_html = self._get_individual_html(html_block)
-                
-                chunk_file_html = new_cluster_folder/f"chunk-{chunked_questions.index(chunk)}.html"
-                file = open(chunk_file_html,"w",encoding="utf-8")
-                file.write(indivisual_html)
-                file.close()
-
-                page = await browser.new_page()
-                await page.goto(chunk_file_html.as_uri(),wait_until="networkidle")
-                chunk_file_pdf = new_cluster_folder/f"chunk-{chunked_questions.index(chunk)}.pdf"
-                await page.pdf(
-                    format="A4",
-                    path=str(chunk_file_pdf)
-                )
-                pdf_list.append(chunk_file_pdf)
-                await page.close()
-        await browser.close()
+                documents.append(self._get_individual_html(html_block))
+        return documents
 
-        return pdf_list
-    
-    async def render(self,output_path:str):
-        pdf_list = await self._process_clusters()
+    def _get_paged_html(self,cluster_questions:list)->HtmlLike:
+        """One html of whole clusters, page breaks come from PAGE_BREAK_STYLE"""
+        html_block = "".join(
+            "\n<div class='pdf-cluster'>" + "".join(f"\n{question}" for question in questions) + "\n</div>"
+            for questions in cluster_questions
+        )
+        return self._get_individual_html(html_block,page_breaks=True)
+
+    async def _render_chunks(self,browser,cluster_folder:Path,clusters:list)->list:
+        """
+        Writes every page load html (see _get_documents), then prints them at most
+        self.concurrency at a time. The pdfs are returned in document order whatever
+        order they finish in.
+        """
+        chunk_files = []
+        for index,html in enumerate(self._get_documents(clusters)):
+            chunk_file_html = cluster_folder/f"chunk-{index}.html"
+            with open(chunk_file_html,"w",encoding="utf-8") as file:
+                file.write(html)
+            chunk_files.append((chunk_file_html,cluster_folder/f"chunk-{index}.pdf"))
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def convert(chunk_file_html:Path,chunk_file_pdf:Path)->bool:
+            async with semaphore:
+                return await self._chunk_to_pdf(browser,chunk_file_html,chunk_file_pdf)
+
+        #gather keeps the argument order
+        ready = await asyncio.gather(*(convert(html_path,pdf_path) for html_path,pdf_path in chunk_files))
+        self.timed_out_chunks = [html_path for (html_path,_),chunk_ready in zip(chunk_files,ready) if not chunk_ready]
+        return [pdf_path for _,pdf_path in chunk_files]
+
+    async def render(self,output_path:str,browser=None):
+        """
+        Converts the html to a pdf at output_path
+        :param:
+        - output_path: pdf file to write
+        - browser: a running playwright browser (see launch_browser) to render with,
+                   None (default) borrows pages from the process wide BrowserPool
+        """
+        import PyPDF2
+
+        self.timed_out_chunks = []
+        pdf_list = await self._process_clusters(browser)
+        if self.timed_out_chunks:
+            chunks = ", ".join(chunk.name for chunk in self.timed_out_chunks)
+            print(f"MathJax timed out after {self.mathjax_timeout}s on {len(self.timed_out_chunks)} chunk(s) of {output_path}: {chunks}")
         merger = PyPDF2.PdfMerger()
         for pdf in pdf_list:
             merger.append(pdf)
         merger.write(output_path)
-        merger.close()
\ No newline at end of file
+        merger.close()
+
+
+async def launch_browser(playwright):
+    """Launch headless chromium, installing it first where it is missing"""
+    from playwright._impl._errors import Error
+
+    try:
+        #for normal users
+        return await playwright.chromium.launch(headless=True)
+    except Error as e:
+        #for ci/cd pipeline and for environments which
+        #do do not support sandboxxing
+        os.system("playwright install chromium")
+        os.system("playwright install-deps")
+        return await playwright.chromium.launch(
+            headless=True,
+            args=[
+                "--no-sandbox",
+                "--disable-setuid-sandbox"
+                ]
+                )
+
+
+async def _print_page(
+        page,
+        html_path:Path,
+        pdf_path:Path,
+        timeout:float = MATHJAX_TIMEOUT,
+        assets:Path|None = None,
+        images:ImageCache|None = None
+        )->bool:
+    """
+    Prints html_path as soon as MathJax typeset it (instead of waiting for the network to go idle)
+    :param:
+    assets: asset bundle to serve the CDN files from, None loads them from the network
+    images: ImageCache to serve the images it has from, the others are fetched
+    :return: False when it was printed because timeout ran out
+    """
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    if images is not None and len(images):
+        await route_images(page,images)
+    if assets is not None:
+        await route_assets(page,assets)
+    try:
+        await page.goto(html_path.as_uri(),wait_until="domcontentloaded",timeout=timeout*1000)
+    except PlaywrightTimeoutError:
+        #e.g. a blocking cdn script that never answers, print what was parsed
+        ready = False
+    else:
+        ready = await page.evaluate(MATHJAX_READY,timeout*1000)
+    await page.pdf(
+        format="A4",
+        path=str(pdf_path)
+    )
+    return ready
+
+
+class BrowserPool:
+    """
+    Process wide headless chromium that PdfEngine renders borrow pages from, so a
+    render doesn't pay the playwright + chromium start up.
+    The pool runs its own event loop in a daemon thread: playwright objects belong
+    to the loop that created them, while callers (asyncio.run per render) come and
+    go with their own loops. pdf() can be awaited from any loop.
+    - browser contexts are reused, at most contexts are borrowed at once
+    - the browser is checked (is_connected) before every borrow and relaunched if it died
+    - after pages_per_browser pages the browser is recycled once its borrowed contexts return
+    - close() (also registered with atexit) shuts chromium and playwright down
+    """
+    def __repr__(self)->str:
+        template = f"""
+Running: {self._browser is not None}
+Pages Printed: {self._pages}
+Idle Contexts: {len(self._idle)}
+Borrowed Contexts: {len(self._borrowed)}
+"""
+        return template
+
+    def __init__(self,contexts:int = POOL_CONTEXTS,pages_per_browser:int = PAGES_PER_BROWSER)->None:
+        """Initialization of BrowserPool
+        :param:
+        contexts: browser contexts handed out at the same time
+        pages_per_browser: pages printed before the browser is replaced
+        """
+        if contexts < 1:
+            raise ValueError("contexts must be at least 1")
+        self.contexts = contexts
+        self.pages_per_browser = pages_per_browser
+        self._thread_lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._reset()
+
+    def _reset(self)->None:
+        self._playwright = None
+        self._browser = None
+        self._pages = 0
+        self._idle = []
+        self._borrowed = {}
+        self._slots = None
+        self._launch_lock = None
+
+    def _start(self)->asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever,name="pdf-browser-pool",daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    async def pdf(
+            self,
+            html_path:Path,
+            pdf_path:Path,
+            timeout:float = MATHJAX_TIMEOUT,
+            assets:Path|None = None,
+            images:ImageCache|None = None
+            )->bool:
+        """
+        Print the html file at html_path to pdf_path with a pooled page, False if MathJax timed out.
+        assets and images serve the CDN files and the question images locally (see _print_page).
+        """
+        future = asyncio.run_coroutine_threadsafe(self._pdf(Path(html_path),Path(pdf_path),timeout,assets,images),self._start())
+        return await asyncio.wrap_future(future)
+
+    async def _pdf(self,html_path:Path,pdf_path:Path,timeout:float,assets:Path|None,images:ImageCache|None,retry:bool = True)->bool:
+        from playwright.async_api import Error
+
+        context = await self._acquire()
+        healthy = True
+        try:
+            page = await context.new_page()
+            try:
+                ready = await _print_page(page,html_path,pdf_path,timeout,assets,images)
+            finally:
+                await page.close()
+        except Error:
+            healthy = False
+            browser = self._borrowed[context]
+            if not retry or browser.is_connected():
+                raise
+        finally:
+            await self._release(context,healthy)
+        if not healthy:
+            #the browser died under the page, once more on a relaunched one
+            return await self._pdf(html_path,pdf_path,timeout,assets,images,retry=False)
+        return ready
+
+    async def _browser_ready(self):
+        """The current browser, (re)launched when missing, disconnected or worn out"""
+        from playwright import async_api
+
+        async with self._launch_lock:
+            browser = self._browser
+            if browser is not None and (not browser.is_connected() or self._pages >= self.pages_per_browser):
+                self._browser = None
+                for context in self._idle:
+                    await _close_quietly(context)
+                self._idle = []
+                if browser not in self._borrowed.values():
+                    await _close_quietly(browser)
+            if self._browser is None:
+                if self._playwright is None:
+                    self._playwright = await async_api.async_playwright().start()
+                self._browser = await launch_browser(self._playwright)
+                self._pages = 0
+            return self._browser
+
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.contexts)
+            self._launch_lock = asyncio.Lock()
+        await self._slots.acquire()
+        try:
+            browser = await self._browser_ready()
+            context = self._idle.pop() if self._idle else await browser.new_context()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._borrowed[context] = browser
+        return context
+
+    async def _release(self,context,healthy:bool)->None:
+        browser = self._borrowed.pop(context)
+        try:
+            if browser is self._browser:
+                self._pages += 1
+                if healthy and browser.is_connected():
+                    self._idle.append(context)
+                    return
+            await _close_quietly(context)
+            #a replaced browser closes with its last borrowed context
+            if browser is not self._browser and browser not in self._borrowed.values():
+                await _close_quietly(browser)
+        finally:
+            self._slots.release()
+
+    async def _shutdown(self)->None:
+        for context in self._idle + list(self._borrowed):
+            await _close_quietly(context)
+        browsers = {id(browser):browser for browser in self._borrowed.values()}
+        if self._browser is not None:
+            browsers[id(self._browser)] = self._browser
+        for browser in browsers.values():
+            await _close_quietly(browser)
+        if self._playwright is not None:
+            await self._playwright.stop()
+        self._reset()
+
+    def close(self,timeout:float = 30)->None:
+        """Shut chromium, playwright and the pool's loop down, the next pdf() starts them again"""
+        with self._thread_lock:
+            loop,thread = self._loop,self._thread
+            self._loop = None
+            self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(),loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            if not thread.is_alive():
+                loop.close()
+
+
+async def _close_quietly(closeable)->None:
+    try:
+        await closeable.close()
+    except Exception:
+        pass
+
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool()->BrowserPool:
+    """The process wide BrowserPool, closed at interpreter exit"""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool()
+            atexit.register(_browser_pool.close)
+        return _browser_pool
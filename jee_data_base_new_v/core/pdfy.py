@@ -1,53 +1,63 @@
+import io
 from .styles import dark_style,white_style
 from .html_helper import *
 from .types import *
-from .pdfy_support import (
-    get_exam_html,
-    get_answer_label_normal,
-    get_answer_label_clustering,
-    get_labels_sorted,
-    get_options_html,
-    convert_dollar_math_to_inline,
-    make_inline,
-    )
-
-def get_html(question_list: list,style:str="dark")->HtmlLike:
-    q_blocks = []
+from typing import TYPE_CHECKING
+from .pdfy_support import get_labels_sorted,make_inline,fragment
+if TYPE_CHECKING:
+    #fragments.py imports numpy, pdfy is imported with the package
+    from .fragments import FragmentStore
+
+def get_html(question_list: list,style:str="dark",fragments:"FragmentStore|None"=None)->HtmlLike:
+    file = io.StringIO()
+    write_html(file,question_list,style,fragments)
+    return file.getvalue()
+
+def write_html(file,question_list: list,style:str="dark",fragments:"FragmentStore|None"=None)->None:
+    """
+    Streaming get_html: writes the same document into file (anything with .write(str))
+    block by block, only the short answer entries are kept until the answer key.
+    question_list is iterated twice (questions, then explanations).
+    Questions covered by fragments (a FragmentStore) are read pre-rendered.
+    """
+    if style == "dark":
+        style_theme = dark_style
+    if style == "white":
+        style_theme = white_style
+
+    file.write(final_html_head_fx(style_theme))
     answer_entries = []
-    explanation_entries = []
     for index, question in enumerate(question_list, start=1):
-        q_text = convert_dollar_math_to_inline(getattr(question, "question", ""))
-        exam_html = get_exam_html(question)
-        options_html = get_options_html(question)
+        q_text = fragment(question,"question",fragments)
+        exam_html = fragment(question,"exam",fragments)
+        options_html = fragment(question,"options",fragments)
 
-        q_block = q_block_fx(index,exam_html,q_text,options_html)
-        q_blocks.append(q_block)
+        if index > 1:
+            file.write("\n")
+        file.write(q_block_fx(index,exam_html,q_text,options_html))
 
-        answer_label = get_answer_label_normal(question)
+        answer_label = fragment(question,"answer",fragments)
         answer_entries.append(f"<li>Q{index}: <strong>{answer_label}</strong></li>")
 
-
-        explanation = getattr(question, "explanation", "") or ""
-        if explanation and explanation.strip():
-            explanation_html = convert_dollar_math_to_inline(explanation)
-            explanation_entries.append(f"<li><strong>Q{index}:</strong> {explanation_html}</li>")
-
-    questions_html = "\n".join(q_blocks)
     answer_key_html = "<ol class='answer-key' list-style-type=none;>\n" + "\n".join(answer_entries) + "\n</ol>"
+    file.write(final_html_answers_fx(answer_key_html))
 
-    explanation_key_html = ""
-    if explanation_entries:
-        explanation_key_html = "<div class='explanation-section'>\n  <h3>Explanation Answer Key</h3>\n  <ol class='explanations'>\n" + "\n".join(explanation_entries) + "\n  </ol>\n</div>"
-    
-    if style == "dark":
-        style_theme = dark_style
-    if style == "white":
-        style_theme == white_style
-    
-    html = final_html_fx(style_theme,questions_html,answer_key_html,explanation_key_html)
-    return html
-
-def get_cluster_html(cluster_dict: dict,title: str = "Clustered Questions",mode:str="dark")->HtmlLike:
+    has_explanations = False
+    for index, question in enumerate(question_list, start=1):
+        explanation_html = fragment(question,"explanation",fragments)
+        if explanation_html.strip():
+            if has_explanations:
+                file.write("\n")
+            else:
+                file.write("<div class='explanation-section'>\n  <h3>Explanation Answer Key</h3>\n  <ol class='explanations'>\n")
+                has_explanations = True
+            file.write(f"<li><strong>Q{index}:</strong> {explanation_html}</li>")
+    if has_explanations:
+        file.write("\n  </ol>\n</div>")
+
+    file.write(final_html_tail_fx())
+
+def get_cluster_html(cluster_dict: dict,title: str = "Clustered Questions",mode:str="dark",fragments:"FragmentStore|None"=None)->HtmlLike:
     """
     Render clustered questions into an HTML file.
 
@@ -57,65 +67,11 @@ def get_cluster_html(cluster_dict: dict,title: str = "Clustered Questions",mode:
       so MathJax renders everything inline.
     - Accepts cluster keys that may be numpy integer types (e.g. np.int64).
     """
+    file = io.StringIO()
+    write_cluster_html(file,cluster_dict,title,mode,fragments)
+    return file.getvalue()
 
-    labels = list(cluster_dict.keys())
-    labels_sorted = get_labels_sorted(labels)
-
-    cluster_blocks = []
-    summary_entries = []
-    total_questions = sum(len(v) for v in cluster_dict.values())
-
-    for clabel in labels_sorted:
-        q_list = cluster_dict.get(clabel) or []
-        try:
-            clabel_int = int(clabel)
-        except Exception:
-            clabel_int = clabel
-
-        label_title = "Noise" if clabel_int == -1 else f"Cluster {clabel_int}"
-        label_title_html = make_inline(label_title)
-        size = len(q_list)
-        summary_entries.append(f"<li><strong>{label_title_html}:</strong> {size} question(s)</li>")
-
-        q_blocks = []
-        answer_entries = []
-        explanation_entries = []
-
-        for index, question in enumerate(q_list, start=1):
-            q_text = make_inline(getattr(question, "question", ""))
-            exam_html = get_exam_html(question)
-
-            options_html = get_options_html(question)
-
-            q_block_var = q_block_fx(index,exam_html,q_text,options_html)
-            q_blocks.append(q_block_var)
-
-            answer_label = make_inline(get_answer_label_clustering(question))
-            # if answer label empty, show placeholder
-            answer_entries.append(f"<li>Q{index}: <strong>{answer_label or ''}</strong></li>")
-
-            explanation = getattr(question, "explanation", "") or ""
-            if explanation and explanation.strip():
-                explanation_html = make_inline(explanation)
-                explanation_entries.append(f"<li><strong>Q{index}:</strong> {explanation_html}</li>")
-
-        cluster_html = cluster_html_fx(label_title_html,size,q_blocks,answer_entries)
-        if explanation_entries:
-            cluster_html += explnation_html_fx(explanation_entries)
-        cluster_html += "\n    </section>\n"
-        cluster_blocks.append(cluster_html)
-
-    clusters_html = "\n".join(cluster_blocks)
-    summary_html = "<ul class='cluster-summary'>\n" + "\n".join(summary_entries) + "\n</ul>"
-   
-    if mode == "dark":
-        style = dark_style
-    else:
-        style = white_style
-    html = final_html_cluster_fx(title,style,cluster_dict,total_questions,summary_html,clusters_html)
-    return html
-
-def get_cluster_skim_html(cluster_dict: dict, title: str = "Clustered Questions",mode:str="dark")->HtmlLike:
+def get_cluster_skim_html(cluster_dict: dict, title: str = "Clustered Questions",mode:str="dark",fragments:"FragmentStore|None"=None)->HtmlLike:
     """
     Render clustered questions into an HTML file.
 
@@ -125,58 +81,83 @@ def get_cluster_skim_html(cluster_dict: dict, title: str = "Clustered Questions"
       so MathJax renders everything inline.
     - Accepts cluster keys that may be numpy integer types (e.g. np.int64).
     """
+    file = io.StringIO()
+    write_cluster_skim_html(file,cluster_dict,title,mode,fragments)
+    return file.getvalue()
+
+def write_cluster_html(file,cluster_dict: dict,title: str = "Clustered Questions",mode:str="dark",fragments:"FragmentStore|None"=None)->None:
+    """Streaming get_cluster_html: writes the document into file one cluster section at a time"""
+    _write_clusters(file,cluster_dict,title,mode,skim=False,fragments=fragments)
+
+def write_cluster_skim_html(file,cluster_dict: dict,title: str = "Clustered Questions",mode:str="dark",fragments:"FragmentStore|None"=None)->None:
+    """Streaming get_cluster_skim_html: writes the document into file one cluster section at a time"""
+    _write_clusters(file,cluster_dict,title,mode,skim=True,fragments=fragments)
+
+def _label_title_html(clabel)->str:
+    try:
+        clabel_int = int(clabel)
+    except Exception:
+        clabel_int = clabel
+
+    label_title = "Noise" if clabel_int == -1 else f"Cluster {clabel_int}"
+    return make_inline(label_title)
+
+def _write_clusters(file,cluster_dict:dict,title:str,mode:str,skim:bool,fragments:"FragmentStore|None"=None)->None:
+    """Header and summary first (they only need cluster sizes), then each cluster section as it is built"""
     # Normalize and sort cluster labels; put noise (-1) last
     labels = list(cluster_dict.keys())
     labels_sorted = get_labels_sorted(labels)
-
-    cluster_blocks = []
-    summary_entries = []
     total_questions = sum(len(v) for v in cluster_dict.values())
 
+    summary_entries = []
     for clabel in labels_sorted:
-        q_list = cluster_dict.get(clabel) or []
-        try:
-            clabel_int = int(clabel)
-        except Exception:
-            clabel_int = clabel
+        size = len(cluster_dict.get(clabel) or [])
+        summary_entries.append(f"<li><strong>{_label_title_html(clabel)}:</strong> {size} question(s)</li>")
+    summary_html = "<ul class='cluster-summary'>\n" + "\n".join(summary_entries) + "\n</ul>"
+
+    if mode == "dark":
+        style = dark_style
+    else:
+        style = white_style
+    file.write(final_html_cluster_head_fx(title,style,len(cluster_dict),total_questions,summary_html))
 
-        label_title = "Noise" if clabel_int == -1 else f"Cluster {clabel_int}"
-        label_title_html = make_inline(label_title)
+    for position, clabel in enumerate(labels_sorted):
+        q_list = cluster_dict.get(clabel) or []
+        label_title_html = _label_title_html(clabel)
         size = len(q_list)
-        summary_entries.append(f"<li><strong>{label_title_html}:</strong> {size} question(s)</li>")
 
         q_blocks = []
         answer_entries = []
         explanation_entries = []
 
         for index, question in enumerate(q_list, start=1):
-            q_text = make_inline(getattr(question, "question", ""))
-            exam_html = get_exam_html(question)
-
-            options_html = get_options_html(question)
+            q_text = fragment(question,"question_inline",fragments)
+            exam_html = fragment(question,"exam",fragments)
+            options_html = fragment(question,"options",fragments)
+            explanation_html = fragment(question,"explanation_inline",fragments)
 
-            q_block = q_block_skim_fx(index,exam_html,q_text,options_html,question)
-            q_blocks.append(q_block)
+            if skim:
+                q_blocks.append(q_block_skim_fx(index,exam_html,q_text,options_html,explanation_html))
+                continue
+            q_blocks.append(q_block_fx(index,exam_html,q_text,options_html))
 
-            answer_label = make_inline(get_answer_label_clustering(question))
+            answer_label = fragment(question,"answer_inline",fragments)
             # if answer label empty, show placeholder
             answer_entries.append(f"<li>Q{index}: <strong>{answer_label or ''}</strong></li>")
 
-            explanation = getattr(question, "explanation", "") or ""
-            if explanation and explanation.strip():
-                explanation_html = make_inline(explanation)
+            if explanation_html.strip():
                 explanation_entries.append(f"<li><strong>Q{index}:</strong> {explanation_html}</li>")
 
-        cluster_html = cluster_html_skim_fx(label_title_html,size,q_blocks)
-        
-        cluster_blocks.append(cluster_html)
+        if skim:
+            cluster_html = cluster_html_skim_fx(label_title_html,size,q_blocks)
+        else:
+            cluster_html = cluster_html_fx(label_title_html,size,q_blocks,answer_entries)
+            if explanation_entries:
+                cluster_html += explnation_html_fx(explanation_entries)
+            cluster_html += "\n    </section>\n"
 
-    clusters_html = "\n".join(cluster_blocks)
-    summary_html = "<ul class='cluster-summary'>\n" + "\n".join(summary_entries) + "\n</ul>"
-   
-    if mode == "dark":
-        style = dark_style
-    else:
-        style = white_style
-    html = final_html_cluster_fx(title,style,cluster_dict,total_questions,summary_html,clusters_html)
-    return html
\ No newline at end of file
+        if position:
+            file.write("\n")
+        file.write(cluster_html)
+
+    file.write(final_html_cluster_tail_fx())
@@ -126,4 +126,28 @@ def get_labels_sorted(labels)->list:
         labels_sorted = sorted(labels, key=lambda x: (int(x) == -1, int(x)))
     except Exception:
         labels_sorted = sorted(labels, key=lambda x: (str(x) == "-1", str(x)))
-    return labels_sorted
\ No newline at end of file
+    return labels_sorted
+
+
+def _explanation(question)->str:
+    return getattr(question,"explanation","") or ""
+
+#fragment name -> how it is rendered from a question, *_inline are the cluster/skim variants
+#(FragmentStore pre-renders them, it lives in fragments.py to keep numpy out of pdfy's imports)
+FRAGMENTS = {
+    "question":lambda q: convert_dollar_math_to_inline(getattr(q,"question","")),
+    "question_inline":lambda q: make_inline(getattr(q,"question","")),
+    "exam":get_exam_html,
+    "options":get_options_html,
+    "answer":get_answer_label_normal,
+    "answer_inline":lambda q: make_inline(get_answer_label_clustering(q)),
+    "explanation":lambda q: convert_dollar_math_to_inline(_explanation(q)),
+    "explanation_inline":lambda q: make_inline(_explanation(q)),
+}
+
+
+def fragment(question,name:str,fragments=None)->str:
+    """The name fragment of question, read from fragments (a FragmentStore) when they cover it, rendered otherwise"""
+    if fragments is not None and fragments.covers(question):
+        return fragments.text(name,question.row)
+    return FRAGMENTS[name](question)
@@ -0,0 +1,195 @@
+"""
+This file has the query expression classes used by Filter.query
+
+usage (& | bind tighter than ==, keep comparisons in parenthesis):
+    expr = Field("year").between(2021,2025) & (Field("subject") == "physics") & ~HasImage("question")
+    view = filter.query(expr)
+"""
+
+import numpy as np
+from .columnar import (
+    ColumnarStore,
+    CATEGORICAL_FIELDS,
+    INTEGER_FIELDS,
+    FLAG_FIELDS,
+    ANY_IMG_OPTION,
+)
+
+QUERYABLE_FIELDS = CATEGORICAL_FIELDS + INTEGER_FIELDS + FLAG_FIELDS + (ANY_IMG_OPTION,"question_id")
+
+#HasImage targets -> flag column
+IMAGE_FLAGS = {
+    "question":"isImgQuestion",
+    "explanation":"isImgExplanation",
+    "option":ANY_IMG_OPTION,
+}
+
+
+class Expr:
+    """Base of all query expressions, combine with & | ~"""
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        """bool array over every row of store, True where the expression holds"""
+        raise NotImplementedError
+
+    def __and__(self,other:"Expr")->"Expr":
+        return And(self,other)
+
+    def __or__(self,other:"Expr")->"Expr":
+        return Or(self,other)
+
+    def __invert__(self)->"Expr":
+        return Not(self)
+
+
+class And(Expr):
+    def __init__(self,*exprs:Expr)->None:
+        self.exprs = exprs
+
+    def __repr__(self)->str:
+        return "(" + " & ".join(repr(expr) for expr in self.exprs) + ")"
+
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        result = np.ones(store.n_rows,dtype=bool)
+        for expr in self.exprs:
+            result &= expr.mask(store)
+        return result
+
+
+class Or(Expr):
+    def __init__(self,*exprs:Expr)->None:
+        self.exprs = exprs
+
+    def __repr__(self)->str:
+        return "(" + " | ".join(repr(expr) for expr in self.exprs) + ")"
+
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        result = np.zeros(store.n_rows,dtype=bool)
+        for expr in self.exprs:
+            result |= expr.mask(store)
+        return result
+
+
+class Not(Expr):
+    def __init__(self,expr:Expr)->None:
+        self.expr = expr
+
+    def __repr__(self)->str:
+        return f"~{self.expr!r}"
+
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        return ~self.expr.mask(store)
+
+
+class Predicate(Expr):
+    """field compared with a python test, evaluated once per distinct value for categorical fields"""
+    def __init__(self,field:str,description:str,test)->None:
+        if field not in QUERYABLE_FIELDS:
+            raise ValueError(f"'{field}' can't be queried, queryable fields are {QUERYABLE_FIELDS}")
+        self.field = field
+        self.description = description
+        self.test = test
+
+    def __repr__(self)->str:
+        return f"{self.field} {self.description}"
+
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        if self.field == "question_id":
+            return np.fromiter(
+                (_safe_test(self.test,question_id) for question_id in store.question_ids()),
+                dtype=bool,
+                count=store.n_rows
+            )
+        column = store.column(self.field)
+        if self.field in CATEGORICAL_FIELDS:
+            #lookup table over the vocabulary, then one gather over the codes
+            lut = np.fromiter(
+                (_safe_test(self.test,value) for value in store.vocabs[self.field]),
+                dtype=bool,
+                count=len(store.vocabs[self.field])
+            )
+            return lut[column]
+        if self.field in INTEGER_FIELDS:
+            values,codes = np.unique(column,return_inverse=True)
+            lut = np.fromiter(
+                (_safe_test(self.test,int(value)) for value in values),
+                dtype=bool,
+                count=len(values)
+            )
+            return lut[codes.reshape(-1)]
+        lut = np.array([_safe_test(self.test,False),_safe_test(self.test,True)],dtype=bool)
+        return lut[np.asarray(column,dtype=np.intp)]
+
+
+class Field:
+    """
+    Reference to a question field for building expressions
+    Field("year") == 2024, Field("topic").isin([...]), Field("year").between(2020,2024)
+    """
+    def __init__(self,name:str)->None:
+        if name not in QUERYABLE_FIELDS:
+            raise ValueError(f"'{name}' can't be queried, queryable fields are {QUERYABLE_FIELDS}")
+        self.name = name
+
+    def __repr__(self)->str:
+        return f"Field({self.name!r})"
+
+    def __eq__(self,value)->Predicate:
+        return Predicate(self.name,f"== {value!r}",lambda v: v == value)
+
+    def __ne__(self,value)->Predicate:
+        return Predicate(self.name,f"!= {value!r}",lambda v: v != value)
+
+    def __lt__(self,value)->Predicate:
+        return Predicate(self.name,f"< {value!r}",lambda v: v is not None and v < value)
+
+    def __le__(self,value)->Predicate:
+        return Predicate(self.name,f"<= {value!r}",lambda v: v is not None and v <= value)
+
+    def __gt__(self,value)->Predicate:
+        return Predicate(self.name,f"> {value!r}",lambda v: v is not None and v > value)
+
+    def __ge__(self,value)->Predicate:
+        return Predicate(self.name,f">= {value!r}",lambda v: v is not None and v >= value)
+
+    __hash__ = None
+
+    def isin(self,values)->Predicate:
+        values = set(values)
+        description = "in {" + ", ".join(sorted(map(repr,values))) + "}"
+        return Predicate(self.name,description,lambda v: v in values)
+
+    def between(self,low,high,inclusive:bool=True)->Predicate:
+        if inclusive:
+            return Predicate(self.name,f"in [{low!r}, {high!r}]",lambda v: v is not None and low <= v <= high)
+        return Predicate(self.name,f"in ({low!r}, {high!r})",lambda v: v is not None and low < v < high)
+
+
+class HasImage(Predicate):
+    """True where the question, explanation or any option embeds an <img>, 'any' checks all three"""
+    def __init__(self,where:str="any")->None:
+        if where != "any" and where not in IMAGE_FLAGS:
+            raise ValueError(f"where must be 'any' or one of {list(IMAGE_FLAGS)}")
+        self.where = where
+        self.field = IMAGE_FLAGS.get(where,"isImgQuestion")
+        self.description = f"HasImage({where!r})"
+
+    def __repr__(self)->str:
+        return self.description
+
+    def mask(self,store:ColumnarStore)->np.ndarray:
+        if self.where == "any":
+            return np.logical_or.reduce([np.asarray(store.column(flag)) for flag in IMAGE_FLAGS.values()])
+        return np.asarray(store.column(self.field),dtype=bool)
+
+
+def equals(**field_values)->Expr:
+    """AND of Field(name) == value for every keyword, filter.query(year=2024,subject="physics")"""
+    return And(*(Field(name) == value for name,value in field_values.items()))
+
+
+def _safe_test(test,value)->bool:
+    try:
+        return bool(test(value))
+    except TypeError:
+        #comparing incompatible types (e.g. None < 3) is just a non match
+        return False
@@ -6,6 +6,32 @@ This file has Question class
 
 class Question:
     """Loads data from database into inherited class variables"""
+    #attribute names set by __init__, in order
+    fields = (
+        "question_id",
+        "examGroup",
+        "exam",
+        "subject",
+        "chpaterGroup",
+        "chapter",
+        "year",
+        "paperTitle",
+        "difficulty",
+        "topic",
+        "type",
+        "examDate",
+        "answer",
+        "question",
+        "options",
+        "correct_options",
+        "explanation",
+        "isOutOfSyllabus",
+        "isBonus",
+        "isImgQuestion",
+        "isImgExplanation",
+        "isImgOption",
+    )
+
     def __repr__(self)->str:
         template = f"""
 QuestionId: {self.question_id}
@@ -0,0 +1,111 @@
+"""
+This file has the Reducer class
+"""
+
+import threading
+import numpy as np
+from .cache import Cache
+from .embeddings import EmbeddingsStore
+
+REDUCTION_METHODS = ("pca","random")
+RANDOM_PROJECTION_SEED = 7
+
+
+class Reducer:
+    """
+    Linear dimensionality reduction of question embeddings, fitted once on the
+    full embedding matrix: reduced = embeddings @ components - offset.
+    'pca' takes the top principal axes (SVD of the centered matrix), 'random'
+    is a seeded gaussian random projection. The (dim+1, n_components) projection
+    is cached as a .npy so it is fitted once per schema version.
+    """
+    _loaded = {}
+    _lock = threading.Lock()
+
+    def __repr__(self)->str:
+        template = f"""
+Method: {self.method}
+Dimension: {self.components.shape[0]} -> {self.n_components}
+"""
+        return template
+
+    def __init__(self,method:str,components,offset)->None:
+        """Initialization of Reducer
+        :param:
+        method: 'pca' or 'random'
+        components: (dim, n_components) float32 projection
+        offset: (n_components,) float32 subtracted after projecting (mean @ components for pca)
+        """
+        self.method = method
+        self.components = components
+        self.offset = offset
+        self.n_components = components.shape[1]
+
+    def transform(self,embeddings)->np.ndarray:
+        """(n, dim) embeddings -> (n, n_components) float32"""
+        reduced = np.asarray(embeddings,dtype=np.float32) @ self.components
+        reduced -= self.offset
+        return reduced
+
+    @classmethod
+    def fit(cls,matrix,n_components:int,method:str = "pca")->"Reducer":
+        """
+        Fits a reducer on matrix
+        :param:
+        matrix: (n, dim) embedding matrix, usually the full EmbeddingsStore.matrix
+        n_components: target dimension (< dim)
+        method: 'pca' or 'random'
+        """
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"method must be one of {REDUCTION_METHODS}")
+        matrix = np.asarray(matrix,dtype=np.float32)
+        dim = matrix.shape[1]
+        if not 0 < n_components < dim:
+            raise ValueError(f"n_components must be between 1 and {dim - 1}")
+
+        if method == "random":
+            rng = np.random.default_rng(RANDOM_PROJECTION_SEED)
+            components = rng.standard_normal((dim,n_components)).astype(np.float32)
+            components /= np.sqrt(n_components)
+            offset = np.zeros(n_components,dtype=np.float32)
+        else:
+            mean = matrix.mean(axis=0)
+            _,_,vt = np.linalg.svd(matrix - mean,full_matrices=False)
+            components = np.ascontiguousarray(vt[:n_components].T,dtype=np.float32)
+            offset = (mean @ components).astype(np.float32)
+        return cls(method,components,offset)
+
+    @staticmethod
+    def data_name(method:str,n_components:int)->str:
+        return f"Reduction{method.capitalize()}{n_components}"
+
+    @classmethod
+    def load(cls,cache:Cache,n_components:int,method:str = "pca",embeddings:EmbeddingsStore|None = None)->"Reducer":
+        """
+        The reducer of (method, n_components) for cache's schema version.
+        Fitted on the full embedding matrix and saved on first use, loaded from the
+        cache after that. Loaded reducers are shared per (cache_path, schema_version, method, n_components).
+        :param:
+        cache: Cache the projection is stored in
+        n_components: target dimension
+        method: 'pca' or 'random'
+        embeddings: store to fit on, defaults to EmbeddingsStore.load(cache)
+        """
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"method must be one of {REDUCTION_METHODS}")
+        key = (str(cache.cache_path),cache.schema_version,method,n_components)
+        with cls._lock:
+            reducer = cls._loaded.get(key)
+            if reducer is not None:
+                return reducer
+
+            data_name = cls.data_name(method,n_components)
+            if cache.get_cache_file(data_name,extension="npy") is None:
+                embeddings = EmbeddingsStore.load(cache) if embeddings is None else embeddings
+                fitted = cls.fit(embeddings.matrix,n_components,method)
+                cache.creat_cache_npy(np.vstack([fitted.components,fitted.offset]),data_name=data_name)
+
+            packed = cache.load_cache_npy(data_name,mmap_mode=None)
+            reducer = cls(method,packed[:-1],packed[-1])
+            cls._loaded[key] = reducer
+            return reducer
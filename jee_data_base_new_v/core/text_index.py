@@ -0,0 +1,302 @@
+"""
+This file has the TextIndex class
+
+query syntax: words and "quoted phrases"
+    filter.by_text('bayes')
+    filter.by_text('"projectile" incline',match="any")
+"""
+
+import os
+import re
+import html
+import json
+import shutil
+import weakref
+import threading
+from pathlib import Path
+import numpy as np
+from .cache import Cache
+from .columnar import ColumnarStore
+
+TEXT_INDEX_FIELDS = ("question","options","explanation")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TAG = re.compile(r"<[^>]*>")
+#\( \) \[ \] and $ delimit TeX in the question html
+_TEX_DELIMITER = re.compile(r"\\[()\[\]]|\$")
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PHRASE = re.compile(r'"([^"]*)"')
+
+_EMPTY = np.zeros(0,dtype=np.int32)
+
+
+def tokenize(text:str)->list:
+    """Lower case alphanumeric tokens of html/TeX text"""
+    text = html.unescape(_TAG.sub(" ",text))
+    text = _TEX_DELIMITER.sub(" ",text)
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query:str)->tuple:
+    """(phrases, terms): token lists of the quoted phrases and the remaining single terms"""
+    phrases = [tokenize(phrase) for phrase in _PHRASE.findall(query)]
+    terms = tokenize(_PHRASE.sub(" ",query))
+    return [phrase for phrase in phrases if phrase],terms
+
+
+class TextIndex:
+    """
+    Positional inverted index over question, option and explanation text of a
+    ColumnarStore, ranked with BM25. Documents are store rows.
+    Arrays (CSR style, one directory artifact per schema version):
+    terms -> postings[offsets[t]:offsets[t+1]] (doc rows, sorted) with tf,
+    posting p -> positions[position_offsets[p]:position_offsets[p+1]].
+    """
+    data_name = "TextIndex"
+    extension = "textidx"
+    array_names = ("postings","term_frequencies","offsets","positions","position_offsets","doc_lengths")
+
+    _loaded = {}
+    _lock = threading.Lock()
+    #indexes of stores that aren't the shared cached one, never saved
+    _built = weakref.WeakKeyDictionary()
+
+    def __repr__(self)->str:
+        template = f"""
+Total Documents: {len(self.doc_lengths)}
+Total Terms: {len(self.term_ids)}
+"""
+        return template
+
+    def __init__(self,terms:list,arrays:dict)->None:
+        """Initialization of TextIndex
+        :param:
+        terms: vocabulary, term id = position
+        arrays: the array_names arrays
+        """
+        self.term_ids = {term:term_id for term_id,term in enumerate(terms)}
+        self.postings = arrays["postings"]
+        self.term_frequencies = arrays["term_frequencies"]
+        self.offsets = arrays["offsets"]
+        self.positions = arrays["positions"]
+        self.position_offsets = arrays["position_offsets"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self.average_length = float(np.mean(self.doc_lengths)) if len(self.doc_lengths) else 0.0
+
+    def _slice(self,term:str)->slice|None:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        return slice(int(self.offsets[term_id]),int(self.offsets[term_id + 1]))
+
+    def docs(self,term:str)->np.ndarray:
+        """Sorted rows containing term"""
+        postings = self._slice(term)
+        if postings is None:
+            return _EMPTY
+        return self.postings[postings]
+
+    def phrase_docs(self,phrase:list)->np.ndarray:
+        """Sorted rows containing the tokens of phrase next to each other, in order"""
+        if len(phrase) == 1:
+            return self.docs(phrase[0])
+        slices = [self._slice(term) for term in phrase]
+        if any(postings is None for postings in slices):
+            return _EMPTY
+        #every occurrence of token i becomes the key (doc, start of phrase = position - i),
+        #a phrase match is a key every token shares
+        stride = int(self.doc_lengths.max()) + len(TEXT_INDEX_FIELDS) + len(phrase) + 1
+        keys = None
+        for shift,postings in enumerate(slices):
+            docs = np.repeat(self.postings[postings].astype(np.int64),self.term_frequencies[postings])
+            positions = self.positions[self.position_offsets[postings.start]:self.position_offsets[postings.stop]]
+            term_keys = docs*stride + (positions.astype(np.int64) - shift + len(phrase))
+            keys = term_keys if keys is None else np.intersect1d(keys,term_keys)
+            if not len(keys):
+                return _EMPTY
+        return np.unique(keys//stride).astype(np.int32)
+
+    def scores(self,terms:list)->np.ndarray:
+        """BM25 score of every row for the bag of terms"""
+        n_docs = len(self.doc_lengths)
+        scores = np.zeros(n_docs,dtype=np.float64)
+        length_norm = BM25_K1*(1 - BM25_B + BM25_B*self.doc_lengths/(self.average_length or 1))
+        for term in set(terms):
+            postings = self._slice(term)
+            if postings is None:
+                continue
+            docs = self.postings[postings]
+            tf = self.term_frequencies[postings].astype(np.float64)
+            idf = np.log(1 + (n_docs - len(docs) + 0.5)/(len(docs) + 0.5))
+            scores += np.bincount(docs,weights=idf*tf*(BM25_K1 + 1)/(tf + length_norm[docs]),minlength=n_docs)
+        return scores
+
+    def search(self,query:str,rows:np.ndarray|None = None,match:str = "all")->tuple:
+        """
+        Rows matching query, best BM25 score first
+        :param:
+        query: words and "quoted phrases", phrases must always match
+        rows: only consider these rows (e.g. a view), None searches everything
+        match: 'all' every word must appear, 'any' at least one word (phrases are required either way)
+        :return: (rows, scores)
+        """
+        if match not in ("all","any"):
+            raise ValueError("match must be 'all' or 'any'")
+        phrases,terms = parse_query(query)
+        if not phrases and not terms:
+            return _EMPTY,np.zeros(0)
+
+        required = [self.phrase_docs(phrase) for phrase in phrases]
+        if match == "all":
+            required += [self.docs(term) for term in terms]
+        optional = [self.docs(term) for term in terms] if match == "any" else []
+
+        candidates = None
+        for docs in required:
+            candidates = docs if candidates is None else np.intersect1d(candidates,docs,assume_unique=True)
+        if optional:
+            any_term = np.unique(np.concatenate(optional))
+            candidates = any_term if candidates is None else np.intersect1d(candidates,any_term,assume_unique=True)
+        if rows is not None:
+            candidates = candidates[np.isin(candidates,rows)]
+
+        scores = self.scores(terms + [term for phrase in phrases for term in phrase])[candidates]
+        order = np.argsort(-scores,kind="stable")
+        return candidates[order].astype(np.int32),scores[order]
+
+    @classmethod
+    def build(cls,store:ColumnarStore)->tuple:
+        """Tokenizes every row of store, returns (terms, arrays)"""
+        term_ids = {}
+        triples_term = []
+        triples_doc = []
+        triples_position = []
+        doc_lengths = np.zeros(store.n_rows,dtype=np.int32)
+        for row in range(store.n_rows):
+            position = 0
+            for field in TEXT_INDEX_FIELDS:
+                tokens = tokenize(_field_text(store,field,row))
+                doc_lengths[row] += len(tokens)
+                for token in tokens:
+                    triples_term.append(term_ids.setdefault(token,len(term_ids)))
+                    triples_doc.append(row)
+                    triples_position.append(position)
+                    position += 1
+                #gap so a phrase never spans two fields
+                position += 1
+
+        terms = list(term_ids)
+        term = np.asarray(triples_term,dtype=np.int64)
+        doc = np.asarray(triples_doc,dtype=np.int64)
+        position = np.asarray(triples_position,dtype=np.int32)
+        order = np.lexsort((position,doc,term))
+        term,doc,position = term[order],doc[order],position[order]
+
+        #one posting per (term, doc) pair
+        new_posting = np.ones(len(term),dtype=bool)
+        new_posting[1:] = (term[1:] != term[:-1]) | (doc[1:] != doc[:-1])
+        posting_starts = np.flatnonzero(new_posting)
+        position_offsets = np.append(posting_starts,len(term)).astype(np.int64)
+        posting_terms = term[posting_starts]
+        offsets = np.zeros(len(terms) + 1,dtype=np.int64)
+        np.cumsum(np.bincount(posting_terms,minlength=len(terms)),out=offsets[1:])
+        arrays = {
+            "postings":doc[posting_starts].astype(np.int32),
+            "term_frequencies":np.diff(position_offsets).astype(np.int32),
+            "offsets":offsets,
+            "positions":position,
+            "position_offsets":position_offsets,
+            "doc_lengths":doc_lengths,
+        }
+        return terms,arrays
+
+    @classmethod
+    def save(cls,cache:Cache,terms:list,arrays:dict)->Path:
+        """Writes the index as a directory of .npy files plus meta.json into the cache"""
+        index_path = cache.new_cache_path(cls.data_name,extension=cls.extension)
+        temp_path = Path(f"{index_path}.tmp")
+        if temp_path.exists():
+            shutil.rmtree(temp_path)
+        temp_path.mkdir()
+        for name in cls.array_names:
+            np.save(temp_path/f"{name}.npy",arrays[name],allow_pickle=False)
+        with open(temp_path/"meta.json","w",encoding="utf-8") as file:
+            json.dump({"n_docs":len(arrays["doc_lengths"]),"fields":list(TEXT_INDEX_FIELDS),"terms":terms},file)
+        os.replace(temp_path,index_path)
+        cache.register(index_path)
+        return index_path
+
+    @classmethod
+    def open(cls,index_path)->"TextIndex":
+        """Memory-map a saved index directory"""
+        index_path = Path(index_path)
+        with open(index_path/"meta.json","r",encoding="utf-8") as file:
+            meta = json.load(file)
+        arrays = {name:_load_array(index_path/f"{name}.npy") for name in cls.array_names}
+        return cls(meta["terms"],arrays)
+
+    @classmethod
+    def load(cls,cache:Cache,store:ColumnarStore)->"TextIndex":
+        """
+        The index of store for cache's schema version, built and saved on first use
+        (or when the cached one was built for a different number of rows, the stale
+        one is removed). Loaded indexes are shared per (cache_path, schema_version).
+        Only the shared store of cache (ColumnarStore.load) is indexed into the cache,
+        other stores (e.g. built from plain Chapter dicts) get an in memory index.
+        """
+        key = (str(cache.cache_path),cache.schema_version)
+        with cls._lock:
+            if ColumnarStore.loaded(cache) is not store:
+                index = cls._built.get(store)
+                if index is None:
+                    index = cls(*cls.build(store))
+                    cls._built[store] = index
+                return index
+
+            index = cls._loaded.get(key)
+            if index is not None and len(index.doc_lengths) == store.n_rows:
+                return index
+
+            index_path = cache.get_cache_file(cls.data_name,extension=cls.extension)
+            index = cls.open(index_path) if index_path is not None else None
+            if index is None or len(index.doc_lengths) != store.n_rows:
+                return cls._rebuild(cache,store)
+            cls._loaded[key] = index
+            return index
+
+    @classmethod
+    def rebuild(cls,cache:Cache,store:ColumnarStore)->"TextIndex":
+        """Builds and saves a fresh index of store, the cached one is removed"""
+        with cls._lock:
+            return cls._rebuild(cache,store)
+
+    @classmethod
+    def _rebuild(cls,cache:Cache,store:ColumnarStore)->"TextIndex":
+        old_path = cache.get_cache_file(cls.data_name,extension=cls.extension)
+        index_path = cls.save(cache,*cls.build(store))
+        if old_path is not None and Path(old_path) != index_path:
+            cache.remove_artifact(old_path)
+        index = cls.open(index_path)
+        cls._loaded[(str(cache.cache_path),cache.schema_version)] = index
+        return index
+
+
+def _field_text(store:ColumnarStore,field:str,row:int)->str:
+    value = store.value(field,row)
+    if field != "options":
+        return value or ""
+    if isinstance(value,dict):
+        value = list(value.values())
+    texts = []
+    for option in value or []:
+        texts.append(option.get("content","") if isinstance(option,dict) else str(option))
+    return " ".join(texts)
+
+
+def _load_array(array_path:Path):
+    try:
+        return np.load(array_path,mmap_mode="r",allow_pickle=False)
+    except ValueError:
+        #empty arrays can't be memory-mapped
+        return np.load(array_path,allow_pickle=False)
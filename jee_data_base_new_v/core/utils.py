@@ -1,29 +1,37 @@
-import re
 import os
 import sys
+import json
+import hashlib
+import threading
 from . import cache_path,schema_version,EMBEDDINGS_LINK,DATABASE_LINK
+from .cache import Cache
 from pathlib import Path
-from requests import Session
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 
-session = Session()
+#requests and tqdm are imported on first download, see _get_session
+session = None
+
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_BLOCK_SIZE = 1 << 20
+DOWNLOAD_RETRIES = 3
 
 def check_cache_health(data_name:str)->bool:
-    pattern = rf"\d*-{data_name}-{schema_version}.pkl"
-
-    cache_files_paths = os.listdir(cache_path)
-    cache_files = [Path(file).name for file in cache_files_paths]
-    health = False
-    for i in cache_files:
-        if re.search(pattern,i):
-            health = True
-    return health
-
-def download_cache(data_name:str)->None:
-    pattern = rf"\d*-{data_name}-{schema_version}.pkl"
+    return Cache(cache_path,schema_version).is_cached(data_name)
+
+def download_cache(*data_names:str)->None:
+    """
+    Downloads release caches into cache_path, several data names are fetched concurrently.
+    Each file is fetched in parallel ranged segments, resumed from a .part file
+    if an earlier download was interrupted and checked against the digest GitHub
+    publishes for the release asset before it is moved into place.
+    :param:
+    data_names: DataBaseChapters and/or EmbeddingsChapters
+    """
+    if not data_names:
+        return None
     cache_file_dict = {
-        f"123-DataBaseChapters-{schema_version}.pkl":DATABASE_LINK,
-        f"123-EmbeddingsChapters-{schema_version}.pkl":EMBEDDINGS_LINK
+        "DataBaseChapters":(f"123-DataBaseChapters-{schema_version}.pkl",DATABASE_LINK),
+        "EmbeddingsChapters":(f"123-EmbeddingsChapters-{schema_version}.pkl",EMBEDDINGS_LINK),
     }
     # for i in range(5):
     #     try:    
@@ -33,19 +41,207 @@ def download_cache(data_name:str)->None:
     #         print(e)
     # if cache_file_dict == None:
     #     return None            
-    for i in cache_file_dict.keys():
-        if re.search(pattern,i):
-            response = session.get(cache_file_dict[i], stream=True)
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 65536
+    try:
+        digests = _get_release_digests()
+    except Exception as e:
+        #api rate limits or no api access, fall back to the size check
+        print(f"Could not fetch release digests: {e}")
+        digests = {}
+
+    cache = Cache(cache_path,schema_version)
+    def _download(data_name:str)->None:
+        file_name,link = cache_file_dict[data_name]
+        file_path = fetch_file(
+            link,
+            Path(cache_path)/file_name,
+            digest=digests.get(link.rsplit("/",1)[-1])
+        )
+        cache.register(file_path)
+
+    with ThreadPoolExecutor(max_workers=max(1,len(data_names))) as pool:
+        for future in [pool.submit(_download,data_name) for data_name in data_names]:
+            future.result()
+
+
+def fetch_file(
+        url:str,
+        destination,
+        digest:str|None=None,
+        segments:int=DOWNLOAD_SEGMENTS,
+        http_session=None
+        )->Path:
+    """
+    Download url to destination.
+    - the file is fetched with HTTP Range requests in `segments` parallel parts
+    - bytes land in destination.part, finished offsets are kept in destination.part.json
+      so an interrupted download continues where it stopped
+    - digest ("sha256:<hex>") is verified before the .part file is atomically renamed
+      to destination, without a digest the size is checked against the server's
+    :param:
+    url: file url
+    destination: final file path
+    digest: expected "sha256:<hex>" digest or None
+    segments: number of parallel ranged requests
+    http_session: requests Session to use, defaults to the module session
+    """
+    from tqdm import tqdm
+
+    http_session = http_session or _get_session()
+    destination = Path(destination)
+    part_path = destination.with_name(f"{destination.name}.part")
+    state_path = destination.with_name(f"{destination.name}.part.json")
+
+    total_size,accepts_ranges = _probe_download(http_session,url)
+    if total_size is None:
+        #ranges need the end of the file, an unknown size is fetched in one go
+        accepts_ranges = False
+    if not accepts_ranges:
+        segments = 1
+
+    state = _load_download_state(state_path,url,total_size)
+    if state is None or not part_path.exists():
+        if total_size and accepts_ranges:
+            step = -(-total_size//segments)
+            bounds = [[start,min(start+step,total_size)-1,start] for start in range(0,total_size,step)]
+        else:
+            bounds = [[0,(total_size or 0)-1,0]]
+        state = {"url":url,"size":total_size,"segments":bounds}
+        with open(part_path,"wb") as file:
+            if total_size:
+                file.truncate(total_size)
+        _save_download_state(state_path,state)
+    elif not accepts_ranges:
+        #no resume without range support, the download starts over
+        for segment in state["segments"]:
+            segment[2] = segment[0]
+
+    lock = threading.Lock()
+    done = sum(segment[2]-segment[0] for segment in state["segments"])
+    progress_bar = tqdm(
+        total=total_size,initial=done,unit="B",unit_scale=True,desc=str(destination),file=sys.stdout,miniters=1
+    )
+
+    def _fetch_segment(segment:list)->None:
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                _download_segment(http_session,url,part_path,segment,accepts_ranges,lock,state_path,state,progress_bar)
+                return
+            except (OSError,ConnectionError) as e:
+                if attempt == DOWNLOAD_RETRIES-1:
+                    raise
+                print(f"Retrying {destination.name} at byte {segment[2]}: {e}")
+
+    pending = [segment for segment in state["segments"] if total_size is None or segment[2] <= segment[1]]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1,len(pending))) as pool:
+            for future in [pool.submit(_fetch_segment,segment) for segment in pending]:
+                future.result()
+    finally:
+        progress_bar.close()
+        with lock:
+            _save_download_state(state_path,state)
+
+    #bytes actually written, a preallocated .part file always has total_size bytes
+    written = sum(segment[2]-segment[0] for segment in state["segments"])
+    if total_size is not None and written != total_size:
+        raise ValueError(f"Incomplete download for {destination.name}: {written} of {total_size} bytes")
+
+    if digest:
+        algorithm,_,expected = digest.partition(":")
+        hasher = hashlib.new(algorithm)
+        with open(part_path,"rb") as file:
+            for block in iter(lambda: file.read(DOWNLOAD_BLOCK_SIZE),b""):
+                hasher.update(block)
+        if hasher.hexdigest() != expected:
+            part_path.unlink()
+            state_path.unlink()
+            raise ValueError(f"Digest mismatch for {destination.name}: expected {digest}")
+
+    os.replace(part_path,destination)
+    state_path.unlink()
+    return destination
 
-            file_path = cache_path/i
-            with open(file_path, 'wb') as file, tqdm(
-                total=total_size, unit='B', unit_scale=True, desc=str(file_path),file=sys.stdout,miniters=1,disable=False
-            ) as progress_bar:
-                for data in response.iter_content(block_size):
-                    file.write(data)
-                    progress_bar.update(len(data))
+
+def _get_session():
+    """Module wide requests Session, created on first use"""
+    global session
+    if session is None:
+        from requests import Session
+        session = Session()
+    return session
+
+
+def _probe_download(http_session,url:str)->tuple:
+    """Returns (total_size or None, whether the server honours Range requests)"""
+    response = http_session.get(url,headers={"Range":"bytes=0-0"},stream=True,timeout=30)
+    try:
+        response.raise_for_status()
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range","")
+            total = content_range.rsplit("/",1)[-1]
+            return (int(total) if total.isdigit() else None),True
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None),False
+    finally:
+        response.close()
+
+
+def _download_segment(http_session,url,part_path,segment,accepts_ranges,lock,state_path,state,progress_bar)->None:
+    start,end,offset = segment
+    headers = {"Range":f"bytes={offset}-{end}"} if accepts_ranges else {}
+    if not accepts_ranges:
+        #no resume without range support, start over
+        offset = segment[2] = start
+    with http_session.get(url,headers=headers,stream=True,timeout=60) as response:
+        response.raise_for_status()
+        if accepts_ranges and response.status_code != 206:
+            raise ConnectionError(f"Server ignored range request for {url}")
+        with open(part_path,"r+b") as file:
+            file.seek(offset)
+            if not accepts_ranges:
+                #bytes of an earlier attempt past offset may not belong to this response
+                file.truncate(offset)
+            unsaved = 0
+            for data in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                file.write(data)
+                segment[2] += len(data)
+                unsaved += len(data)
+                progress_bar.update(len(data))
+                if unsaved >= 8*DOWNLOAD_BLOCK_SIZE:
+                    file.flush()
+                    with lock:
+                        _save_download_state(state_path,state)
+                    unsaved = 0
+        length = response.headers.get("Content-Length")
+        #with a content encoding Content-Length counts the encoded bytes
+        if length is not None and response.headers.get("Content-Encoding","identity") == "identity":
+            if segment[2] - offset != int(length):
+                raise ConnectionError(f"Response for {url} ended at {segment[2] - offset} of {length} bytes")
+    if accepts_ranges and segment[2] <= end:
+        raise ConnectionError(f"Segment {start}-{end} ended early at byte {segment[2]}")
+
+
+def _load_download_state(state_path:Path,url:str,total_size)->dict|None:
+    try:
+        with open(state_path,"r",encoding="utf-8") as file:
+            state = json.load(file)
+    except (OSError,ValueError):
+        return None
+    if state.get("url") != url or state.get("size") != total_size:
+        return None
+    return state
+
+
+def _save_download_state(state_path:Path,state:dict)->None:
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path,"w",encoding="utf-8") as file:
+        json.dump(state,file)
+    os.replace(temp_path,state_path)
+
+
+def rebuild_cache_manifest()->dict:
+    """Rescans cache_path and rewrites its manifest"""
+    return Cache(cache_path,schema_version).rebuild_manifest()
 
 
 def _get_release_files_dict(
@@ -53,7 +249,7 @@ def _get_release_files_dict(
         repo:str="jee_mains_pyqs_data_base"
         )->dict:
     url = f"https://api.github.com/repos/{owner}/{repo}/releases"
-    response = session.get(
+    response = _get_session().get(
         url,
         verify=False
         )
@@ -64,3 +260,17 @@ def _get_release_files_dict(
     
     return asset_dict
 
+
+def _get_release_digests(
+        owner:str="HostServer001",
+        repo:str="jee_mains_pyqs_data_base",
+        tag:str=schema_version
+        )->dict:
+    """asset name -> "sha256:<hex>" digest GitHub publishes for the release assets"""
+    url = f"https://api.github.com/repos/{owner}/{repo}/releases/tags/{tag}"
+    response = _get_session().get(url,timeout=30)
+    response.raise_for_status()
+    return {
+        asset["name"]:asset.get("digest")
+        for asset in response.json().get("assets",[])
+    }
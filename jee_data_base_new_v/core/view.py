@@ -0,0 +1,147 @@
+"""
+This file has the ResultView class
+"""
+
+import operator
+import numpy as np
+import datetime as dt
+from .columnar import ColumnarStore,QuestionView
+from .index import FieldIndex
+
+
+class ResultView:
+    """
+    Immutable result of a query: a read only array of row ids into a ColumnarStore.
+    Refining a view returns a new view, the original is never changed, so one
+    shared Filter can serve many sessions/threads, each holding its own views.
+    """
+    def __repr__(self)->str:
+        template = f"""
+Total Questions: {len(self)}
+"""
+        return template
+
+    def __init__(self,store:ColumnarStore,rows,full:bool=False)->None:
+        """Initialization of ResultView
+        :param:
+        store: ColumnarStore the rows point into
+        rows: row ids in result order, copied unless already read only
+        full: rows are every row of store in store order (lets by_* return posting lists as is)
+        """
+        rows = np.asarray(rows,dtype=np.int32)
+        if rows.flags.writeable:
+            rows = rows.copy()
+            rows.flags.writeable = False
+        self._store = store
+        self._rows = rows
+        self._full = full
+        self._facets = {}
+
+    @classmethod
+    def all(cls,store:ColumnarStore)->"ResultView":
+        """View of every question of store"""
+        return cls(store,np.arange(store.n_rows,dtype=np.int32),full=True)
+
+    @property
+    def store(self)->ColumnarStore:
+        return self._store
+
+    @property
+    def rows(self)->np.ndarray:
+        return self._rows
+
+    @property
+    def full(self)->bool:
+        """True when the view is every row of the store in store order"""
+        return self._full
+
+    def __len__(self)->int:
+        return len(self._rows)
+
+    def __bool__(self)->bool:
+        return len(self._rows) > 0
+
+    def __iter__(self):
+        store = self._store
+        for row in self._rows.tolist():
+            yield QuestionView(store,row)
+
+    def __getitem__(self,position:int|slice)->"QuestionView|ResultView":
+        """QuestionView at position, a slice gives the ResultView of those rows"""
+        if isinstance(position,slice):
+            return ResultView(self._store,self._rows[position])
+        try:
+            position = operator.index(position)
+        except TypeError:
+            raise TypeError(f"ResultView indices must be integers or slices, not {type(position).__name__}") from None
+        return QuestionView(self._store,int(self._rows[position]))
+
+    @property
+    def questions(self)->list:
+        return list(self)
+
+    @property
+    def question_ids(self)->list:
+        question_ids = self._store.question_ids()
+        return [question_ids[row] for row in self._rows.tolist()]
+
+    def facet(self,field:str)->dict:
+        """
+        value -> count of questions in this view for field, values in order of first
+        appearance in the view. Counted with np.bincount over the shared field codes
+        and cached on the view (views are immutable so the cache never goes stale).
+        """
+        facet = self._facets.get(field)
+        if facet is not None:
+            return facet
+        codes,values = FieldIndex.for_store(self._store).codes(field)
+        view_codes = codes[self._rows]
+        counts = np.bincount(view_codes,minlength=len(values))
+        present,first_seen = np.unique(view_codes,return_index=True)
+        facet = {
+            values[code]:int(counts[code])
+            for code in present[np.argsort(first_seen,kind="stable")].tolist()
+        }
+        self._facets[field] = facet
+        return facet
+
+    def facets(self,fields)->dict:
+        """field -> facet(field) for every field in fields"""
+        return {field:self.facet(field) for field in fields}
+
+    def query(self,expr)->"ResultView":
+        """New view with the rows of this view where expr holds (order is kept)"""
+        mask = expr.mask(self._store)
+        return ResultView(self._store,self._rows[mask[self._rows]])
+
+    def _narrow(self,posting:np.ndarray)->"ResultView":
+        if self._full:
+            return ResultView(self._store,posting)
+        return ResultView(self._store,self._rows[np.isin(self._rows,posting,assume_unique=True)])
+
+    def by_field(self,field:str,value)->"ResultView":
+        """Rows where field == value, looked up in the shared FieldIndex"""
+        return self._narrow(FieldIndex.for_store(self._store).rows(field,value))
+
+    def by_year(self,year:int)->"ResultView":
+        return self.by_field("year",year)
+
+    def by_subject(self,subject:str)->"ResultView":
+        return self.by_field("subject",subject)
+
+    def by_topic(self,topic:str)->"ResultView":
+        return self.by_field("topic",topic)
+
+    def by_chapter(self,chapter:str)->"ResultView":
+        return self.by_field("chapter",chapter)
+
+    def by_difficulty(self,difficulty:str)->"ResultView":
+        return self.by_field("difficulty",difficulty)
+
+    def by_n_last_yrs(self,n:int)->"ResultView":
+        """Questions of the last n years, newest year first"""
+        current_year = dt.datetime.now().year
+        parts = [self.by_year(current_year-i).rows for i in range(n)]
+        if not parts:
+            return ResultView(self._store,self._rows[:0])
+        return ResultView(self._store,np.concatenate(parts))
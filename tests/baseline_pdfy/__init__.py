@@ -0,0 +1,6 @@
+"""
+The html renderers as they were before the streaming writers and the
+pre-rendered fragments (pdfy, html_helper and pdfy_support of the baseline,
+unchanged apart from importing styles/types from the package). The render
+tests require byte identical output against these, do not edit them.
+"""
@@ -0,0 +1,28 @@
+"""
+Shared fixtures: a Filter over the locally cached question data base. The
+regression tests compare it against the baseline implementations, they are
+skipped when the data base has not been cached (downloaded) yet.
+"""
+
+import pytest
+
+from jee_data_base_new_v.core.utils import check_cache_health
+
+
+@pytest.fixture(scope="session")
+def filter_():
+    if not (check_cache_health("DataBaseChapters") and check_cache_health("EmbeddingsChapters")):
+        pytest.skip("the question data base is not cached")
+    from jee_data_base_new_v import DataBase,Filter
+    return Filter(DataBase().chapters_dict)
+
+
+@pytest.fixture(scope="session")
+def questions(filter_)->list:
+    #every question in store order, the input of the baseline list filters
+    return filter_.view(all_rows=True).questions
+
+
+@pytest.fixture(scope="session")
+def chapters(filter_)->list:
+    return list(filter_.view(all_rows=True).facet("chapter"))
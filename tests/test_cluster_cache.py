@@ -0,0 +1,65 @@
+"""
+Cluster labels served by the ClusterCache (memory and disk tier) against a
+fresh baseline HDBSCAN run over the pickled embeddings
+"""
+
+import hdbscan
+import numpy as np
+import pytest
+
+from jee_data_base_new_v.core.view import ResultView
+
+
+def _groups(clusters:dict)->dict:
+    return {
+        label if isinstance(label,str) else int(label):[question.question_id for question in questions]
+        for label,questions in clusters.items()
+    }
+
+
+def _baseline_cluster(questions:list,embeddings_dict:dict)->dict:
+    with_embeddings = [question for question in questions if embeddings_dict.get(question.question_id) is not None]
+    labels = hdbscan.HDBSCAN(min_cluster_size=2,metric="euclidean").fit_predict(
+        np.array([embeddings_dict[question.question_id] for question in with_embeddings])
+    )
+    clusters = {}
+    for label,question in zip(labels,with_embeddings):
+        clusters.setdefault(label,[]).append(question)
+    missing = [question for question in questions if embeddings_dict.get(question.question_id) is None]
+    if missing:
+        clusters["missing_embedding"] = missing
+    return clusters
+
+
+@pytest.fixture(scope="module")
+def embeddings_dict(filter_)->dict:
+    return filter_.cache.load_cache_pkl("EmbeddingsChapters")
+
+
+def test_cluster_matches_baseline(filter_,chapters,embeddings_dict):
+    view = filter_.view(all_rows=True).by_chapter(chapters[0])
+    expected = _groups(_baseline_cluster(view.questions,embeddings_dict))
+    assert _groups(filter_.cluster(view,use_cache=False)) == expected
+    assert _groups(filter_.cluster(view)) == expected
+
+
+def test_cluster_cache_hits(filter_,chapters,embeddings_dict):
+    view = filter_.view(all_rows=True).by_chapter(chapters[-1])
+    expected = _groups(_baseline_cluster(view.questions,embeddings_dict))
+    cluster_cache = filter_.cluster_cache
+    filter_.cluster(view)
+
+    hits = cluster_cache.hits
+    assert _groups(filter_.cluster(view)) == expected
+    assert cluster_cache.hits == hits + 1
+
+    #same question set in another order, same key
+    reversed_view = ResultView(filter_.store,view.rows[::-1])
+    assert {label:sorted(ids) for label,ids in _groups(filter_.cluster(reversed_view)).items()} == \
+        {label:sorted(ids) for label,ids in expected.items()}
+    assert cluster_cache.hits == hits + 2
+
+    #disk tier
+    cluster_cache.clear_memory()
+    assert _groups(filter_.cluster(view)) == expected
+    assert cluster_cache.hits == hits + 3
@@ -0,0 +1,87 @@
+"""
+Facet counts and get_possible_filter_values against the baseline walk over
+every attribute of every question
+"""
+
+import json
+from collections import Counter
+
+from jee_data_base_new_v import Field
+
+BASELINE_SKIP = {
+    "embedding",
+    "question",
+    "options",
+    "question_id",
+    "explanation",
+    "answer",
+    "isImgQuestion",
+    "isImgExplanation",
+    "isImgOption",
+    "correct_options",
+}
+
+
+def _baseline_possible_filter_values(questions:list,params:list)->dict:
+    possible_values = {}
+    if not questions:
+        return possible_values
+    for param in params:
+        if param in BASELINE_SKIP:
+            continue
+        seen = {}
+        for question in questions:
+            val = getattr(question,param,None)
+            try:
+                hash(val)
+                key = ("h",val)
+            except Exception:
+                try:
+                    key = ("j",json.dumps(val,default=str,sort_keys=True))
+                except Exception:
+                    key = ("r",repr(val))
+            if key not in seen:
+                seen[key] = val
+        if len(seen) == len(questions):
+            continue
+        possible_values[param] = list(seen.values())
+    return possible_values
+
+
+def _views(filter_,chapters:list)->list:
+    everything = filter_.view(all_rows=True)
+    return [
+        everything,
+        everything.by_chapter(chapters[0]),
+        everything.by_chapter(chapters[-1]).by_n_last_yrs(3),
+        everything.by_chapter(chapters[0])[:1],
+        everything.query(Field("year") > 2100),
+    ]
+
+
+def test_possible_filter_values_match_baseline(filter_,chapters):
+    for view in _views(filter_,chapters):
+        expected = _baseline_possible_filter_values(view.questions,filter_.get_filter_params())
+        assert filter_.get_possible_filter_values(view) == expected
+
+
+def test_facet_counts_match_baseline(filter_,chapters):
+    for view in _views(filter_,chapters):
+        questions = view.questions
+        for field in ("year","topic","difficulty","isBonus","examDate"):
+            expected = Counter(getattr(question,field) for question in questions)
+            facet = view.facet(field)
+            assert facet == dict(expected)
+            #first appearance order, as the baseline lists values
+            assert list(facet) == list(dict.fromkeys(getattr(question,field) for question in questions))
+
+
+def test_facets_of_the_current_set(filter_,chapters):
+    filter_.reset()
+    try:
+        filter_.by_chapter(chapters[0])
+        expected = _baseline_possible_filter_values(filter_.get(),filter_.get_filter_params())
+        assert filter_.get_possible_filter_values() == expected
+        assert {field:list(facet) for field,facet in filter_.get_facets().items() if field in expected} == expected
+    finally:
+        filter_.reset()
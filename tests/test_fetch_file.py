@@ -0,0 +1,163 @@
+"""
+fetch_file against a local http.server: interrupted downloads resume, servers
+without Range support restart cleanly and a digest mismatch keeps nothing
+"""
+
+import json
+import hashlib
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+
+import pytest
+
+from jee_data_base_new_v.core import utils
+from jee_data_base_new_v.core.utils import fetch_file
+
+PAYLOAD = bytes(range(256))*256
+BLOCK_SIZE = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Serves server.payload, honours Range only with server.ranges, sends no
+    Content-Length without server.length and cuts every response after
+    server.cut_after bytes while it is set
+    """
+    def log_message(self,*args)->None:
+        pass
+
+    def do_GET(self)->None:
+        server = self.server
+        payload = server.payload
+        range_header = self.headers.get("Range")
+        server.requests.append(range_header)
+        if server.ranges and range_header:
+            start,end = range_header.removeprefix("bytes=").split("-")
+            start,end = int(start),min(int(end),len(payload)-1)
+            body = payload[start:end+1]
+            self.send_response(206)
+            self.send_header("Content-Range",f"bytes {start}-{end}/{len(payload)}")
+        else:
+            body = payload
+            self.send_response(200)
+        if server.length:
+            self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        if server.cut_after is not None and len(body) > 1:
+            #the client sees the connection drop in the middle of the body
+            self.wfile.write(body[:server.cut_after])
+            self.wfile.flush()
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1",0),_Handler)
+    server.payload = PAYLOAD
+    server.ranges = True
+    server.length = True
+    server.cut_after = None
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever,daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/file.bin"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    #progress is written block by block, small blocks make a cut response leave some behind
+    monkeypatch.setattr(utils,"DOWNLOAD_BLOCK_SIZE",BLOCK_SIZE)
+
+
+def _sha256(data:bytes)->str:
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def _leftovers(destination:Path)->list:
+    return [path.name for path in destination.parent.iterdir() if path.name != destination.name]
+
+
+def test_ranged_download(server,tmp_path):
+    destination = tmp_path/"file.bin"
+    assert fetch_file(server.url,destination,digest=_sha256(PAYLOAD),segments=4) == destination
+    assert destination.read_bytes() == PAYLOAD
+    assert _leftovers(destination) == []
+
+
+def test_interrupted_download_resumes(server,tmp_path):
+    destination = tmp_path/"file.bin"
+    segment_size = len(PAYLOAD)//2
+    #every attempt of both segments dies before the segment is complete
+    server.cut_after = 4*BLOCK_SIZE
+    with pytest.raises(OSError):
+        fetch_file(server.url,destination,segments=2)
+    assert not destination.exists()
+    state = json.loads((tmp_path/"file.bin.part.json").read_text(encoding="utf-8"))
+    offsets = [segment[2] for segment in state["segments"]]
+    assert offsets[0] > 0 and offsets[1] > segment_size
+
+    server.cut_after = None
+    server.requests.clear()
+    fetch_file(server.url,destination,digest=_sha256(PAYLOAD),segments=2)
+    assert destination.read_bytes() == PAYLOAD
+    assert _leftovers(destination) == []
+    #the second run asked only for the missing bytes
+    resumed = sorted(request for request in server.requests if request != "bytes=0-0")
+    assert resumed == sorted(f"bytes={offset}-{end}" for offset,(_,end,_) in zip(offsets,state["segments"]))
+
+
+@pytest.mark.parametrize("length",[True,False])
+def test_server_without_range_support(server,tmp_path,length):
+    server.ranges = False
+    server.length = length
+    destination = tmp_path/"file.bin"
+    #a longer .part of an earlier attempt, nothing of it may survive the restart
+    (tmp_path/"file.bin.part").write_bytes(b"x"*(len(PAYLOAD) + 4096))
+    state = {"url":server.url,"size":len(PAYLOAD) if length else None,"segments":[[0,len(PAYLOAD)-1,3*BLOCK_SIZE]]}
+    (tmp_path/"file.bin.part.json").write_text(json.dumps(state),encoding="utf-8")
+
+    fetch_file(server.url,destination,digest=_sha256(PAYLOAD),segments=4)
+    assert destination.read_bytes() == PAYLOAD
+    assert _leftovers(destination) == []
+    assert all(request in (None,"bytes=0-0") for request in server.requests)
+
+
+def test_server_without_range_support_retries_from_start(server,tmp_path,monkeypatch):
+    server.ranges = False
+    destination = tmp_path/"file.bin"
+    download_segment = utils._download_segment
+    attempts = []
+
+    def cut_first_attempt(*args)->None:
+        #the first response drops half way, the retry has to start over
+        attempts.append(len(attempts))
+        server.cut_after = len(PAYLOAD)//2 if len(attempts) == 1 else None
+        download_segment(*args)
+
+    monkeypatch.setattr(utils,"_download_segment",cut_first_attempt)
+    fetch_file(server.url,destination,digest=_sha256(PAYLOAD))
+    assert len(attempts) == 2
+    assert destination.read_bytes() == PAYLOAD
+
+
+def test_digest_mismatch(server,tmp_path):
+    destination = tmp_path/"file.bin"
+    with pytest.raises(ValueError,match="Digest mismatch"):
+        fetch_file(server.url,destination,digest=_sha256(b"something else"),segments=2)
+    assert not destination.exists()
+    assert _leftovers(destination) == []
+
+
+def test_short_body_without_digest(server,tmp_path,monkeypatch):
+    server.ranges = False
+    destination = tmp_path/"file.bin"
+    #the server announced more bytes than the body it then sends (with its own Content-Length)
+    monkeypatch.setattr(utils,"_probe_download",lambda http_session,url: (len(PAYLOAD) + 100,False))
+    with pytest.raises(ValueError,match="Incomplete download"):
+        fetch_file(server.url,destination)
+    assert not destination.exists()
@@ -0,0 +1,86 @@
+"""
+Query masks and the by_* refinements of ResultView against the baseline
+list filters over the questions (Filter.current_set before the columnar store)
+"""
+
+import datetime as dt
+
+import pytest
+
+from jee_data_base_new_v import Field,HasImage
+
+
+def _ids(questions)->list:
+    return [question.question_id for question in questions]
+
+
+def _baseline_by(questions:list,field:str,value)->list:
+    return [question for question in questions if getattr(question,field) == value]
+
+
+def _baseline_by_n_last_yrs(questions:list,n:int)->list:
+    current_year = dt.datetime.now().year
+    last_n_pyqs = []
+    for i in range(n):
+        last_n_pyqs.extend(_baseline_by(questions,"year",current_year-i))
+    return last_n_pyqs
+
+
+QUERIES = [
+    (Field("year") == 2024,lambda q: q.year == 2024),
+    (Field("year") != 2024,lambda q: q.year != 2024),
+    (Field("year").between(2020,2022) & (Field("subject") == "physics"),lambda q: 2020 <= q.year <= 2022 and q.subject == "physics"),
+    ((Field("difficulty") == "easy") | ~Field("exam").isin(["JEE Main"]),lambda q: q.difficulty == "easy" or q.exam != "JEE Main"),
+    (Field("year") > 2100,lambda q: False),
+    (Field("examDate") >= "2024",lambda q: q.examDate is not None and q.examDate >= "2024"),
+    (Field("isBonus") == True,lambda q: q.isBonus),
+    (Field("question_id").isin(["q00003","q00100"]),lambda q: q.question_id in ("q00003","q00100")),
+    (HasImage("question"),lambda q: q.isImgQuestion),
+    (HasImage(),lambda q: q.isImgQuestion or q.isImgExplanation or any(q.isImgOption)),
+]
+
+
+@pytest.mark.parametrize("expr,predicate",QUERIES,ids=[repr(expr) for expr,_ in QUERIES])
+def test_query_matches_baseline(filter_,questions,expr,predicate):
+    expected = [question for question in questions if predicate(question)]
+    assert filter_.query(expr).question_ids == _ids(expected)
+
+
+def test_query_keywords_refine_the_view(filter_,questions,chapters):
+    view = filter_.view(all_rows=True).by_chapter(chapters[0])
+    expected = [question for question in questions if question.chapter == chapters[0] and question.year == 2024]
+    assert view.query(Field("year") == 2024).question_ids == _ids(expected)
+    assert filter_.query(Field("chapter") == chapters[0],year=2024).question_ids == _ids(expected)
+
+
+def test_by_methods_match_baseline(filter_,questions,chapters):
+    for chapter in chapters:
+        view = filter_.view(all_rows=True).by_chapter(chapter)
+        expected = _baseline_by(questions,"chapter",chapter)
+        assert view.question_ids == _ids(expected)
+        for difficulty in ("easy","medium","hard"):
+            assert view.by_difficulty(difficulty).question_ids == _ids(_baseline_by(expected,"difficulty",difficulty))
+        assert view.by_n_last_yrs(3).question_ids == _ids(_baseline_by_n_last_yrs(expected,3))
+
+
+def test_filter_chain_matches_baseline(filter_,questions,chapters):
+    filter_.reset()
+    try:
+        filter_.by_chapter(chapters[0]).by_n_last_yrs(5)
+        expected = _baseline_by_n_last_yrs(_baseline_by(questions,"chapter",chapters[0]),5)
+        assert _ids(filter_.get()) == _ids(expected)
+    finally:
+        filter_.reset()
+
+
+def test_result_view_slices(filter_):
+    view = filter_.view(all_rows=True).by_chapter(filter_.view(all_rows=True)[0].chapter)
+    question_ids = view.question_ids
+    assert view[2:5].question_ids == question_ids[2:5]
+    assert view[::-1].question_ids == question_ids[::-1]
+    assert len(view[len(view):]) == 0
+    assert view[-1].question_id == question_ids[-1]
+    with pytest.raises(TypeError,match="integers or slices"):
+        view["q00001"]
+    with pytest.raises(TypeError,match="integers or slices"):
+        view[[0,1]]
@@ -0,0 +1,77 @@
+"""
+Streamed html (write_* and Filter.render), with and without pre-rendered
+fragments, against the baseline string building renderers, byte for byte
+"""
+
+import io
+import asyncio
+
+import pytest
+
+from jee_data_base_new_v import pdfy
+from jee_data_base_new_v.core.styles import dark_style,white_style
+from baseline_pdfy import pdfy as baseline_pdfy
+
+
+def _baseline_html(questions:list,style:str)->str:
+    #the baseline get_html never assigned the white theme (and failed), white is the dark page restyled
+    html = baseline_pdfy.get_html(questions,"dark")
+    return html if style == "dark" else html.replace(dark_style,white_style)
+
+
+@pytest.fixture(scope="module")
+def fragments(filter_):
+    return filter_.fragments()
+
+
+@pytest.fixture(scope="module",params=[0,-1],ids=["first_chapter","last_chapter"])
+def chapter_view(request,filter_,chapters):
+    return filter_.view(all_rows=True).by_chapter(chapters[request.param])
+
+
+@pytest.mark.parametrize("style",["dark","white"])
+def test_question_html(chapter_view,fragments,style):
+    questions = chapter_view.questions
+    expected = _baseline_html(questions,style)
+    assert pdfy.get_html(questions,style) == expected
+    assert pdfy.get_html(questions,style,fragments) == expected
+    for fragment_store in (None,fragments):
+        file = io.StringIO()
+        pdfy.write_html(file,questions,style,fragment_store)
+        assert file.getvalue() == expected
+
+
+@pytest.mark.parametrize("mode",["dark","white"])
+def test_cluster_html(filter_,chapter_view,fragments,mode):
+    clusters = filter_.cluster(chapter_view)
+    expected = baseline_pdfy.get_cluster_html(clusters,"Title $x$",mode)
+    expected_skim = baseline_pdfy.get_cluster_skim_html(clusters,"Title $x$",mode)
+    for fragment_store in (None,fragments):
+        assert pdfy.get_cluster_html(clusters,"Title $x$",mode,fragment_store) == expected
+        assert pdfy.get_cluster_skim_html(clusters,"Title $x$",mode,fragment_store) == expected_skim
+        file = io.StringIO()
+        pdfy.write_cluster_html(file,clusters,"Title $x$",mode,fragment_store)
+        assert file.getvalue() == expected
+        file = io.StringIO()
+        pdfy.write_cluster_skim_html(file,clusters,"Title $x$",mode,fragment_store)
+        assert file.getvalue() == expected_skim
+
+
+def test_empty_html():
+    assert pdfy.get_html([]) == baseline_pdfy.get_html([])
+    assert pdfy.get_cluster_html({}) == baseline_pdfy.get_cluster_html({})
+    assert pdfy.get_cluster_skim_html({}) == baseline_pdfy.get_cluster_skim_html({})
+
+
+def test_render_writes_baseline_html(filter_,chapter_view,tmp_path):
+    questions = chapter_view.questions
+    clusters = filter_.cluster(chapter_view)
+    cases = [
+        (dict(),_baseline_html(questions,"dark")),
+        (dict(style="white"),_baseline_html(questions,"white")),
+        (dict(cluster=True,title="Title"),baseline_pdfy.get_cluster_html(clusters,"Title","dark")),
+        (dict(cluster=True,skim=True,title="Title"),baseline_pdfy.get_cluster_skim_html(clusters,"Title","dark")),
+    ]
+    for number,(options,expected) in enumerate(cases):
+        path = asyncio.run(filter_.render(tmp_path/f"render{number}.html",view=chapter_view,**options))
+        assert path.read_bytes() == expected.encode("utf-8")